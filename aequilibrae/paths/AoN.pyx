@@ -25,15 +25,25 @@ cimport numpy as np
 cimport cython
 
 include 'parameters.pxi'
+include 'd_ary_heap.pxi'
+include 'point_to_point.pxi'
+include 'contraction_hierarchy.pxi'
+include 'vdf.pxi'
+include 'bush_based.pxi'
+include 'all_to_all.pxi'
 from libc.stdlib cimport abort, malloc, free
 
 @cython.wraparound(False)
 @cython.embedsignature(True)
 @cython.boundscheck(False)
-def one_to_all(origin, demand, graph, result, aux_result, curr_thread):
-    cdef int nodes, O, i, centroids, block_flows_through_centroids
+def one_to_all(origin, demand, graph, result, aux_result, curr_thread, early_exit=None):
+    # early_exit: None builds the full tree
+    #             'demand' stops once all destinations with demand from this origin are settled
+    #             'centroids' stops once all centroids are settled (full skims, loads unchanged)
+    cdef int nodes, O, i, w, centroids, block_flows_through_centroids
+    cdef int destinations = -1
     cdef int critical_queries = 0
-    cdef int link_extract_queries, query_type
+    cdef int link_extract_queries
     #We transform the python variables in Cython variables
     O = origin
     graph_fs = graph.fs
@@ -53,11 +63,17 @@ def one_to_all(origin, demand, graph, result, aux_result, curr_thread):
     if VERSION != graph.__version__:
         return 'This graph was created for a different version of AequilibraE. Please re-create it'
 
+    if graph.heap_type not in HEAP_TYPES:
+        return 'Heap type ' + str(graph.heap_type) + ' is not available. Use one of ' + str(HEAP_TYPES.keys())
+    cdef int heap_type = HEAP_TYPES[graph.heap_type]
+
+    if early_exit not in EARLY_EXIT_MODES:
+        return 'Early exit mode ' + str(early_exit) + ' is not available. Use one of ' + str(EARLY_EXIT_MODES)
+
     if result.critical_links['save']:
-        critical_queries = len(result.critical_links['queries'])
-        aux_link_flows = np.zeros(result.links, ITYPE)
-    else:
-        aux_link_flows = np.zeros(1, ITYPE)
+        critical_queries = result.critical_links['sizes'].shape[0]
+        if aux_result.sl_link_loads.shape[2] != critical_queries:
+            return 'Auxiliary results not prepared for select link analysis. Use --> aux_result.prepare(graph, results)'
 
     if result.link_extraction['save']:
         link_extract_queries = len(result.link_extraction['queries'])
@@ -68,7 +84,20 @@ def one_to_all(origin, demand, graph, result, aux_result, curr_thread):
 
     # In order to release the GIL for this procedure, we create all the
     # memory views we will need
-    cdef double [:] demand_view = demand
+    # demand has one column per user class (a single class can come as a vector). A (destinations, demand) pair
+    # has only the destinations with demand of a single class (e.g. the row of a CSR matrix)
+    cdef int sparse = isinstance(demand, tuple)
+    if sparse:
+        demand_destinations = np.ascontiguousarray(demand[0], dtype=ITYPE)
+        demand = np.ascontiguousarray(demand[1], dtype=DTYPE)[:, np.newaxis]
+        if demand_destinations.shape[0] > 0 and np.max(demand_destinations) >= result.zones:
+            return "Origin " + str(O) + " has demand to zones outside the range of zones in the graph"
+    else:
+        demand_destinations = np.zeros(0, dtype=ITYPE)
+        if demand.ndim == 1:
+            demand = demand[:, np.newaxis]
+    cdef double [:, :] demand_view = demand
+    cdef int [:] demand_destinations_view = demand_destinations
 
     # views from the graph
     cdef int [:] graph_fs_view = graph.fs
@@ -82,21 +111,51 @@ def one_to_all(origin, demand, graph, result, aux_result, curr_thread):
     cdef int [:] no_path_view = result.no_path[O, :]
 
     # views from the aux-result object
-    cdef int [:] predecessors_view = aux_result.predecessors[:, curr_thread]
-    cdef double [:, :] skim_matrix_view = aux_result.temporary_skims[:, :, curr_thread]
-    cdef int [:] reached_first_view = aux_result.reached_first[:, curr_thread]
-    cdef int [:] conn_view = aux_result.connectors[:, curr_thread]
-    cdef double [:] link_loads_view = aux_result.temp_link_loads[:, curr_thread]
-    cdef double [:] node_load_view = aux_result.temp_node_loads[:, curr_thread]
-    cdef int [:] b_nodes_view = aux_result.temp_b_nodes
-
-    # path file variables
-    cdef int [:] pred_view = result.path_file['results'][O,:,0]
-    cdef int [:] c_view = result.path_file['results'][O,:,1]
-
-    # select link variables
-    cdef double [:, :] sel_link_view = result.critical_links['results'][O,:,:]
-    cdef int [:] aux_link_flows_view = aux_link_flows
+    cdef int [:] predecessors_view = aux_result.predecessors[curr_thread, :]
+    cdef double [:, :] skim_matrix_view = aux_result.temporary_skims[curr_thread, :, :]
+    cdef int [:] reached_first_view = aux_result.reached_first[curr_thread, :]
+    cdef int [:] conn_view = aux_result.connectors[curr_thread, :]
+    cdef double [:, :] link_loads_view = aux_result.temp_link_loads[curr_thread, :, :]
+    cdef double [:, :] node_load_view = aux_result.temp_node_loads[curr_thread, :, :]
+    cdef int [:] b_nodes_view = aux_result.temp_b_nodes[curr_thread, :]
+    cdef int [::1] heap_elements_view = aux_result.heap_elements[curr_thread, :]
+    cdef int [::1] heap_positions_view = aux_result.heap_positions[curr_thread, :]
+    cdef double [::1] node_costs_view = aux_result.node_costs[curr_thread, :]
+    cdef int [:] destination_flags_view = aux_result.destination_flags[curr_thread, :]
+    cdef int [:] connected_view = aux_result.connected_centroids
+
+    # select link variables. Select link analysis loads the destinations with demand (all classes) one by one
+    if critical_queries > 0:
+        if sparse:
+            # Repeated destinations are added up, so there is one row per destination
+            sl_destinations, position = np.unique(demand_destinations, return_inverse=True)
+            sl_destinations = sl_destinations.astype(ITYPE)
+            sl_demand = np.bincount(position, weights=demand[:, 0], minlength=sl_destinations.shape[0])
+            sl_demand = sl_demand.astype(DTYPE)[:, np.newaxis]
+        else:
+            sl_destinations = np.nonzero(np.sum(demand, axis=1) > 0)[0].astype(ITYPE)
+            sl_demand = np.ascontiguousarray(demand[sl_destinations, :], dtype=DTYPE)
+        sl_ptr, sl_ids = result.critical_links['link_queries']
+    else:
+        sl_destinations = sl_ptr = sl_ids = np.zeros(1, ITYPE)
+        sl_demand = np.zeros((1, 1), DTYPE)
+    cdef int [:] sl_destinations_view = sl_destinations
+    cdef double [:, :] sl_demand_view = sl_demand
+    cdef int [:] sl_ptr_view = sl_ptr
+    cdef int [:] sl_ids_view = sl_ids
+    cdef int [:] sl_sizes_view = result.critical_links['sizes'] if critical_queries > 0 else sl_ptr
+    cdef int [:] sl_types_view = result.critical_links['types'] if critical_queries > 0 else sl_ptr
+    cdef int [:, :] sl_counts_view = aux_result.sl_counts[curr_thread, :, :]
+    cdef double [:, :] sl_node_load_view = aux_result.sl_node_loads[curr_thread, :, :]
+    cdef double [:, :] sl_link_loads_view = aux_result.sl_link_loads[curr_thread, :, :]
+    cdef double [:, :] sl_od_view = aux_result.sl_od[curr_thread, :, :]
+
+    if early_exit is not None and sparse:
+        destinations = flag_sparse_destinations(demand_destinations_view, demand_view[:, 0], destination_flags_view,
+                                                connected_view, early_exit == 'centroids')
+    elif early_exit is not None:
+        destinations = flag_destinations(demand_view, destination_flags_view, connected_view,
+                                         early_exit == 'centroids')
 
     #Now we do all procedures with NO GIL
     with nogil:
@@ -113,43 +172,83 @@ def one_to_all(origin, demand, graph, result, aux_result, curr_thread):
                          predecessors_view,
                          ids_graph_view,
                          conn_view,
-                         reached_first_view)
-
-        network_loading(O,
-                        nodes,
-                        demand_view,
-                        predecessors_view,
-                        conn_view,
-                        link_loads_view,
-                        no_path_view,
-                        reached_first_view,
-                        node_load_view,
-                        w)
-
-        _copy_skims(skim_matrix_view,
-                    final_skim_matrices_view)
-
+                         reached_first_view,
+                         graph_skim_view,
+                         skim_matrix_view,
+                         heap_elements_view,
+                         heap_positions_view,
+                         node_costs_view,
+                         destination_flags_view,
+                         destinations,
+                         heap_type)
+
+        if critical_queries > 0:
+            select_link_loading(sl_destinations_view,
+                                sl_demand_view,
+                                predecessors_view,
+                                conn_view,
+                                link_loads_view,
+                                reached_first_view,
+                                node_load_view,
+                                w,
+                                sl_ptr_view,
+                                sl_ids_view,
+                                sl_sizes_view,
+                                sl_types_view,
+                                sl_counts_view,
+                                sl_node_load_view,
+                                sl_link_loads_view,
+                                sl_od_view)
+        elif sparse:
+            sparse_network_loading(demand_destinations_view,
+                                   demand_view[:, 0],
+                                   predecessors_view,
+                                   conn_view,
+                                   link_loads_view[:, 0],
+                                   reached_first_view,
+                                   node_load_view[:, 0],
+                                   w)
+        else:
+            network_loading(O,
+                            nodes,
+                            demand_view,
+                            predecessors_view,
+                            conn_view,
+                            link_loads_view,
+                            no_path_view,
+                            reached_first_view,
+                            node_load_view,
+                            w)
+
+        _copy_skims(O,
+                    skim_matrix_view,
+                    predecessors_view,
+                    final_skim_matrices_view,
+                    no_path_view,
+                    destination_flags_view,
+                    connected_view,
+                    destinations >= 0)
+
+    aux_result.settled[O] = w + 1
+
+    # The part of the tree that was reached goes to the path file (written by a thread of its own)
     if result.path_file['save']:
-        with nogil:
-            put_path_file_on_disk(pred_view,
-                                  predecessors_view,
-                                  c_view,
-                                  conn_view)
-
-    for i in range(critical_queries):
-        critical_links_view = return_an_int_view(result.path_file['queries']['elements'][i])
-        query_type = 0
-        if result.path_file['queries'][ type][i] == "or":
-            query_type = 1
-        with nogil:
-            perform_select_link_analysis(O,
-                                         nodes,
-                                         demand_view,
-                                         predecessors_view,
-                                         conn_view,
-                                         aux_link_flows_view,
-                                         sel_link_view,
-                                         query_type)
+        reached = aux_result.reached_first[curr_thread, 1:w + 1].copy()
+        result.path_file['results'].put(O,
+                                        reached,
+                                        aux_result.predecessors[curr_thread, reached],
+                                        aux_result.connectors[curr_thread, reached])
+
+    # Only the OD pairs that use the links of each query are kept (list.append does not need a lock)
+    if critical_queries > 0:
+        dest, query = np.nonzero(aux_result.sl_od[curr_thread, :sl_destinations.shape[0], :])
+        if dest.shape[0] > 0:
+            od = np.zeros(dest.shape[0], dtype=SELECT_LINK_TYPE)
+            od['origin'] = O
+            od['destination'] = sl_destinations[dest]
+            od['query'] = query
+            od['flow'] = aux_result.sl_od[curr_thread, dest, query]
+            result.critical_links['od'].append(od)
     return origin
 
 @cython.wraparound(False)
@@ -157,26 +256,30 @@ def one_to_all(origin, demand, graph, result, aux_result, curr_thread):
 @cython.boundscheck(False) # turn of bounds-checking for entire function
 cpdef void network_loading(int origin,
                       int nodes,
-                      double[:] demand,
+                      double[:, :] demand,
                       int [:] pred,
                       int [:] conn,
-                      double[:] link_loads,
+                      double[:, :] link_loads,
                       int [:] no_path,
                       int [:] reached_first,
-                      double [:] node_load,
+                      double [:, :] node_load,
                       int found) nogil:
 
-    cdef unsigned int i, node, predecessor, connector
+    # demand, link_loads and node_load have one column per user class. All classes are loaded on the same tree
+    cdef unsigned int i, j, node, predecessor, connector
     cdef unsigned int zones = demand.shape[0]
     cdef int N = node_load.shape[0]
+    cdef int classes = demand.shape[1]
 
     # Clean the node load array
     for i in range(N):
-        node_load[i] = 0
+        for j in range(classes):
+            node_load[i, j] = 0
 
     # Loads the demand to the centroids
     for i in range(zones):
-        node_load[i] = demand[i]
+        for j in range(classes):
+            node_load[i, j] = demand[i, j]
 
     #Recursevely cascades to the origin
     for i in xrange(found, 0, -1):
@@ -186,76 +289,225 @@ cpdef void network_loading(int origin,
         predecessor = pred[node]
         connector = conn[node]
 
-        # loads the flow to the link
-        link_loads[connector] += node_load[node]
+        for j in range(classes):
+            # loads the flow to the link
+            link_loads[connector, j] += node_load[node, j]
+
+            # Cascades the load from the node to their predecessor
+            node_load[predecessor, j] += node_load[node, j]
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef void sparse_network_loading(int [:] destinations,
+                                 double[:] demand,
+                                 int [:] pred,
+                                 int [:] conn,
+                                 double[:] link_loads,
+                                 int [:] reached_first,
+                                 double [:] node_load,
+                                 int found) nogil:
+
+    # Same as network_loading, for a single class with demand only to the destinations given. The cascade only
+    # goes through the nodes in the tree, so only those (and the destinations) need to be cleaned
+    cdef int i, node, predecessor, connector
+    cdef int k = destinations.shape[0]
+
+    for i in range(found + 1):
+        node_load[reached_first[i]] = 0
+    for i in range(k):
+        node_load[destinations[i]] = 0
+
+    # Repeated destinations add up, as in a CSR matrix
+    for i in range(k):
+        node_load[destinations[i]] += demand[i]
 
-        # Cascades the load from the node to their predecessor
+    for i in range(found, 0, -1):
+        node = reached_first[i]
+        predecessor = pred[node]
+        connector = conn[node]
+        link_loads[connector] += node_load[node]
         node_load[predecessor] += node_load[node]
 
+
 @cython.wraparound(False)
 @cython.embedsignature(True)
 @cython.boundscheck(False)
-cdef void _copy_skims(double[:,:] skim_matrix,  #Skim matrix computed from one origin to all nodes
-                      double[:,:] final_skim_matrix) nogil:  #Skim matrix computed for one origin to all other centroids only
+cdef void _copy_skims(int origin,
+                      double[:,:] skim_matrix,  #Skim matrix computed from one origin to all nodes
+                      int [:] pred,
+                      double[:,:] final_skim_matrix,  #Skim matrix computed for one origin to all other centroids only
+                      int [:] no_path,
+                      int [:] destination_flags,
+                      int [:] connected_centroids,
+                      int early_exit) nogil:
 
     cdef int i, j
     cdef int N=final_skim_matrix.shape[0]
     cdef int skims=final_skim_matrix.shape[1]
 
     for i in range(N):
-        for j in range(skims):
-            final_skim_matrix[i,j]=skim_matrix[i,j]
+        if pred[i] < 0 and i != origin:
+            # After an early exit, only the flagged destinations (and centroids without links) are known to be
+            # unreachable when they were not settled. The others may just have been left out, so their skims are not
+            # touched
+            if early_exit and not destination_flags[i] and connected_centroids[i]:
+                no_path[i] = NOT_SETTLED
+                continue
+            # Destinations not reached by the tree get an infinite impedance and are flagged in no_path
+            no_path[i] = NO_PATH
+            for j in range(skims):
+                final_skim_matrix[i,j] = INFINITE
+        else:
+            no_path[i] = PATH_FOUND
+            for j in range(skims):
+                final_skim_matrix[i,j] = skim_matrix[i,j]
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef void select_link_loading(int [:] destinations,
+                              double[:, :] demand,
+                              int [:] pred,
+                              int [:] conn,
+                              double[:, :] link_loads,
+                              int [:] reached_first,
+                              double [:, :] node_load,
+                              int found,
+                              int [:] link_query_ptr,
+                              int [:] link_query_ids,
+                              int [:] query_sizes,
+                              int [:] query_types,
+                              int [:, :] counts,
+                              double [:, :] sl_node_load,
+                              double [:, :] sl_link_loads,
+                              double [:, :] sl_od) nogil:
+
+    # Loads the demand to the destinations given (one row of demand per destination, one column per user class) as
+    # network_loading does, and does select link analysis on the same tree:
+    #   - Going down the tree, counts[node, q] gets the number of links of query q on the path to each node
+    #   - The demand (all classes) to a destination whose path has all links of an 'and' query (query_types 0) or
+    #     any link of an 'or' query (1) goes to sl_od[destination position, q] and is cascaded with the demand
+    #   - link_query_ptr/link_query_ids list the queries of each link (CSR)
+    cdef int i, j, k, q, node, predecessor, connector, selected
+    cdef int n_dest = destinations.shape[0]
+    cdef int classes = demand.shape[1]
+    cdef int queries = query_sizes.shape[0]
+    cdef double total
+
+    # Paths are in the tree, so no link is counted twice
+    for q in range(queries):
+        counts[reached_first[0], q] = 0
+    for i in range(1, found + 1):
+        node = reached_first[i]
+        predecessor = pred[node]
+        connector = conn[node]
+        for q in range(queries):
+            counts[node, q] = counts[predecessor, q]
+        for k in range(link_query_ptr[connector], link_query_ptr[connector + 1]):
+            counts[node, link_query_ids[k]] += 1
 
+    # Only the nodes in the tree (and the destinations) carry loads
+    for i in range(found + 1):
+        node = reached_first[i]
+        for j in range(classes):
+            node_load[node, j] = 0
+        for q in range(queries):
+            sl_node_load[node, q] = 0
+    for i in range(n_dest):
+        node = destinations[i]
+        for j in range(classes):
+            node_load[node, j] = 0
+        for q in range(queries):
+            sl_node_load[node, q] = 0
+
+    for i in range(n_dest):
+        node = destinations[i]
+        total = 0
+        for j in range(classes):
+            node_load[node, j] += demand[i, j]
+            total += demand[i, j]
+
+        for q in range(queries):
+            sl_od[i, q] = 0
+            if pred[node] < 0:  # Not reached (or the origin itself)
+                continue
+            if query_types[q] == 0:
+                selected = counts[node, q] == query_sizes[q]
+            else:
+                selected = counts[node, q] > 0
+            if selected:
+                sl_od[i, q] = total
+                sl_node_load[node, q] += total
+
+    for i in range(found, 0, -1):
+        node = reached_first[i]
+        predecessor = pred[node]
+        connector = conn[node]
 
-cdef return_an_int_view(input):
-    cdef int [:] critical_links_view = input
-    return critical_links_view
+        for j in range(classes):
+            link_loads[connector, j] += node_load[node, j]
+            node_load[predecessor, j] += node_load[node, j]
+
+        for q in range(queries):
+            if sl_node_load[node, q] != 0:
+                sl_link_loads[connector, q] += sl_node_load[node, q]
+                sl_node_load[predecessor, q] += sl_node_load[node, q]
 
 
 @cython.wraparound(False)
 @cython.embedsignature(True)
 @cython.boundscheck(False)
-cpdef void perform_select_link_analysis(int origin,
-                                        int nodes,
-                                        double[:] demand,
-                                        int [:] pred,
-                                        int [:] conn,
-                                        int [:] aux_link_flows,
-                                        double [:, :] critical_array,
-                                        int query_type) nogil:
-    cdef unsigned int t_origin
-    cdef ITYPE_t c, j, i, p,
-    cdef unsigned int dests = demand.shape[0]
-    cdef unsigned int q = critical_array.shape[0]
-
-    for j in range(dests):
-        if demand[j] > 0:
-            p = pred[j]
-            j = i
-            while p >= 0:
-                c = conn[j]
-                aux_link_flows[c] = 1
-                j = p
-                p = pred[j]
-        if query_type == 1: # Either one of the links in the query
-            for i in range(q):
-                if aux_link_flows[i] == 1:
-                    critical_array
+cdef int flag_destinations(double[:, :] demand,
+                           int [:] destination_flags,
+                           int [:] connected_centroids,
+                           int all_centroids) nogil:
+    # Flags the centroids that need to be settled before path finding can stop and returns how many they are
+    # demand has one column per user class. Centroids without links (and index 0, which is not a node) are never
+    # settled, so they are not flagged or path finding would never stop early
+    cdef int i, j
+    cdef int destinations = 0
+    cdef int zones = demand.shape[0]
+    cdef int classes = demand.shape[1]
+
+    for i in range(zones):
+        destination_flags[i] = 0
+        if not connected_centroids[i]:
+            continue
+        destination_flags[i] = all_centroids
+        for j in range(classes):
+            if demand[i, j] > 0:
+                destination_flags[i] = 1
+        destinations += destination_flags[i]
+    return destinations
 
 
 @cython.wraparound(False)
 @cython.embedsignature(True)
 @cython.boundscheck(False)
-cpdef void put_path_file_on_disk(int [:] pred,
-                                 int [:] predecessors,
-                                 int [:] conn,
-                                 int [:] connectors) nogil:
-    cdef int i
-    cdef int k = pred.shape[0]
+cdef int flag_sparse_destinations(int [:] demand_destinations,
+                                  double[:] demand,
+                                  int [:] destination_flags,
+                                  int [:] connected_centroids,
+                                  int all_centroids) nogil:
+    # Same as flag_destinations, with demand only to the destinations given
+    cdef int i, d
+    cdef int destinations = 0
+    cdef int zones = destination_flags.shape[0]
 
-    for i in range(k):
-        pred[i] = predecessors[i]
-        conn[i] = connectors[i]
+    for i in range(zones):
+        destination_flags[i] = all_centroids * connected_centroids[i]
+        destinations += destination_flags[i]
+    if all_centroids:
+        return destinations
+
+    for i in range(demand_destinations.shape[0]):
+        d = demand_destinations[i]
+        if demand[i] > 0 and connected_centroids[d] and destination_flags[d] == 0:
+            destination_flags[d] = 1
+            destinations += 1
+    return destinations
 
 
 @cython.wraparound(False)
@@ -274,7 +526,7 @@ cdef void blocking_centroid_flows(int O,
     for i in xrange(fs[0], fs[centroids]):
         temp_b_nodes[i] = b_node[i]
 
-    if O < centroids - 1:
+    if O < centroids:
         for i in xrange(0, fs[O]):
             temp_b_nodes[i] = O
 
@@ -289,115 +541,327 @@ cdef void blocking_centroid_flows(int O,
 @cython.embedsignature(True)
 @cython.boundscheck(False)
 def path_computation(origin,destination,graph, results):
-    cdef ITYPE_t nodes, O, D, p, centroids
-    cdef int i, j, skims, a
+    # If destination is a node in the graph, only the path between origin and destination is computed, with A*
+    # if the graph has landmarks (Graph.set_landmarks) or with a bidirectional Dijkstra otherwise.
+    # If it is not (e.g. 0), the full shortest path tree from origin is built into results
+    cdef ITYPE_t nodes, O, D, centroids
+    cdef int meeting, p, last
 
     if results.__graph_id__ != graph.__id__:
         return "Results object not prepared. Use --> results.prepare(graph)"
 
+    # If the graph nodes were renumbered, origin, destination and path_nodes are external IDs (the arrays indexed by
+    # node in results are still in the IDs of the graph)
+    external_origin = origin
+    if graph.node_ids is not None:
+        origin, destination = [int(x) for x in graph.internal_nodes([origin, destination])]
+
     # Consistency checks
-    if origin >= graph.fs.shape[0]:
-        return "Node " + str(origin) + " is outside the range of nodes in the graph"
+    if origin < 0 or origin >= graph.fs.shape[0]:
+        return "Node " + str(external_origin) + " is outside the range of nodes in the graph"
 
     if graph.fs[origin] == graph.fs[origin+1]:
-        return "Node " + str(origin) + " does not exist in the graph"
+        return "Node " + str(external_origin) + " does not exist in the graph"
 
     if VERSION != graph.__version__:
         return 'This graph was created for a different version of AequilibraE. Please re-create it'
+
+    if graph.heap_type not in HEAP_TYPES:
+        return 'Heap type ' + str(graph.heap_type) + ' is not available. Use one of ' + str(HEAP_TYPES.keys())
+    cdef int heap_type = HEAP_TYPES[graph.heap_type]
+
     #We transform the python variables in Cython variables
     O = origin
     D = destination
     nodes = graph.num_nodes
+    centroids = graph.centroids
 
      # initializes skim_matrix for output
     # initializes predecessors  and link connectors for output
     results.predecessors.fill(-1)
     results.connectors.fill(-1)
     results.temporary_skims.fill(-1)
-    skims = results.temporary_skims.shape[1]
-
-    for j in range(skims):
-        results.temporary_skims[O, j] = 0
-
 
     #In order to release the GIL for this procedure, we create all the
     #memmory views we will need
-    #print "creating views"
     cdef double [:] g_view = graph.cost
     cdef int [:] original_b_nodes_view = graph.b_node
     cdef int [:] graph_fs_view = graph.fs
     cdef double [:, :] graph_skim_view = graph.skims
     cdef int [:] ids_graph_view = graph.graph['link_id']
-    centroids = graph.centroids
 
     cdef int [:] predecessors_view = results.predecessors
     cdef int [:] conn_view = results.connectors
     cdef double [:, :] skim_matrix_view = results.temporary_skims
     cdef int [:] reached_first_view = results.reached_first
+    cdef int [::1] heap_elements_view = results.heap_elements
+    cdef int [::1] heap_positions_view = results.heap_positions
+    cdef double [::1] node_costs_view = results.node_costs
+    cdef int [:] b_nodes_view = results.temp_b_nodes
+    cdef int [:] destination_flags_view = np.zeros(1, ITYPE)
+
+    # point-to-point variables
+    cdef int [:] graph_bs_view
+    cdef int [:] bs_links_view
+    cdef int [:] a_nodes_view
+    cdef double [:, :] from_landmarks_view
+    cdef double [:, :] to_landmarks_view
+    cdef int [:] pred_links_view = results.predecessor_links
+    cdef int [:] succ_view = results.successors
+    cdef int [:] succ_links_view = results.successor_links
+    cdef int [::1] backward_elements_view = results.backward_heap_elements
+    cdef int [::1] backward_positions_view = results.backward_heap_positions
+    cdef double [::1] backward_costs_view = results.backward_node_costs
+
+    if 0 < D < results.nodes:
+        if graph.landmarks is not None:
+            from_landmarks_view = graph.from_landmarks
+            to_landmarks_view = graph.to_landmarks
+            with nogil:
+                meeting = astar_path_finding(O,
+                                             D,
+                                             centroids,
+                                             g_view,
+                                             graph_fs_view,
+                                             original_b_nodes_view,
+                                             from_landmarks_view,
+                                             to_landmarks_view,
+                                             predecessors_view,
+                                             pred_links_view,
+                                             heap_elements_view,
+                                             heap_positions_view,
+                                             node_costs_view)
+        else:
+            if graph.bs is False:
+                graph.build_backward_star()
+            graph_bs_view = graph.bs
+            bs_links_view = graph.bs_links
+            a_nodes_view = graph.graph['a_node']
+            with nogil:
+                meeting = bidirectional_path_finding(O,
+                                                     D,
+                                                     centroids,
+                                                     g_view,
+                                                     graph_fs_view,
+                                                     original_b_nodes_view,
+                                                     graph_bs_view,
+                                                     bs_links_view,
+                                                     a_nodes_view,
+                                                     predecessors_view,
+                                                     pred_links_view,
+                                                     succ_view,
+                                                     succ_links_view,
+                                                     heap_elements_view,
+                                                     heap_positions_view,
+                                                     node_costs_view,
+                                                     backward_elements_view,
+                                                     backward_positions_view,
+                                                     backward_costs_view)
+
+        if meeting >= 0:
+            # Half-path from the origin to the meeting node, then from the meeting node to the destination
+            all_nodes = [meeting]
+            all_links = []
+            p = meeting
+            while p != O:
+                all_links.append(pred_links_view[p])
+                p = predecessors_view[p]
+                all_nodes.append(p)
+            all_nodes.reverse()
+            all_links.reverse()
 
-    new_b_nodes = graph.b_node.copy()
-    cdef int [:] b_nodes_view = new_b_nodes
+            p = meeting
+            while p != D:
+                all_links.append(succ_links_view[p])
+                p = succ_view[p]
+                all_nodes.append(p)
 
+            results.path_nodes = np.asarray(all_nodes, np.int64)
+            links = np.asarray(all_links, np.int64)
+            results.path = graph.graph['link_id'][links].astype(np.int64)
 
-    #Now we do all procedures with NO GIL
-    #print "start computation"
-    with nogil:
-        blocking_centroid_flows(O,
-                                centroids,
-                                graph_fs_view,
-                                original_b_nodes_view,
-                                b_nodes_view)
+            milepost = np.zeros((results.path_nodes.shape[0], graph.skims.shape[1]), np.float64)
+            milepost[1:, :] = np.cumsum(graph.skims[links, :], axis=0)
+            results.milepost = milepost
 
-        w = path_finding(O,
-                         g_view,
-                         b_nodes_view,
-                         graph_fs_view,
-                         predecessors_view,
-                         ids_graph_view,
-                         conn_view,
-                         reached_first_view)
-
-    if 0<= D < results.nodes:
-        p = predecessors_view[D]
-        all_connectors = []
-        all_nodes = [D]
-        milepost = [skim_matrix_view[D]]
-        if p >= 0:
-            while p > 0:
-                all_connectors.append(conn_view[D])
-                all_nodes.append(p)
-                milepost.append(skim_matrix_view[p])
-                D = p
-                p = predecessors_view[p]
-            results.path = np.asarray(all_connectors, np.int64)[::-1]
-            results.path_nodes = np.asarray(all_nodes, np.int64)[::-1]
-            results.milepost =  np.asarray(milepost, np.float64)[::-1]
+            # The path is also stored as a partial tree
+            last = results.path_nodes.shape[0] - 1
+            results.predecessors.fill(-1)
+            results.predecessors[results.path_nodes[1:]] = results.path_nodes[:last]
+            results.connectors[results.path_nodes[1:]] = results.path
+            results.temporary_skims[results.path_nodes, :] = milepost
+            results.path_nodes = graph.external_nodes(results.path_nodes).astype(np.int64)
 
             del all_nodes
-            del all_connectors
+            del all_links
             del milepost
 
+    else:
+        #Now we do all procedures with NO GIL
+        with nogil:
+            blocking_centroid_flows(O,
+                                    centroids,
+                                    graph_fs_view,
+                                    original_b_nodes_view,
+                                    b_nodes_view)
+
+            w = path_finding(O,
+                             g_view,
+                             b_nodes_view,
+                             graph_fs_view,
+                             predecessors_view,
+                             ids_graph_view,
+                             conn_view,
+                             reached_first_view,
+                             graph_skim_view,
+                             skim_matrix_view,
+                             heap_elements_view,
+                             heap_positions_view,
+                             node_costs_view,
+                             destination_flags_view,
+                             -1,
+                             heap_type)
 
 
 @cython.wraparound(False)
 @cython.embedsignature(True)
-@cython.boundscheck(False)
-cdef int _copy_skims_check_path(double[:,:] skim_matrix,  #Skim matrix computed from one origin to all nodes
-                     double[:,:] final_skim_matrix,
-                     int [:] no_path) nogil:  #Skim matrix computed for one origin to all other centroids only
+@cython.boundscheck(False) # turn of bounds-checking for entire function
+cpdef int path_finding(int origin,
+                       double[:] graph_costs,
+                       int [:] csr_indices,
+                       int [:] graph_fs,
+                       int [:] pred,
+                       int [:] ids,
+                       int [:] connectors,
+                       int [:] reached_first,
+                       double[:, :] graph_skims,
+                       double[:, :] skim_matrix,
+                       int [::1] heap_elements,
+                       int [::1] heap_positions,
+                       double [::1] node_costs,
+                       int [:] destination_flags,
+                       int destinations,
+                       int heap_type) nogil:
+
+    # Dispatches the tree building to the heap engine chosen for the graph. All engines produce the same
+    # tree (up to ties in cost) and return the index of the last node in reached_first.
+    # heap_elements, heap_positions and node_costs are a workspace sized to the number of nodes, allocated once
+    # per thread (see MultiThreadedAoN) and reused for every origin.
+    # Skims for all fields in graph_skims are accumulated along the tree while it is built, so skim_matrix holds
+    # the skims from the origin to every node reached without any further pass over the tree.
+    # If destinations is not negative, the search stops as soon as that many nodes flagged in destination_flags
+    # (indexed by centroid) have been settled. Nodes that were labelled but not settled are then left without
+    # predecessor, so the partial tree only contains shortest paths and can be loaded as usual
+    if heap_type == FIBONACCI_HEAP:
+        return fibonacci_path_finding(origin,
+                                      graph_costs,
+                                      csr_indices,
+                                      graph_fs,
+                                      pred,
+                                      ids,
+                                      connectors,
+                                      reached_first,
+                                      graph_skims,
+                                      skim_matrix,
+                                      destination_flags,
+                                      destinations)
+
+    return d_ary_path_finding(origin,
+                              graph_costs,
+                              csr_indices,
+                              graph_fs,
+                              pred,
+                              ids,
+                              connectors,
+                              reached_first,
+                              graph_skims,
+                              skim_matrix,
+                              heap_elements,
+                              heap_positions,
+                              node_costs,
+                              destination_flags,
+                              destinations,
+                              heap_type)
 
-    cdef int i, j
-    cdef int N = final_skim_matrix.shape[0]
-    cdef int skims = final_skim_matrix.shape[1]
 
-    for i in range(N):
-        if skim_matrix[i,0] == INFINITE:
-            no_path[j] = -1
-        for j in range(skims):
-            final_skim_matrix[i,j] = skim_matrix[i,j]
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False) # turn of bounds-checking for entire function
+cdef int d_ary_path_finding(int origin,
+                            double[:] graph_costs,
+                            int [:] csr_indices,
+                            int [:] graph_fs,
+                            int [:] pred,
+                            int [:] ids,
+                            int [:] connectors,
+                            int [:] reached_first,
+                            double[:, :] graph_skims,
+                            double[:, :] skim_matrix,
+                            int [::1] heap_elements,
+                            int [::1] heap_positions,
+                            double [::1] node_costs,
+                            int [:] destination_flags,
+                            int destinations,
+                            int arity) nogil:
+
+    cdef unsigned int M = pred.shape[0]
+    cdef unsigned int skims = skim_matrix.shape[1]
+    cdef int zones = destination_flags.shape[0]
+
+    cdef int i, j, k, j_current
+    cdef ITYPE_t v
+    cdef ITYPE_t found = 0
+    cdef DTYPE_t new_cost
+
+    cdef DAryHeap heap
+    cdef ITYPE_t *positions = <ITYPE_t*> &heap_positions[0]
+    cdef DTYPE_t *keys = &node_costs[0]
+
+    for i in range(M):
+        pred[i] = -1
+        connectors[i] = -1
+
+    dary_initialize(&heap, <ITYPE_t*> &heap_elements[0], positions, keys, M, arity)
+    dary_push(&heap, origin, 0)
+    for k in range(skims):
+        skim_matrix[origin, k] = 0
+
+    while heap.size > 0:
+        v = dary_pop(&heap)
+        reached_first[found] = v
+        found += 1
 
-    return 1
+        if destinations >= 0:
+            if v < zones and destination_flags[v]:
+                destinations -= 1
+            if destinations == 0:
+                # Nodes still in the heap only have tentative labels
+                for i in range(heap.size):
+                    pred[heap.elements[i]] = -1
+                    connectors[heap.elements[i]] = -1
+                break
+
+        for j in xrange(graph_fs[v], graph_fs[v + 1]):
+            j_current = csr_indices[j]
+
+            if positions[j_current] != SCANNED:
+                new_cost = keys[v] + graph_costs[j]
+                if positions[j_current] == NOT_IN_HEAP:
+                    dary_push(&heap, j_current, new_cost)
+                    pred[j_current] = v
+                    connectors[j_current] = ids[j]
+                    for k in range(skims):
+                        skim_matrix[j_current, k] = skim_matrix[v, k] + graph_skims[j, k]
+
+                elif keys[j_current] > new_cost:
+                    dary_decrease_key(&heap, j_current, new_cost)
+                    pred[j_current] = v
+                    #The link that took us to such node
+                    connectors[j_current] = ids[j]
+                    for k in range(skims):
+                        skim_matrix[j_current, k] = skim_matrix[v, k] + graph_skims[j, k]
 
+    return found -1
 
 
 # ###########################################################################################################################
@@ -406,23 +870,29 @@ cdef int _copy_skims_check_path(double[:,:] skim_matrix,  #Skim matrix computed
 #The old Pyrex syntax for loops was replaced with Python syntax
 #Old Numpy Buffers were replaces with latest memory views interface to allow for the release of the GIL
 # Path tracking arrays and skim arrays were also added to it
+# It is kept as the reference heap engine (heap_type = 'fibonacci')
 #############################################################################################################################
 # ###########################################################################################################################
 
 @cython.wraparound(False)
 @cython.embedsignature(True)
 @cython.boundscheck(False) # turn of bounds-checking for entire function
-cpdef int path_finding(int origin,
-                       double[:] graph_costs,
-                       int [:] csr_indices,
-                       int [:] graph_fs,
-                       int [:] pred,
-                       int [:] ids,
-                       int [:] connectors,
-                       int [:] reached_first) nogil:
+cdef int fibonacci_path_finding(int origin,
+                                double[:] graph_costs,
+                                int [:] csr_indices,
+                                int [:] graph_fs,
+                                int [:] pred,
+                                int [:] ids,
+                                int [:] connectors,
+                                int [:] reached_first,
+                                double[:, :] graph_skims,
+                                double[:, :] skim_matrix,
+                                int [:] destination_flags,
+                                int destinations) nogil:
 
-    cdef unsigned int N = graph_costs.shape[0]
     cdef unsigned int M = pred.shape[0]
+    cdef unsigned int skims = skim_matrix.shape[1]
+    cdef int zones = destination_flags.shape[0]
 
     cdef int i, k, j_source, j_current
     cdef ITYPE_t found = 0
@@ -432,18 +902,20 @@ cpdef int path_finding(int origin,
     cdef FibonacciHeap heap
     cdef FibonacciNode *v
     cdef FibonacciNode *current_node
-    cdef FibonacciNode *nodes = <FibonacciNode*> malloc(N * sizeof(FibonacciNode))
+    cdef FibonacciNode *nodes = <FibonacciNode*> malloc(M * sizeof(FibonacciNode))
 
     for i in range(M):
         pred[i] = -1
         connectors[i] = -1
 
     j_source = origin
-    for k in range(N):
+    for k in range(M):
         initialize_node(&nodes[k], k)
 
     heap.min_node = NULL
     insert_node(&heap, &nodes[j_source])
+    for k in range(skims):
+        skim_matrix[j_source, k] = 0
 
     while heap.min_node:
         v = remove_min(&heap)
@@ -451,6 +923,17 @@ cpdef int path_finding(int origin,
         found += 1
         v.state = 1
 
+        if destinations >= 0:
+            if v.index < zones and destination_flags[v.index]:
+                destinations -= 1
+            if destinations == 0:
+                # Nodes still in the heap only have tentative labels
+                for i in range(M):
+                    if nodes[i].state == 3:
+                        pred[i] = -1
+                        connectors[i] = -1
+                break
+
         for j in xrange(graph_fs[v.index],graph_fs[v.index + 1]):
             j_current = csr_indices[j]
             current_node = &nodes[j_current]
@@ -463,6 +946,8 @@ cpdef int path_finding(int origin,
                     insert_node(&heap, current_node)
                     pred[j_current] = v.index
                     connectors[j_current] = ids[j]
+                    for k in range(skims):
+                        skim_matrix[j_current, k] = skim_matrix[v.index, k] + graph_skims[j, k]
 
                 elif current_node.val > v.val + weight:
                     decrease_val(&heap, current_node,
@@ -470,6 +955,8 @@ cpdef int path_finding(int origin,
                     pred[j_current] = v.index
                     #The link that took us to such node
                     connectors[j_current] = ids[j]
+                    for k in range(skims):
+                        skim_matrix[j_current, k] = skim_matrix[v.index, k] + graph_skims[j, k]
 
     free(nodes)
     return found -1
@@ -13,7 +13,12 @@ from graph import Graph
 from .results import *
 from assignment import *
 from multi_threaded_aon import MultiThreadedAoN
+from multi_process_aon import MultiProcessAoN
+from vdf import VDF
+from equilibrium import EquilibriumAssignment
+from bush_based import BushBasedAssignment
+from contraction_hierarchy import ContractionHierarchy, contraction_hierarchy_skims
 try:
-    from AoN import one_to_all, path_computation, VERSION
+    from AoN import one_to_all, all_to_all, path_computation, VERSION, HEAP_TYPES, OPENMP
 except:
     pass
\ No newline at end of file
@@ -0,0 +1,249 @@
+"""
+ -----------------------------------------------------------------------------------------------------------
+ Package:    AequilibraE
+
+ Name:       All-or-nothing assignment for all origins
+ Purpose:    Builds and loads the trees of all origins of a matrix without going back to Python in between
+
+ Original Author:  Pedro Camargo (c@margo.co)
+ Contributors:
+ Last edited by: Pedro Camargo
+
+ Website:    www.AequilibraE.com
+ Repository:  https://github.com/AequilibraE/AequilibraE
+
+ Created:    2026-10-18
+ Updated:
+ Copyright:   (c) AequilibraE authors
+ Licence:     See LICENSE.TXT
+ -----------------------------------------------------------------------------------------------------------
+
+ one_to_all builds all its memory views (and checks the graph) for every origin while holding the GIL, so threads
+ calling it spend a good part of their time waiting for each other. Here all views are built once and the origins
+ are split among the OpenMP threads (prange), each one using its own row of the MultiThreadedAoN buffers.
+ The results are the same as calling one_to_all for every origin with demand.
+
+ If the module was compiled without OpenMP (see OPENMP), prange runs all origins in sequence.
+
+ aux_result.thread_report has the same keys as the one of the threaded loading in assignment.py. 'time' is the wall
+ time (omp_get_wtime) each thread spent on its origins. Origins are handed out one at a time (dynamic schedule), so
+ no thread takes work queued for another and 'stolen chunks' is always 0.
+ """
+
+from cython.parallel cimport prange, threadid
+
+cdef extern from *:
+    """
+    #ifdef _OPENMP
+    #include <omp.h>
+    #define AEQ_OPENMP 1
+    static double aeq_wall_time(void) { return omp_get_wtime(); }
+    #else
+    #include <time.h>
+    #define AEQ_OPENMP 0
+    static double aeq_wall_time(void) { return (double) clock() / CLOCKS_PER_SEC; }
+    #endif
+    """
+    int AEQ_OPENMP
+    double aeq_wall_time() nogil
+
+# Whether the module was compiled with OpenMP (i.e. if all_to_all runs in parallel)
+OPENMP = AEQ_OPENMP == 1
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+def all_to_all(matrix, graph, result, aux_result, early_exit=None, origins=None):
+    # Loads all origins with demand in matrix. Returns the list of problems found (same messages as one_to_all)
+    # matrix: zones x zones, or zones x zones x classes to load several user classes on the same trees, or a CSR
+    #         matrix (single class, see demand.py) with int32 indices and float64 data
+    # origins: order in which the origins are handed to the threads (all origins with demand, in order, if None)
+    cdef int k, O, th, w, destinations, first, last
+    cdef double started
+    cdef int sparse = hasattr(matrix, 'indptr')
+    cdef int n_origins, nodes, centroids, block_flows_through_centroids
+    cdef int early_exit_mode = 0
+    cdef int cores = result.cores
+    report = []
+
+    if result.__graph_id__ != graph.__id__:
+        return ["Results object not prepared. Use --> results.prepare(graph)"]
+
+    if VERSION != graph.__version__:
+        return ['This graph was created for a different version of AequilibraE. Please re-create it']
+
+    if graph.heap_type not in HEAP_TYPES:
+        return ['Heap type ' + str(graph.heap_type) + ' is not available. Use one of ' + str(HEAP_TYPES.keys())]
+    cdef int heap_type = HEAP_TYPES[graph.heap_type]
+
+    if early_exit not in EARLY_EXIT_MODES:
+        return ['Early exit mode ' + str(early_exit) + ' is not available. Use one of ' + str(EARLY_EXIT_MODES)]
+    early_exit_mode = EARLY_EXIT_MODES.index(early_exit)
+
+    if aux_result.predecessors is None or aux_result.predecessors.shape[0] != result.cores:
+        return ['Auxiliary results not prepared for these results. Use --> aux_result.prepare(graph, results)']
+
+    if matrix.shape[1] > result.zones:
+        return ['Matrix has more zones than the graph']
+
+    if result.critical_links['save']:
+        return ['Select link analysis is not available for all_to_all. Use one_to_all']
+
+    if result.path_file['save']:
+        return ['The path file is not available for all_to_all. Use one_to_all']
+
+    # One matrix per user class (the last dimension). A sparse matrix has a single class
+    if sparse:
+        indptr, indices, data = matrix.indptr, matrix.indices, matrix.data
+        rows = np.repeat(np.arange(matrix.shape[0]), np.diff(indptr))
+        totals = np.bincount(rows, weights=data, minlength=matrix.shape[0])
+        matrix = np.zeros((1, 1, 1))
+    else:
+        if matrix.ndim == 2:
+            matrix = matrix[:, :, np.newaxis]
+        indptr, indices, data = np.zeros(1, ITYPE), np.zeros(1, ITYPE), np.zeros(1, DTYPE)
+        totals = np.sum(np.sum(matrix, axis=2), axis=1)
+
+    if aux_result.temp_link_loads.shape[2] != matrix.shape[2]:
+        return ['Auxiliary results prepared for ' + str(aux_result.temp_link_loads.shape[2]) + ' user classes']
+
+    if origins is None:
+        origins = np.nonzero(totals > 0)[0]
+
+    # Same checks one_to_all does for each origin
+    valid_origins = []
+    for O in origins:
+        if O >= result.zones:
+            report.append("Centroid " + str(O) + " is outside the range of zones in the graph")
+        elif O > graph.num_nodes or graph.fs[O] == graph.fs[O + 1]:
+            report.append("Centroid " + str(O) + " does not exist in the graph")
+        else:
+            valid_origins.append(O)
+
+    n_origins = len(valid_origins)
+    nodes = graph.num_nodes + 1
+    centroids = graph.centroids
+    block_flows_through_centroids = graph.block_centroid_flows
+
+    cdef int [:] origins_view = np.array(valid_origins, dtype=ITYPE)
+    loaded_by = np.zeros(n_origins, dtype=ITYPE)
+    cdef int [:] loaded_by_view = loaded_by
+    thread_time = np.zeros(cores, dtype=DTYPE)
+    cdef double [:] thread_time_view = thread_time
+    cdef double [:, :, :] demand_view = matrix
+    cdef int [:] indptr_view = indptr
+    cdef int [:] indices_view = indices
+    cdef double [:] data_view = data
+
+    # views from the graph
+    cdef int [:] graph_fs_view = graph.fs
+    cdef double [:] g_view = graph.cost
+    cdef int [:] ids_graph_view = graph.ids
+    cdef int [:] original_b_nodes_view = graph.b_node
+    cdef double [:, :] graph_skim_view = graph.skims
+
+    # views from the result object
+    cdef double [:, :, :] final_skim_matrices_view = result.skims
+    cdef int [:, :] no_path_view = result.no_path
+
+    # views from the aux-result object
+    cdef int [:, :] predecessors_view = aux_result.predecessors
+    cdef double [:, :, :] skim_matrix_view = aux_result.temporary_skims
+    cdef int [:, :] reached_first_view = aux_result.reached_first
+    cdef int [:, :] conn_view = aux_result.connectors
+    cdef double [:, :, :] link_loads_view = aux_result.temp_link_loads
+    cdef double [:, :, :] node_load_view = aux_result.temp_node_loads
+    cdef int [:, :] b_nodes_view = aux_result.temp_b_nodes
+    cdef int [:, ::1] heap_elements_view = aux_result.heap_elements
+    cdef int [:, ::1] heap_positions_view = aux_result.heap_positions
+    cdef double [:, ::1] node_costs_view = aux_result.node_costs
+    cdef int [:, :] destination_flags_view = aux_result.destination_flags
+    cdef int [:] connected_view = aux_result.connected_centroids
+    cdef int [:] settled_view = aux_result.settled
+
+    with nogil:
+        for k in prange(n_origins, schedule='dynamic', chunksize=1, num_threads=cores):
+            th = threadid()
+            started = aeq_wall_time()
+            O = origins_view[k]
+
+            destinations = -1
+            if sparse:
+                first = indptr_view[O]
+                last = indptr_view[O + 1]
+                if early_exit_mode > 0:
+                    destinations = flag_sparse_destinations(indices_view[first:last],
+                                                            data_view[first:last],
+                                                            destination_flags_view[th, :],
+                                                            connected_view,
+                                                            early_exit_mode == 2)
+            elif early_exit_mode > 0:
+                destinations = flag_destinations(demand_view[O, :, :],
+                                                 destination_flags_view[th, :],
+                                                 connected_view,
+                                                 early_exit_mode == 2)
+
+            if block_flows_through_centroids:
+                blocking_centroid_flows(O,
+                                        centroids,
+                                        graph_fs_view,
+                                        original_b_nodes_view,
+                                        b_nodes_view[th, :])
+            w = path_finding(O,
+                             g_view,
+                             b_nodes_view[th, :],
+                             graph_fs_view,
+                             predecessors_view[th, :],
+                             ids_graph_view,
+                             conn_view[th, :],
+                             reached_first_view[th, :],
+                             graph_skim_view,
+                             skim_matrix_view[th, :, :],
+                             heap_elements_view[th, :],
+                             heap_positions_view[th, :],
+                             node_costs_view[th, :],
+                             destination_flags_view[th, :],
+                             destinations,
+                             heap_type)
+
+            if sparse:
+                sparse_network_loading(indices_view[first:last],
+                                       data_view[first:last],
+                                       predecessors_view[th, :],
+                                       conn_view[th, :],
+                                       link_loads_view[th, :, 0],
+                                       reached_first_view[th, :],
+                                       node_load_view[th, :, 0],
+                                       w)
+            else:
+                network_loading(O,
+                                nodes,
+                                demand_view[O, :, :],
+                                predecessors_view[th, :],
+                                conn_view[th, :],
+                                link_loads_view[th, :, :],
+                                no_path_view[O, :],
+                                reached_first_view[th, :],
+                                node_load_view[th, :, :],
+                                w)
+
+            _copy_skims(O,
+                        skim_matrix_view[th, :, :],
+                        predecessors_view[th, :],
+                        final_skim_matrices_view[O, :, :],
+                        no_path_view[O, :],
+                        destination_flags_view[th, :],
+                        connected_view,
+                        destinations >= 0)
+
+            settled_view[O] = w + 1
+            loaded_by_view[k] = th
+            thread_time_view[th] += aeq_wall_time() - started
+
+    settled = aux_result.settled[valid_origins]
+    aux_result.thread_report = [{'origins': int(np.sum(loaded_by == th)),
+                                 'settled nodes': int(np.sum(settled[loaded_by == th])),
+                                 'stolen chunks': 0,
+                                 'time': float(thread_time[th])} for th in range(cores)]
+    return report
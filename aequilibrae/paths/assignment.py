@@ -31,53 +31,156 @@ except:
     pass
 
 import numpy as np
+from collections import deque
+from time import time
 from multiprocessing.dummy import Pool as ThreadPool
-import thread
 
 from multi_threaded_aon import MultiThreadedAoN
+from multi_process_aon import MultiProcessAoN
+from demand import is_sparse, as_csr, origin_totals, destinations_per_origin, sparse_row
 no_binaries = False
 try:
-    from AoN import one_to_all, path_computation
+    from AoN import one_to_all, path_computation, all_to_all, OPENMP
 except:
     no_binaries = True
+    OPENMP = False
+
+# Number of chunks of origins for each thread. More chunks balance the work better, at the cost of more queue operations
+CHUNKS_PER_THREAD = 8
 
 def main():
     pass
 
 
-def all_or_nothing(matrix, graph, results):
-    aux_res = MultiThreadedAoN()
-    aux_res.prepare(graph, results)
+def all_or_nothing(matrix, graph, results, early_exit=None, aux_res=None):
+    # matrix: zones x zones, or zones x zones x classes for several user classes. All classes are loaded on the same
+    #         trees, with the loads of each class in results.class_link_loads (links x classes) and their sum in
+    #         results.link_loads
+    #         A scipy.sparse matrix (single class) is loaded without densifying it (see demand.py)
+    # early_exit: None computes the full tree for each origin
+    #             'demand' stops path finding when all destinations with demand were reached. Skims to other
+    #                      centroids are not computed: they are left as they were, with no_path = 1 (instead of -1
+    #                      for destinations that can not be reached)
+    #             'centroids' stops path finding when all centroids were reached
+    # aux_res: MultiThreadedAoN already prepared for this graph and results. Iterative procedures should pass one
+    #          to avoid allocating all the buffers at every call
+    #          A prepared MultiProcessAoN loads the origins in its worker processes instead
+    # When AoN was compiled with OpenMP, all origins are loaded by all_to_all in a single call that does not hold the
+    # GIL. Select link analysis (see AssignmentResults.setCriticalLinks) and the path file still go through one_to_all
+    #
+    # Origins are handed to the threads from the most to the least expected work (see schedule_origins), so the long
+    # ones do not end up running alone at the end. What each thread did is left in aux_res.thread_report: origins,
+    # settled nodes, stolen chunks and time (the same keys with and without OpenMP, see all_to_all.pxi)
+    if isinstance(aux_res, MultiProcessAoN):
+        return aux_res.execute(matrix, graph, results, early_exit)
+
+    classes = 1
+    if is_sparse(matrix):
+        matrix = as_csr(matrix)
+    elif matrix.ndim == 3:
+        classes = matrix.shape[2]
+
+    if aux_res is None:
+        aux_res = MultiThreadedAoN()
+        aux_res.prepare(graph, results, classes)
+    elif aux_res.classes != classes:
+        raise ValueError('aux_res was prepared for ' + str(aux_res.classes) + ' user classes')
+    else:
+        aux_res.temp_link_loads.fill(0)
+        aux_res.sl_link_loads.fill(0)
 
     # catch errors
     if results.__graph_id__ is None:
         raise ValueError('The results object was not prepared. Use results.prepare(graph)')
     elif results.__graph_id__ != graph.__id__:
         raise ValueError('The results object was prepared for a different graph')
+    if matrix.shape[1] > results.zones:
+        return ['Matrix has more zones than the graph']
+    if results.critical_links['save']:
+        if aux_res.sl_link_loads.shape[2] != results.critical_links['sizes'].shape[0]:
+            raise ValueError('aux_res was not prepared for select link analysis. Use aux_res.prepare(graph, results)')
+        results.critical_links['od'] = []
+    if results.path_file['save']:
+        results.path_file['results'].reset()
+
+    origins = schedule_origins(matrix, aux_res)
+    if OPENMP and not results.critical_links['save'] and not results.path_file['save']:
+        report = all_to_all(matrix, graph, results, aux_res, early_exit, origins)
     else:
-        pool = ThreadPool(results.cores)
-        all_threads = {'count': 0}
+        cores = results.cores
+        chunk_size = max(1, origins.shape[0] // (cores * CHUNKS_PER_THREAD))
+        queues = [deque() for th in range(cores)]
+        for i, k in enumerate(range(0, origins.shape[0], chunk_size)):
+            queues[i % cores].append(origins[k:k + chunk_size])
+
         report = []
-        for O in range(matrix.shape[0]):
-            a = matrix[O, :]
-            if np.sum(a) > 0:
-                pool.apply_async(func_assig_thread, args=(O, a, graph, results, aux_res, all_threads, report))
+        aux_res.thread_report = [None] * cores
+        pool = ThreadPool(cores)
+        pool.map(lambda th: func_assig_thread(th, queues, matrix, graph, results, aux_res, report, early_exit),
+                 range(cores))
         pool.close()
         pool.join()
-    results.link_loads = np.sum(aux_res.temp_link_loads, axis=1)
+    loads = np.sum(aux_res.temp_link_loads, axis=0)
+    results.link_loads = np.sum(loads, axis=1)
+    results.class_link_loads = loads if matrix.ndim == 3 else None
+    if results.critical_links['save']:
+        results.gather_critical_links(aux_res)
+    if results.path_file['save']:
+        results.path_file['results'].flush()
     return report
 
 
-def func_assig_thread(O, a, g, res, aux_res, all_threads, report):
-    if thread.get_ident() in all_threads:
-        th = all_threads[thread.get_ident()]
-    else:
-        all_threads[thread.get_ident()] = all_threads['count']
-        th = all_threads['count']
-        all_threads['count'] += 1
-    a = one_to_all(O, a, g, res, aux_res, th)
-    if a != O:
-        report.append(a)
+def schedule_origins(matrix, aux_res):
+    # Origins with demand, from the most to the least expected work. That is the number of nodes settled the last
+    # time the origin was loaded or, for the ones never loaded, the number of destinations with demand
+    origins = np.nonzero(origin_totals(matrix) > 0)[0]
+    work = destinations_per_origin(matrix)[origins]
+    loaded = origins < aux_res.settled.shape[0]
+    settled = np.zeros(origins.shape[0], np.int64)
+    settled[loaded] = aux_res.settled[origins[loaded]]
+    work = np.where(settled > 0, settled, work)
+    return origins[np.argsort(-work, kind='mergesort')]
+
+
+def func_assig_thread(th, queues, matrix, g, res, aux_res, report, early_exit=None):
+    # Each thread loads the chunks in its own queue, from the front, and then takes chunks from the back of the
+    # queues of the other threads (the ones with the least work)
+    t = time()
+    sparse = is_sparse(matrix)
+    origins = 0
+    settled = 0
+    stolen = 0
+    while True:
+        try:
+            chunk = queues[th].popleft()
+        except IndexError:
+            chunk = steal_chunk(queues)
+            if chunk is None:
+                break
+            stolen += 1
+        for O in chunk:
+            demand = sparse_row(matrix, O) if sparse else matrix[O, :]
+            a = one_to_all(O, demand, g, res, aux_res, th, early_exit)
+            if a != O:
+                report.append(a)
+            else:
+                settled += aux_res.settled[O]
+        origins += chunk.shape[0]
+
+    aux_res.thread_report[th] = {'origins': origins,
+                                 'settled nodes': int(settled),
+                                 'stolen chunks': stolen,
+                                 'time': time() - t}
+
+
+def steal_chunk(queues):
+    # deque operations are atomic, so a queue may be emptied by another thread between len and pop
+    for queue in sorted(queues, key=len, reverse=True):
+        try:
+            return queue.pop()
+        except IndexError:
+            pass
+    return None
 
 
 if __name__ == '__main__':
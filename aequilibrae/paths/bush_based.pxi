@@ -0,0 +1,498 @@
+"""
+ -----------------------------------------------------------------------------------------------------------
+ Package:    AequilibraE
+
+ Name:       Bush-based assignment
+ Purpose:    Per-origin routines for Algorithm B (Dial, 2006)
+
+ Original Author:  Pedro Camargo (c@margo.co)
+ Contributors:
+ Last edited by: Pedro Camargo
+
+ Website:    www.AequilibraE.com
+ Repository:  https://github.com/AequilibraE/AequilibraE
+
+ Created:    2026-10-18
+ Updated:
+ Copyright:   (c) AequilibraE authors
+ Licence:     See LICENSE.TXT
+ -----------------------------------------------------------------------------------------------------------
+
+ A bush is the acyclic set of links used by an origin. Between iterations it is kept compact, as the graph positions
+ of its links (sorted, so in the order of the graph's forward star) and the flow of the origin on each of them. While
+ an origin is worked on, its bush is spread over per-thread arrays with one flag and one flow per link, so it is
+ searched with the same fs/b_node arrays as the graph, and then gathered back (bush_spread / bush_gather). Memory is
+ therefore proportional to the size of the bushes, plus two link arrays per thread.
+
+ Each origin iteration:
+    1. Removes unused links that are not in its shortest path tree and adds the links (i, j) that satisfy
+       U(i) + t(i, j) < U(j), where U is the longest path cost in the bush. All bush links go up in U, so the bush
+       stays acyclic
+    2. Goes through the nodes in reverse topological order, moving flow from the longest used path to the shortest
+       path (from the node where they diverge). The amount is a Newton step, limited by the flow on the longest path
+
+ Link flows, costs and derivatives are updated as flow is moved, so the next origin sees the new costs. When origins
+ run in parallel these arrays are shared by all threads without locks (a concurrent update of the same link can be
+ lost), so the caller recomputes them from the bush flows after each iteration.
+ Centroids other than the origin cannot be the tail of a bush link if centroid flows are blocked.
+ """
+
+cdef double BUSH_FLOW_EPSILON = 1e-10
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef void bush_spread(int [:] bush_links,
+                      double [:] bush_link_flows,
+                      unsigned char [:] bush,
+                      double [:] bush_flows) nogil:
+    # Compact bush to the per-link arrays (which have to be clear)
+    cdef unsigned int i
+    for i in range(bush_links.shape[0]):
+        bush[bush_links[i]] = 1
+        bush_flows[bush_links[i]] = bush_link_flows[i]
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef int bush_size(unsigned char [:] bush) nogil:
+    cdef unsigned int j
+    cdef int size = 0
+    for j in range(bush.shape[0]):
+        if bush[j]:
+            size += 1
+    return size
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef void bush_gather(unsigned char [:] bush,
+                      double [:] bush_flows,
+                      int [:] bush_links,
+                      double [:] bush_link_flows) nogil:
+    # Per-link arrays to the compact bush (sized with bush_size). The per-link arrays are left clear
+    cdef unsigned int j
+    cdef int i = 0
+    for j in range(bush.shape[0]):
+        if bush[j]:
+            bush_links[i] = j
+            bush_link_flows[i] = bush_flows[j]
+            i += 1
+        bush[j] = 0
+        bush_flows[j] = 0
+
+
+cdef object compact_bush(unsigned char [:] bush, double [:] bush_flows):
+    cdef int size
+    with nogil:
+        size = bush_size(bush)
+    bush_links = np.zeros(size, ITYPE)
+    bush_link_flows = np.zeros(size, DTYPE)
+    cdef int [:] bush_links_view = bush_links
+    cdef double [:] bush_link_flows_view = bush_link_flows
+    with nogil:
+        bush_gather(bush, bush_flows, bush_links_view, bush_link_flows_view)
+    return bush_links, bush_link_flows
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef int bush_topological_order(int origin,
+                                int [:] graph_fs,
+                                int [:] b_nodes,
+                                unsigned char [:] bush,
+                                int [:] indegree,
+                                int [:] order) nogil:
+    # Kahn's algorithm from the origin. Returns the number of nodes in the bush (listed in order)
+    cdef unsigned int i, j
+    cdef int v, w
+    cdef int first = 0
+    cdef int last = 1
+    cdef unsigned int nodes = indegree.shape[0]
+    cdef unsigned int links = b_nodes.shape[0]
+
+    for i in range(nodes):
+        indegree[i] = 0
+    for j in range(links):
+        if bush[j]:
+            indegree[b_nodes[j]] += 1
+
+    order[0] = origin
+    while first < last:
+        v = order[first]
+        first += 1
+        for j in range(graph_fs[v], graph_fs[v + 1]):
+            if bush[j]:
+                w = b_nodes[j]
+                indegree[w] -= 1
+                if indegree[w] == 0:
+                    order[last] = w
+                    last += 1
+    return last
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef void bush_labels(int origin,
+                      int found,
+                      int [:] order,
+                      int [:] graph_fs,
+                      int [:] b_nodes,
+                      unsigned char [:] bush,
+                      double [:] bush_flows,
+                      double [:] costs,
+                      double [:] min_cost,
+                      int [:] min_pred,
+                      double [:] max_cost,
+                      int [:] max_pred,
+                      int used_only) nogil:
+    # Shortest and longest path costs (and the link used to get to each node) over the bush.
+    # If used_only, the longest paths only go through links with flow. Nodes without one have a max_cost of -1
+    cdef unsigned int i, j
+    cdef int k, v, w
+    cdef unsigned int nodes = min_cost.shape[0]
+
+    for i in range(nodes):
+        min_cost[i] = INFINITE
+        max_cost[i] = -1
+        min_pred[i] = -1
+        max_pred[i] = -1
+    min_cost[origin] = 0
+    max_cost[origin] = 0
+
+    for k in range(found):
+        v = order[k]
+        for j in range(graph_fs[v], graph_fs[v + 1]):
+            if not bush[j]:
+                continue
+            w = b_nodes[j]
+            if min_cost[v] + costs[j] < min_cost[w]:
+                min_cost[w] = min_cost[v] + costs[j]
+                min_pred[w] = j
+            if max_cost[v] >= 0 and (not used_only or bush_flows[j] > BUSH_FLOW_EPSILON):
+                if max_cost[v] + costs[j] > max_cost[w]:
+                    max_cost[w] = max_cost[v] + costs[j]
+                    max_pred[w] = j
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef int bush_initial_tree(int origin,
+                           int blocked_centroids,
+                           double [:] demand,
+                           double [:] costs,
+                           int [:] graph_fs,
+                           int [:] a_nodes,
+                           int [:] b_nodes,
+                           unsigned char [:] bush,
+                           double [:] bush_flows,
+                           int [:] pred,
+                           int [:] order,
+                           double [:] node_load,
+                           int [::1] heap_elements,
+                           int [::1] heap_positions,
+                           double [::1] node_costs) nogil:
+    # The first bush is the shortest path tree, with all the demand from the origin loaded on it.
+    # Returns the number of nodes reached
+    cdef unsigned int M = node_costs.shape[0]
+    cdef unsigned int zones = demand.shape[0]
+    cdef unsigned int links = b_nodes.shape[0]
+    cdef unsigned int i
+    cdef int j, k, v, w
+    cdef int found = 0
+    cdef DTYPE_t new_cost
+
+    cdef DAryHeap heap
+
+    for i in range(M):
+        pred[i] = -1
+        node_load[i] = 0
+    for i in range(links):
+        bush[i] = 0
+        bush_flows[i] = 0
+
+    dary_initialize(&heap, <ITYPE_t*> &heap_elements[0], <ITYPE_t*> &heap_positions[0], &node_costs[0], M, 4)
+    dary_push(&heap, origin, 0)
+
+    while heap.size > 0:
+        v = dary_pop(&heap)
+        order[found] = v
+        found += 1
+        if v <= blocked_centroids and v != origin:
+            continue
+
+        for j in range(graph_fs[v], graph_fs[v + 1]):
+            w = b_nodes[j]
+            if heap_positions[w] == SCANNED:
+                continue
+            new_cost = node_costs[v] + costs[j]
+            if heap_positions[w] == NOT_IN_HEAP:
+                dary_push(&heap, w, new_cost)
+            elif node_costs[w] > new_cost:
+                dary_decrease_key(&heap, w, new_cost)
+            else:
+                continue
+            pred[w] = j
+
+    for i in range(zones):
+        node_load[i] = demand[i]
+
+    for k in range(found - 1, 0, -1):
+        w = order[k]
+        j = pred[w]
+        bush[j] = 1
+        bush_flows[j] += node_load[w]
+        node_load[a_nodes[j]] += node_load[w]
+    return found
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef int bush_update(int origin,
+                     int blocked_centroids,
+                     int [:] graph_fs,
+                     int [:] a_nodes,
+                     int [:] b_nodes,
+                     unsigned char [:] bush,
+                     double [:] bush_flows,
+                     double [:] costs,
+                     int [:] indegree,
+                     int [:] order,
+                     double [:] min_cost,
+                     int [:] min_pred,
+                     double [:] max_cost,
+                     int [:] max_pred) nogil:
+    # Drops unused links and adds the ones that shorten the longest paths. Returns the number of links added
+    cdef unsigned int j
+    cdef int i, found
+    cdef int added = 0
+    cdef unsigned int links = b_nodes.shape[0]
+
+    found = bush_topological_order(origin, graph_fs, b_nodes, bush, indegree, order)
+    bush_labels(origin, found, order, graph_fs, b_nodes, bush, bush_flows, costs, min_cost, min_pred, max_cost,
+                max_pred, 0)
+
+    for j in range(links):
+        if bush[j] and bush_flows[j] <= BUSH_FLOW_EPSILON and min_pred[b_nodes[j]] != j:
+            bush[j] = 0
+            bush_flows[j] = 0
+
+    # The order we had is still valid for what is left of the bush
+    bush_labels(origin, found, order, graph_fs, b_nodes, bush, bush_flows, costs, min_cost, min_pred, max_cost,
+                max_pred, 0)
+
+    for j in range(links):
+        if bush[j]:
+            continue
+        i = a_nodes[j]
+        if i <= blocked_centroids and i != origin:
+            continue
+        if max_cost[i] >= 0 and max_cost[b_nodes[j]] >= 0 and max_cost[i] + costs[j] < max_cost[b_nodes[j]]:
+            bush[j] = 1
+            added += 1
+    return added
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef inline void bush_move_flow(int link,
+                                double flow,
+                                double [:] bush_flows,
+                                double [:] link_flows,
+                                double [:] costs,
+                                double [:] derivatives,
+                                int vdf_function,
+                                double [:] capacity,
+                                double [:] fftime,
+                                double [:] alpha,
+                                double [:] beta) nogil:
+    bush_flows[link] += flow
+    if bush_flows[link] < 0:
+        bush_flows[link] = 0
+    link_flows[link] += flow
+    if link_flows[link] < 0:
+        link_flows[link] = 0
+    costs[link] = link_cost(vdf_function, link_flows[link], capacity[link], fftime[link], alpha[link], beta[link])
+    derivatives[link] = link_derivative(vdf_function, link_flows[link], capacity[link], fftime[link], alpha[link],
+                                        beta[link])
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+@cython.cdivision(True)
+cdef void bush_shift_flows(int origin,
+                           int found,
+                           int [:] order,
+                           int [:] graph_fs,
+                           int [:] a_nodes,
+                           int [:] b_nodes,
+                           unsigned char [:] bush,
+                           double [:] bush_flows,
+                           double [:] link_flows,
+                           double [:] costs,
+                           double [:] derivatives,
+                           int vdf_function,
+                           double [:] capacity,
+                           double [:] fftime,
+                           double [:] alpha,
+                           double [:] beta,
+                           double [:] min_cost,
+                           int [:] min_pred,
+                           double [:] max_cost,
+                           int [:] max_pred,
+                           int [:] marks) nogil:
+    cdef int k, j, v, l, divergence
+    cdef int stamp = 0
+    cdef double cost_difference, derivative, max_shift, shift
+    cdef unsigned int nodes = marks.shape[0]
+
+    for k in range(nodes):
+        marks[k] = -1
+
+    bush_labels(origin, found, order, graph_fs, b_nodes, bush, bush_flows, costs, min_cost, min_pred, max_cost,
+                max_pred, 1)
+
+    for k in range(found - 1, 0, -1):
+        j = order[k]
+        if max_pred[j] < 0 or min_pred[j] < 0 or max_cost[j] - min_cost[j] <= 0:
+            continue
+
+        # Nodes in the shortest path
+        stamp += 1
+        v = j
+        marks[v] = stamp
+        while v != origin:
+            v = a_nodes[min_pred[v]]
+            marks[v] = stamp
+
+        # The longest used path leaves the shortest one at the first of its nodes that is also in the shortest path
+        divergence = a_nodes[max_pred[j]]
+        while marks[divergence] != stamp:
+            divergence = a_nodes[max_pred[divergence]]
+
+        cost_difference = 0
+        derivative = 0
+        max_shift = INFINITE
+        v = j
+        while v != divergence:
+            l = max_pred[v]
+            cost_difference += costs[l]
+            derivative += derivatives[l]
+            if bush_flows[l] < max_shift:
+                max_shift = bush_flows[l]
+            v = a_nodes[l]
+        v = j
+        while v != divergence:
+            l = min_pred[v]
+            cost_difference -= costs[l]
+            derivative += derivatives[l]
+            v = a_nodes[l]
+
+        if cost_difference <= 0 or max_shift <= 0:
+            continue
+
+        shift = max_shift
+        if derivative > 0 and cost_difference / derivative < max_shift:
+            shift = cost_difference / derivative
+
+        v = j
+        while v != divergence:
+            l = max_pred[v]
+            bush_move_flow(l, -shift, bush_flows, link_flows, costs, derivatives, vdf_function, capacity, fftime, alpha,
+                           beta)
+            v = a_nodes[l]
+        v = j
+        while v != divergence:
+            l = min_pred[v]
+            bush_move_flow(l, shift, bush_flows, link_flows, costs, derivatives, vdf_function, capacity, fftime, alpha,
+                           beta)
+            v = a_nodes[l]
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+def bush_initialize(origin, demand, graph, costs, workspace, curr_thread):
+    """Creates the bush of the origin as its shortest path tree for costs, with all its demand loaded. Returns the
+    bush: its links (graph positions) and their flows"""
+    cdef int O = origin
+    cdef int blocked = graph.centroids if graph.block_centroid_flows else -1
+
+    cdef double [:] demand_view = demand
+    cdef double [:] costs_view = costs
+    cdef int [:] graph_fs_view = graph.fs
+    cdef int [:] a_nodes_view = graph.graph['a_node']
+    cdef int [:] b_nodes_view = graph.b_node
+    cdef unsigned char [:] bush_view = workspace.bush[curr_thread, :]
+    cdef double [:] bush_flows_view = workspace.bush_flows[curr_thread, :]
+    cdef int [:] pred_view = workspace.min_pred[curr_thread, :]
+    cdef int [:] order_view = workspace.order[curr_thread, :]
+    cdef double [:] node_load_view = workspace.min_cost[curr_thread, :]
+    cdef int [::1] heap_elements_view = workspace.heap_elements[curr_thread, :]
+    cdef int [::1] heap_positions_view = workspace.heap_positions[curr_thread, :]
+    cdef double [::1] node_costs_view = workspace.node_costs[curr_thread, :]
+
+    with nogil:
+        bush_initial_tree(O, blocked, demand_view, costs_view, graph_fs_view, a_nodes_view, b_nodes_view, bush_view,
+                          bush_flows_view, pred_view, order_view, node_load_view, heap_elements_view,
+                          heap_positions_view, node_costs_view)
+    return compact_bush(bush_view, bush_flows_view)
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+def bush_equilibrate(origin, graph, bush_links, bush_link_flows, link_flows, costs, derivatives, vdf, workspace,
+                     curr_thread, inner_iterations):
+    """Updates the bush of the origin (bush_links, graph positions, with the flows in bush_link_flows) and moves its
+    flows towards equilibrium. link_flows, costs and derivatives are updated as flows are moved. Returns the new bush
+    (links and flows), which can have more or fewer links"""
+    cdef int O = origin
+    cdef int i, found
+    cdef int inner = inner_iterations
+    cdef int blocked = graph.centroids if graph.block_centroid_flows else -1
+    cdef int vdf_function = vdf.function_code
+
+    cdef int [:] graph_fs_view = graph.fs
+    cdef int [:] a_nodes_view = graph.graph['a_node']
+    cdef int [:] b_nodes_view = graph.b_node
+    cdef int [:] bush_links_view = bush_links
+    cdef double [:] bush_link_flows_view = bush_link_flows
+    cdef unsigned char [:] bush_view = workspace.bush[curr_thread, :]
+    cdef double [:] bush_flows_view = workspace.bush_flows[curr_thread, :]
+
+    cdef double [:] capacity_view = vdf.capacity
+    cdef double [:] fftime_view = vdf.free_flow_time
+    cdef double [:] alpha_view = vdf.alphas
+    cdef double [:] beta_view = vdf.betas
+
+    cdef double [:] link_flows_view = link_flows
+    cdef double [:] costs_view = costs
+    cdef double [:] derivatives_view = derivatives
+    cdef int [:] indegree_view = workspace.indegree[curr_thread, :]
+    cdef int [:] order_view = workspace.order[curr_thread, :]
+    cdef double [:] min_cost_view = workspace.min_cost[curr_thread, :]
+    cdef int [:] min_pred_view = workspace.min_pred[curr_thread, :]
+    cdef double [:] max_cost_view = workspace.max_cost[curr_thread, :]
+    cdef int [:] max_pred_view = workspace.max_pred[curr_thread, :]
+    cdef int [:] marks_view = workspace.marks[curr_thread, :]
+
+    with nogil:
+        bush_spread(bush_links_view, bush_link_flows_view, bush_view, bush_flows_view)
+        bush_update(O, blocked, graph_fs_view, a_nodes_view, b_nodes_view, bush_view, bush_flows_view, costs_view,
+                    indegree_view, order_view, min_cost_view, min_pred_view, max_cost_view, max_pred_view)
+        found = bush_topological_order(O, graph_fs_view, b_nodes_view, bush_view, indegree_view, order_view)
+        for i in range(inner):
+            bush_shift_flows(O, found, order_view, graph_fs_view, a_nodes_view, b_nodes_view, bush_view,
+                             bush_flows_view, link_flows_view, costs_view, derivatives_view, vdf_function,
+                             capacity_view, fftime_view, alpha_view, beta_view, min_cost_view, min_pred_view,
+                             max_cost_view, max_pred_view, marks_view)
+    return compact_bush(bush_view, bush_flows_view)
@@ -0,0 +1,321 @@
+"""
+ -----------------------------------------------------------------------------------------------------------
+ Package:    AequilibraE
+
+ Name:       Bush-based user equilibrium assignment
+ Purpose:    Origin-based assignment (Algorithm B) for tightly converged equilibrium flows
+
+ Original Author:  Pedro Camargo (c@margo.co)
+ Contributors:
+ Last edited by: Pedro Camargo
+
+ Website:    www.AequilibraE.com
+ Repository:  https://github.com/AequilibraE/AequilibraE
+
+ Created:    2026-10-18
+ Updated:
+ Copyright:   (c) AequilibraE authors
+ Licence:     See LICENSE.TXT
+ -----------------------------------------------------------------------------------------------------------
+
+ Each origin with demand has a bush (bush_based.pxi): the graph positions of its links, sorted, and the flow of the
+ origin on each of them. It grows and shrinks as links are added and dropped. Origins are split among the cores, and all threads update the same link flows and costs
+ as they move flows (origins see the changes made by the others right away, as if they had run in sequence). As
+ these updates are not synchronized, the link flows are recomputed from the bushes at the end of every iteration.
+
+ The relative gap is computed the same way as in EquilibriumAssignment, with an all-or-nothing assignment on the
+ current costs. As there, the graph ends up with the congested costs.
+ """
+
+import sys
+sys.dont_write_bytecode = True
+
+import numpy as np
+import os
+import yaml
+from time import time
+from multiprocessing.dummy import Pool as ThreadPool
+
+from multi_threaded_aon import MultiThreadedAoN
+from assignment import all_or_nothing
+from demand import origin_totals, demand_row
+from vdf import VDF, DEFAULT_PARAMETERS
+
+no_binaries = False
+try:
+    from AoN import bush_initialize, bush_equilibrate
+except:
+    no_binaries = True
+
+
+class BushWorkspace:
+    def __init__(self):
+        # Per-thread node arrays for the bush searches
+        self.indegree = None  # Used for the topological order
+        self.order = None  # Topological order of the bush
+        self.min_cost = None  # Shortest path cost in the bush
+        self.min_pred = None  # Link to each node in the shortest path tree
+        self.max_cost = None  # Longest used path cost in the bush
+        self.max_pred = None  # Link to each node in the longest used path tree
+        self.marks = None  # Nodes in the shortest path being compared
+        self.bush = None  # Bush being worked on, spread over the links (flag per link)
+        self.bush_flows = None  # Flows of the bush being worked on, per link
+        self.heap_elements = None  # Heap for the initial shortest path trees
+        self.heap_positions = None
+        self.node_costs = None
+
+    def prepare(self, graph, cores):
+        nodes = graph.num_nodes + 1
+        self.indegree = np.zeros((cores, nodes), dtype=np.int32)
+        self.order = np.zeros((cores, nodes), dtype=np.int32)
+        self.min_cost = np.zeros((cores, nodes), dtype=np.float64)
+        self.min_pred = np.zeros((cores, nodes), dtype=np.int32)
+        self.max_cost = np.zeros((cores, nodes), dtype=np.float64)
+        self.max_pred = np.zeros((cores, nodes), dtype=np.int32)
+        self.marks = np.zeros((cores, nodes), dtype=np.int32)
+        self.bush = np.zeros((cores, graph.num_links), dtype=np.uint8)
+        self.bush_flows = np.zeros((cores, graph.num_links), dtype=np.float64)
+        self.heap_elements = np.zeros((cores, nodes), dtype=np.int32)
+        self.heap_positions = np.zeros((cores, nodes), dtype=np.int32)
+        self.node_costs = np.zeros((cores, nodes), dtype=np.float64)
+
+
+class BushBasedAssignment:
+    def __init__(self, matrix=None, graph=None, results=None, capacity_field='capacity', vdf='bpr', parameters=None,
+                 warm_start=False):
+        if parameters is None:
+            parameters = self.get_parameters('algorithm-b')
+            # alpha and beta in the parameters file are the ones of BPR
+            if vdf != 'bpr' and vdf in DEFAULT_PARAMETERS:
+                parameters.update(DEFAULT_PARAMETERS[vdf])
+
+        self.matrix = matrix
+        self.graph = graph
+        self.results = results
+        self.capacity_field = capacity_field
+        self.vdf_function = vdf
+        self.parameters = parameters
+        self.warm_start = warm_start  # Starts from the state in results.warm_start (see __warm_start)
+        self.error = None
+        self.error_free = True
+        self.__required_parameters = ['rgap', 'max iterations', 'inner iterations', 'alpha', 'beta']
+        self.report = ['  #####    Bush-based equilibrium assignment    #####  ', '']
+
+        self.iteration = 0
+        self.rgap = np.inf
+        self.gaps = []  # Relative gap at each iteration
+
+        self.origins = None  # Origins with demand. Position in this array is the row of the origin's bush
+        self.bushes = None  # Links (graph positions) in the bush of each origin. List with one array per origin
+        self.bush_flows = None  # Flows of each origin on the links of its bush. List with one array per origin
+        self.new_bushes = None  # Origins (position in origins) that need their bushes created
+
+        self.vdf = None
+        self.aux_res = None
+        self.workspace = None
+        self.congested_time = None  # Same array as Graph.cost during the assignment
+        self.link_flows = None
+        self.derivatives = None  # Derivative of the link costs
+        self.aon_flows = None
+
+    def check_data(self):
+        self.error = None
+        self.check_parameters()
+
+        if self.matrix is None or self.graph is None or self.results is None:
+            self.error = 'missing data'
+
+        if self.error is None:
+            if no_binaries:
+                self.error = 'Bush-based assignment needs the compiled AoN module'
+            elif self.graph.cost is None:
+                self.error = 'The graph has no cost field set'
+            elif self.results.__graph_id__ != self.graph.__id__:
+                self.error = 'The results object was not prepared for this graph. Use results.prepare(graph)'
+            elif self.matrix.ndim != 2:
+                self.error = 'Bush-based assignment takes a single user class (zones x zones matrix)'
+            elif self.matrix.shape[0] > self.results.zones or self.matrix.shape[1] > self.results.zones:
+                self.error = 'Matrix has more zones than the graph'
+            elif self.warm_start and self.results.warm_start is None:
+                self.error = 'There is no assignment state to start from. Use results.load_warm_start'
+
+        if self.error is not None:
+            self.error_free = False
+
+    def check_parameters(self):
+        for i in self.__required_parameters:
+            if i not in self.parameters:
+                self.error = 'Parameters error. It needs to be a dictionary with the following keys: '
+                for t in self.__required_parameters:
+                    self.error = self.error + t + ', '
+                break
+
+    def execute(self):
+        t = time()
+        self.check_data()
+        if not self.error_free:
+            raise ValueError(self.error)
+
+        max_iter = self.parameters['max iterations']
+        target_gap = self.parameters['rgap']
+
+        self.report.append('Target relative gap: ' + str(target_gap))
+        self.report.append('Maximum iterations: ' + str(max_iter))
+
+        self.__initialize()
+        self.report.append('Origins: ' + str(self.origins.shape[0]))
+        self.report.append('')
+        self.report.append('Iteration,   Relative gap')
+        if self.warm_start:
+            self.__warm_start()
+        self.__in_parallel(self.__initial_bushes)
+        self.__update_costs()
+
+        self.iteration = 0
+        self.rgap = np.inf
+        self.gaps = []
+        while self.iteration < max_iter:
+            self.rgap = self.relative_gap()
+            self.gaps.append(self.rgap)
+            self.report.append(str(self.iteration) + '   ,   ' + str("{:4,.10f}".format(self.rgap)))
+            if self.rgap < target_gap:
+                break
+
+            self.iteration += 1
+            self.vdf.apply_derivative(self.derivatives, self.link_flows)
+            self.__in_parallel(self.__equilibrate_bushes)
+            self.__update_costs()
+
+        self.results.link_loads.fill(0)
+        self.results.link_loads[self.graph.ids] = self.link_flows
+        self.results.set_warm_start(self.graph, self.matrix, self.link_flows.copy(), self.congested_time.copy(),
+                                    self.origins, self.bushes, self.bush_flows)
+
+        self.report.append('')
+        if self.rgap < target_gap:
+            self.report.append('Converged in ' + str(self.iteration) + ' iterations')
+        else:
+            self.report.append('Did not converge in ' + str(max_iter) + ' iterations')
+        self.report.append('Running time: ' + str("{:4,.3f}".format(time() - t)) + 's')
+
+    def relative_gap(self):
+        errors = all_or_nothing(self.matrix, self.graph, self.results, aux_res=self.aux_res)
+        if errors:
+            raise ValueError('All-or-nothing failed: ' + str(errors))
+        self.aon_flows[:] = self.results.link_loads[self.graph.ids]
+
+        tstt = np.sum(self.link_flows * self.congested_time)
+        sptt = np.sum(self.aon_flows * self.congested_time)
+        if tstt == 0:
+            return 0
+        return (tstt - sptt) / tstt
+
+    def __initialize(self):
+        g = self.graph
+        cores = self.results.cores
+
+        self.vdf = VDF(self.vdf_function, self.parameters['alpha'], self.parameters['beta'], self.capacity_field)
+        self.vdf.set_cores(cores)
+        self.vdf.prepare(g)
+
+        self.aux_res = MultiThreadedAoN()
+        self.aux_res.prepare(g, self.results)
+        self.workspace = BushWorkspace()
+        self.workspace.prepare(g, cores)
+
+        # Graph.cost may be a view of the cost field, so we give the graph its own array before changing it
+        self.congested_time = np.array(self.vdf.free_flow_time)
+        g.cost = self.congested_time
+        self.__update_skims()
+
+        self.origins = np.nonzero(origin_totals(self.matrix) > 0)[0].astype(np.int32)
+        self.bushes = [np.zeros(0, np.int32) for i in range(self.origins.shape[0])]
+        self.bush_flows = [np.zeros(0, np.float64) for i in range(self.origins.shape[0])]
+        self.link_flows = np.zeros(g.num_links, np.float64)
+        self.derivatives = np.zeros(g.num_links, np.float64)
+        self.aon_flows = np.zeros(g.num_links, np.float64)
+        self.new_bushes = np.arange(self.origins.shape[0])
+
+    # Bushes of the previous assignment are kept for the origins where they still carry the demand over the links in
+    # this graph. The others are created on the previous congested costs
+    def __warm_start(self):
+        ws = self.results.warm_start
+        positions = self.results.warm_start_positions(self.graph)
+        kept = positions >= 0
+        self.congested_time[positions[kept]] = ws['link_costs'][kept]
+
+        saved = {}
+        if ws['bushes'] is not None:
+            saved = dict((o, i) for i, o in enumerate(ws['origins']))
+
+        new_bushes = []
+        for k, O in enumerate(self.origins):
+            if O in saved:
+                links = positions[ws['bushes'][saved[O]]]
+                flows = ws['bush_flows'][saved[O]][links >= 0]
+                links = links[links >= 0]
+                order = np.argsort(links)
+                self.bushes[k] = links[order].astype(np.int32)
+                self.bush_flows[k] = flows[order].astype(np.float64)
+                if self.__conserves_flow(k):
+                    continue
+                self.bushes[k] = np.zeros(0, np.int32)
+                self.bush_flows[k] = np.zeros(0, np.float64)
+            new_bushes.append(k)
+        self.new_bushes = np.array(new_bushes, np.int64)
+
+        self.report.insert(-2, 'Warm start: ' + str(self.origins.shape[0] - len(new_bushes)) + ' bushes reused')
+
+    # Checks that the flows in a bush leave the origin and arrive at the destinations as in the demand matrix
+    def __conserves_flow(self, k):
+        O = self.origins[k]
+        nodes = self.graph.num_nodes + 1
+        demand = demand_row(self.matrix, O)
+        links = self.bushes[k]
+        flows = self.bush_flows[k]
+
+        net_flow = np.bincount(self.graph.graph['a_node'][links], weights=flows, minlength=nodes)
+        net_flow -= np.bincount(self.graph.b_node[links], weights=flows, minlength=nodes)
+        net_flow[:demand.shape[0]] += demand
+        net_flow[O] -= np.sum(demand)
+        return np.max(np.abs(net_flow)) <= 1e-6 * max(1, np.sum(demand))
+
+    # Each thread gets every cores-th origin
+    def __in_parallel(self, procedure):
+        cores = self.results.cores
+        pool = ThreadPool(cores)
+        pool.map(procedure, range(cores))
+        pool.close()
+        pool.join()
+
+    def __initial_bushes(self, th):
+        for k in self.new_bushes[th::self.results.cores]:
+            O = self.origins[k]
+            self.bushes[k], self.bush_flows[k] = bush_initialize(O, demand_row(self.matrix, O), self.graph,
+                                                                 self.congested_time, self.workspace, th)
+
+    def __equilibrate_bushes(self, th):
+        inner = self.parameters['inner iterations']
+        for k in range(th, self.origins.shape[0], self.results.cores):
+            self.bushes[k], self.bush_flows[k] = bush_equilibrate(self.origins[k], self.graph, self.bushes[k],
+                                                                  self.bush_flows[k], self.link_flows,
+                                                                  self.congested_time, self.derivatives, self.vdf,
+                                                                  self.workspace, th, inner)
+
+    def __update_costs(self):
+        self.link_flows.fill(0)
+        for links, flows in zip(self.bushes, self.bush_flows):
+            self.link_flows[links] += flows
+        self.vdf.apply(self.congested_time, self.link_flows)
+        self.__update_skims()
+
+    def __update_skims(self):
+        for i, field in enumerate(self.graph.skim_fields):
+            if field == self.graph.cost_field:
+                self.graph.skims[:, i] = self.congested_time
+
+    def get_parameters(self, model):
+        path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+        with open(path + '/parameters.yml', 'r') as yml:
+            path = yaml.safe_load(yml)
+        return path['assignment'][model]
@@ -0,0 +1,620 @@
+"""
+ -----------------------------------------------------------------------------------------------------------
+ Package:    AequilibraE
+
+ Name:       Contraction hierarchy
+ Purpose:    Node contraction and many-to-many (bucket-based) skimming over a contraction hierarchy
+
+ Original Author:  Pedro Camargo (c@margo.co)
+ Contributors:
+ Last edited by: Pedro Camargo
+
+ Website:    www.AequilibraE.com
+ Repository:  https://github.com/AequilibraE/AequilibraE
+
+ Created:    2026-10-18
+ Updated:
+ Copyright:   (c) AequilibraE authors
+ Licence:     See LICENSE.TXT
+ -----------------------------------------------------------------------------------------------------------
+
+ Building (ch_contract): the remaining graph is kept in flat arrays. Links (original ones and shortcuts) have an ID
+ and their tail, head, cost and skims, and the IDs of the links out of and into each node are in CSR-like arrays
+ with room to grow (NodeLinks): a node whose segment is full gets one twice as large at the end of the pool. Nodes
+ are taken from a d-ary heap by priority (lazy updates), and the witness searches are d-ary heap Dijkstras that only
+ reset the nodes they touched. ContractionHierarchy (contraction_hierarchy.py) splits the links into the two upward
+ graphs used by the queries.
+
+ Queries only need the two upward graphs in CSR form: 'up' holds the links towards higher ranked nodes and 'down'
+ holds, for each node, the links arriving from higher ranked nodes (reversed). Every link carries its cost and the
+ sum of all skim fields along the original path it represents.
+
+ Zones are queried in two phases: an upward search over 'down' from every destination leaves its labels in the
+ buckets of the nodes it settles, and an upward search over 'up' from every origin scans those buckets.
+ If centroid flows are blocked, centroids other than the search root are reached but not expanded, and a bucket
+ found at a centroid is only used if that centroid is the origin or the destination.
+ """
+
+from libc.stdlib cimport malloc, realloc, free, abort
+
+
+cdef struct NodeLinks:
+    # Link IDs of node v are pool[start[v]:start[v] + size[v]], with room for capacity[v] of them
+    int *start
+    int *size
+    int *capacity
+    int *pool
+    int used
+    int pool_capacity
+
+
+cdef struct ContractionGraph:
+    int num_skims
+    int links
+    int link_capacity
+    int *tails
+    int *heads
+    double *costs
+    double *skims  # num_skims per link
+    NodeLinks out_links
+    NodeLinks in_links
+
+    # Shortcuts needed to contract a node, as pairs of links (into the node, out of the node)
+    int *pending
+    int pending_capacity
+
+
+cdef void *ch_resize(void *array, size_t size) nogil:
+    cdef void *resized = realloc(array, size if size > 0 else 1)
+    if resized == NULL:
+        abort()
+    return resized
+
+
+@cython.wraparound(False)
+@cython.boundscheck(False)
+cdef void node_links_initialize(NodeLinks *star, int nodes, int [:] link_nodes) nogil:
+    # Segments with exactly the links each node has, in the order of the links
+    cdef int j, v
+    cdef int links = link_nodes.shape[0]
+
+    star.start = <int*> ch_resize(NULL, nodes * sizeof(int))
+    star.size = <int*> ch_resize(NULL, nodes * sizeof(int))
+    star.capacity = <int*> ch_resize(NULL, nodes * sizeof(int))
+    star.pool_capacity = 2 * links
+    star.pool = <int*> ch_resize(NULL, star.pool_capacity * sizeof(int))
+    star.used = links
+
+    for v in range(nodes):
+        star.capacity[v] = 0
+        star.size[v] = 0
+    for j in range(links):
+        star.capacity[link_nodes[j]] += 1
+    star.start[0] = 0
+    for v in range(1, nodes):
+        star.start[v] = star.start[v - 1] + star.capacity[v - 1]
+    for j in range(links):
+        v = link_nodes[j]
+        star.pool[star.start[v] + star.size[v]] = j
+        star.size[v] += 1
+
+
+cdef void node_links_free(NodeLinks *star) nogil:
+    free(star.start)
+    free(star.size)
+    free(star.capacity)
+    free(star.pool)
+
+
+cdef void node_links_append(NodeLinks *star, int v, int link) nogil:
+    cdef int i, new_capacity
+    if star.size[v] == star.capacity[v]:
+        new_capacity = 2 * star.capacity[v] if star.capacity[v] > 0 else 4
+        if star.used + new_capacity > star.pool_capacity:
+            star.pool_capacity = 2 * (star.used + new_capacity)
+            star.pool = <int*> ch_resize(star.pool, star.pool_capacity * sizeof(int))
+        for i in range(star.size[v]):
+            star.pool[star.used + i] = star.pool[star.start[v] + i]
+        star.start[v] = star.used
+        star.capacity[v] = new_capacity
+        star.used += new_capacity
+    star.pool[star.start[v] + star.size[v]] = link
+    star.size[v] += 1
+
+
+cdef void node_links_remove(NodeLinks *star, int v, int link) nogil:
+    cdef int i
+    cdef int last = star.start[v] + star.size[v] - 1
+    for i in range(star.start[v], last + 1):
+        if star.pool[i] == link:
+            star.pool[i] = star.pool[last]
+            star.size[v] -= 1
+            return
+
+
+cdef int ch_new_link(ContractionGraph *g, int tail, int head) nogil:
+    if g.links == g.link_capacity:
+        g.link_capacity = 2 * g.link_capacity + 16
+        g.tails = <int*> ch_resize(g.tails, g.link_capacity * sizeof(int))
+        g.heads = <int*> ch_resize(g.heads, g.link_capacity * sizeof(int))
+        g.costs = <double*> ch_resize(g.costs, g.link_capacity * sizeof(double))
+        g.skims = <double*> ch_resize(g.skims, g.link_capacity * g.num_skims * sizeof(double))
+    g.tails[g.links] = tail
+    g.heads[g.links] = head
+    g.links += 1
+    return g.links - 1
+
+
+@cython.wraparound(False)
+@cython.boundscheck(False)
+cdef int ch_witness_search(ContractionGraph *g,
+                           int source,
+                           int avoid,
+                           double limit,
+                           int settle_limit,
+                           int [::1] heap_elements,
+                           int [::1] heap_positions,
+                           double [::1] node_costs,
+                           int [:] touched) nogil:
+    # Dijkstra from source on the remaining graph without going through the node being contracted. Stops at the cost
+    # limit or after settling settle_limit nodes, so it may miss witnesses (which only costs us extra shortcuts).
+    # Leaves the costs found in node_costs and returns how many nodes it touched (listed in touched)
+    cdef int i, j, v, w
+    cdef int found = 1
+    cdef int settled = 0
+    cdef double new_cost
+    cdef NodeLinks *out = &g.out_links
+
+    cdef DAryHeap heap
+    dary_attach(&heap, <ITYPE_t*> &heap_elements[0], <ITYPE_t*> &heap_positions[0], &node_costs[0], 4)
+    dary_push(&heap, source, 0)
+    touched[0] = source
+
+    while heap.size > 0:
+        v = dary_pop(&heap)
+        if node_costs[v] > limit or settled >= settle_limit:
+            break
+        settled += 1
+        for i in range(out.start[v], out.start[v] + out.size[v]):
+            j = out.pool[i]
+            w = g.heads[j]
+            if w == avoid:
+                continue
+            new_cost = node_costs[v] + g.costs[j]
+            if heap_positions[w] == NOT_IN_HEAP:
+                dary_push(&heap, w, new_cost)
+                touched[found] = w
+                found += 1
+            elif heap_positions[w] >= 0 and node_costs[w] > new_cost:
+                dary_decrease_key(&heap, w, new_cost)
+    return found
+
+
+@cython.wraparound(False)
+@cython.boundscheck(False)
+cdef int ch_node_shortcuts(ContractionGraph *g,
+                           int v,
+                           int settle_limit,
+                           int [::1] heap_elements,
+                           int [::1] heap_positions,
+                           double [::1] node_costs,
+                           int [:] touched) nogil:
+    # Puts in g.pending the shortcuts needed if v is contracted now and returns how many they are
+    cdef int i, k, a, b, u, w, found
+    cdef int count = 0
+    cdef double max_out = 0
+    cdef NodeLinks *out = &g.out_links
+    cdef NodeLinks *into = &g.in_links
+
+    if out.size[v] == 0:
+        return 0
+    if 2 * into.size[v] * out.size[v] > g.pending_capacity:
+        g.pending_capacity = 2 * into.size[v] * out.size[v]
+        g.pending = <int*> ch_resize(g.pending, g.pending_capacity * sizeof(int))
+
+    for k in range(out.start[v], out.start[v] + out.size[v]):
+        if g.costs[out.pool[k]] > max_out:
+            max_out = g.costs[out.pool[k]]
+
+    for i in range(into.start[v], into.start[v] + into.size[v]):
+        a = into.pool[i]
+        u = g.tails[a]
+        found = ch_witness_search(g, u, v, g.costs[a] + max_out, settle_limit, heap_elements, heap_positions,
+                                  node_costs, touched)
+        for k in range(out.start[v], out.start[v] + out.size[v]):
+            b = out.pool[k]
+            w = g.heads[b]
+            if w == u or node_costs[w] <= g.costs[a] + g.costs[b]:
+                continue
+            g.pending[2 * count] = a
+            g.pending[2 * count + 1] = b
+            count += 1
+        ch_clear_search(found, touched, heap_positions, node_costs)
+    return count
+
+
+@cython.wraparound(False)
+@cython.boundscheck(False)
+cdef int ch_contract_node(ContractionGraph *g, int v, int count, int [:] deleted_neighbors) nogil:
+    # Removes v from the remaining graph and adds the count shortcuts in g.pending (a parallel link is kept only if
+    # it is cheaper). Returns how many links were added or made cheaper
+    cdef int i, k, a, b, e, u, w, s
+    cdef int added = 0
+    cdef double cost
+    cdef NodeLinks *out = &g.out_links
+    cdef NodeLinks *into = &g.in_links
+
+    for i in range(out.start[v], out.start[v] + out.size[v]):
+        b = out.pool[i]
+        node_links_remove(into, g.heads[b], b)
+        deleted_neighbors[g.heads[b]] += 1
+    for i in range(into.start[v], into.start[v] + into.size[v]):
+        a = into.pool[i]
+        node_links_remove(out, g.tails[a], a)
+        deleted_neighbors[g.tails[a]] += 1
+    out.size[v] = 0
+    into.size[v] = 0
+
+    for i in range(count):
+        a = g.pending[2 * i]
+        b = g.pending[2 * i + 1]
+        u = g.tails[a]
+        w = g.heads[b]
+        cost = g.costs[a] + g.costs[b]
+
+        e = -1
+        for k in range(out.start[u], out.start[u] + out.size[u]):
+            if g.heads[out.pool[k]] == w:
+                e = out.pool[k]
+                break
+        if e < 0:
+            e = ch_new_link(g, u, w)
+            node_links_append(out, u, e)
+            node_links_append(into, w, e)
+        elif g.costs[e] <= cost:
+            continue
+
+        g.costs[e] = cost
+        for s in range(g.num_skims):
+            g.skims[e * g.num_skims + s] = g.skims[a * g.num_skims + s] + g.skims[b * g.num_skims + s]
+        added += 1
+    return added
+
+
+@cython.wraparound(False)
+@cython.boundscheck(False)
+cdef int ch_contract_all(ContractionGraph *g,
+                         int nodes,
+                         int blocked_centroids,
+                         int settle_limit,
+                         int [:] rank,
+                         int [:] deleted_neighbors,
+                         int [::1] queue_elements,
+                         int [::1] queue_positions,
+                         double [::1] queue_keys,
+                         int [::1] heap_elements,
+                         int [::1] heap_positions,
+                         double [::1] node_costs,
+                         int [:] touched) nogil:
+    # Contracts all nodes, in order of edge difference (shortcuts added - links removed) plus the number of neighbors
+    # already contracted, to spread the contraction evenly over the network. Returns the number of shortcuts
+    cdef int v, count
+    cdef int order = 0
+    cdef int shortcuts = 0
+    cdef double priority
+
+    cdef DAryHeap queue
+    dary_attach(&queue, <ITYPE_t*> &queue_elements[0], <ITYPE_t*> &queue_positions[0], &queue_keys[0], 4)
+
+    for v in range(nodes):
+        if v <= blocked_centroids:
+            # Contracted first and without shortcuts
+            dary_push(&queue, v, -INFINITE)
+        else:
+            count = ch_node_shortcuts(g, v, settle_limit, heap_elements, heap_positions, node_costs, touched)
+            dary_push(&queue, v, count - g.out_links.size[v] - g.in_links.size[v] + deleted_neighbors[v])
+
+    while queue.size > 0:
+        v = dary_pop(&queue)
+        count = 0
+        if v > blocked_centroids:
+            # Lazy update: if the node got worse than the next one in line, it goes back to the queue
+            count = ch_node_shortcuts(g, v, settle_limit, heap_elements, heap_positions, node_costs, touched)
+            priority = count - g.out_links.size[v] - g.in_links.size[v] + deleted_neighbors[v]
+            if queue.size > 0 and priority > queue_keys[queue_elements[0]]:
+                dary_push(&queue, v, priority)
+                continue
+        shortcuts += ch_contract_node(g, v, count, deleted_neighbors)
+        rank[v] = order
+        order += 1
+    return shortcuts
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+def ch_contract(nodes, tails, heads, costs, skims, blocked_centroids, settle_limit):
+    """Contracts all nodes of a graph given by its links (no loops or parallel links). blocked_centroids is the
+    highest node contracted first and without shortcuts (-1 for none). Returns the rank of each node, the number of
+    shortcuts and all links of the hierarchy (tails, heads, costs, skims), the original links first"""
+    cdef int j, s, shortcuts
+    cdef int N = nodes
+    cdef int blocked = blocked_centroids
+    cdef int limit = settle_limit
+    cdef int links = tails.shape[0]
+    cdef int num_skims = skims.shape[1]
+    cdef ContractionGraph g
+
+    cdef int [:] tails_view = tails
+    cdef int [:] heads_view = heads
+    cdef double [:] costs_view = costs
+    cdef double [:, :] skims_view = skims
+
+    rank = np.zeros(N, np.int32)
+    deleted_neighbors = np.zeros(N, np.int32)
+    queue_elements = np.zeros(N, np.int32)
+    queue_positions = np.empty(N, np.int32)
+    queue_positions.fill(NOT_IN_HEAP)
+    queue_keys = np.empty(N, np.float64)
+    queue_keys.fill(INFINITE)
+    heap_elements = np.zeros(N, np.int32)
+    heap_positions = np.empty(N, np.int32)
+    heap_positions.fill(NOT_IN_HEAP)
+    node_costs = np.empty(N, np.float64)
+    node_costs.fill(INFINITE)
+    touched = np.zeros(N, np.int32)
+
+    cdef int [:] rank_view = rank
+    cdef int [:] deleted_neighbors_view = deleted_neighbors
+    cdef int [::1] queue_elements_view = queue_elements
+    cdef int [::1] queue_positions_view = queue_positions
+    cdef double [::1] queue_keys_view = queue_keys
+    cdef int [::1] heap_elements_view = heap_elements
+    cdef int [::1] heap_positions_view = heap_positions
+    cdef double [::1] node_costs_view = node_costs
+    cdef int [:] touched_view = touched
+
+    with nogil:
+        g.num_skims = num_skims
+        g.links = links
+        g.link_capacity = 2 * links + 16
+        g.tails = <int*> ch_resize(NULL, g.link_capacity * sizeof(int))
+        g.heads = <int*> ch_resize(NULL, g.link_capacity * sizeof(int))
+        g.costs = <double*> ch_resize(NULL, g.link_capacity * sizeof(double))
+        g.skims = <double*> ch_resize(NULL, g.link_capacity * num_skims * sizeof(double))
+        for j in range(links):
+            g.tails[j] = tails_view[j]
+            g.heads[j] = heads_view[j]
+            g.costs[j] = costs_view[j]
+            for s in range(num_skims):
+                g.skims[j * num_skims + s] = skims_view[j, s]
+        node_links_initialize(&g.out_links, N, tails_view)
+        node_links_initialize(&g.in_links, N, heads_view)
+        g.pending_capacity = 0
+        g.pending = NULL
+
+        shortcuts = ch_contract_all(&g, N, blocked, limit, rank_view, deleted_neighbors_view, queue_elements_view,
+                                    queue_positions_view, queue_keys_view, heap_elements_view, heap_positions_view,
+                                    node_costs_view, touched_view)
+
+    all_tails = np.zeros(g.links, np.int32)
+    all_heads = np.zeros(g.links, np.int32)
+    all_costs = np.zeros(g.links, np.float64)
+    all_skims = np.zeros((g.links, num_skims), np.float64)
+    cdef int [:] all_tails_view = all_tails
+    cdef int [:] all_heads_view = all_heads
+    cdef double [:] all_costs_view = all_costs
+    cdef double [:, :] all_skims_view = all_skims
+
+    with nogil:
+        for j in range(g.links):
+            all_tails_view[j] = g.tails[j]
+            all_heads_view[j] = g.heads[j]
+            all_costs_view[j] = g.costs[j]
+            for s in range(num_skims):
+                all_skims_view[j, s] = g.skims[j * num_skims + s]
+        free(g.tails)
+        free(g.heads)
+        free(g.costs)
+        free(g.skims)
+        free(g.pending)
+        node_links_free(&g.out_links)
+        node_links_free(&g.in_links)
+
+    return rank, shortcuts, all_tails, all_heads, all_costs, all_skims
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef int ch_upward_search(int source,
+                          int blocked_centroids,
+                          int [:] star,
+                          int [:] heads,
+                          double[:] link_costs,
+                          double[:, :] link_skims,
+                          int [::1] heap_elements,
+                          int [::1] heap_positions,
+                          double [::1] node_costs,
+                          double[:, :] node_skims,
+                          int [:] reached) nogil:
+    # Settles every node reachable upwards from source and returns how many they are (listed in reached).
+    # Assumes positions are NOT_IN_HEAP and costs INFINITE for all nodes, and restores that state for the
+    # nodes it touched after the caller is done with node_costs/node_skims (see ch_clear_search)
+    cdef int j, k, v, w
+    cdef int found = 0
+    cdef unsigned int skims = node_skims.shape[1]
+    cdef DTYPE_t new_cost
+
+    cdef DAryHeap heap
+
+    dary_attach(&heap, <ITYPE_t*> &heap_elements[0], <ITYPE_t*> &heap_positions[0], &node_costs[0], 4)
+    dary_push(&heap, source, 0)
+    for k in range(skims):
+        node_skims[source, k] = 0
+
+    while heap.size > 0:
+        v = dary_pop(&heap)
+        reached[found] = v
+        found += 1
+
+        if v <= blocked_centroids and v != source:
+            continue
+
+        for j in range(star[v], star[v + 1]):
+            w = heads[j]
+            if heap_positions[w] == SCANNED:
+                continue
+
+            new_cost = node_costs[v] + link_costs[j]
+            if heap_positions[w] == NOT_IN_HEAP:
+                dary_push(&heap, w, new_cost)
+            elif node_costs[w] > new_cost:
+                dary_decrease_key(&heap, w, new_cost)
+            else:
+                continue
+            for k in range(skims):
+                node_skims[w, k] = node_skims[v, k] + link_skims[j, k]
+    return found
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef void ch_clear_search(int found,
+                          int [:] reached,
+                          int [::1] heap_positions,
+                          double [::1] node_costs) nogil:
+    cdef int i
+    for i in range(found):
+        heap_positions[reached[i]] = NOT_IN_HEAP
+        node_costs[reached[i]] = INFINITE
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef void ch_scan_buckets(int origin,
+                          int found,
+                          int blocked_centroids,
+                          int [:] reached,
+                          double [::1] node_costs,
+                          double[:, :] node_skims,
+                          int [:] bucket_fs,
+                          int [:] bucket_targets,
+                          double[:] bucket_costs,
+                          double[:, :] bucket_skims,
+                          double[:] best_costs,
+                          double[:, :] final_skim_matrix,
+                          int [:] no_path) nogil:
+    cdef int i, b, k, u, t
+    cdef unsigned int skims = final_skim_matrix.shape[1]
+    cdef DTYPE_t total
+
+    for i in range(found):
+        u = reached[i]
+        for b in range(bucket_fs[u], bucket_fs[u + 1]):
+            t = bucket_targets[b]
+            if u <= blocked_centroids and u != origin and u != t:
+                continue
+            total = node_costs[u] + bucket_costs[b]
+            if total < best_costs[t]:
+                best_costs[t] = total
+                no_path[t] = 0
+                for k in range(skims):
+                    final_skim_matrix[t, k] = node_skims[u, k] + bucket_skims[b, k]
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+def ch_many_to_many(hierarchy, zones, blocked_centroids, skim_matrix, no_path):
+    """Fills skim_matrix (zones x zones x skims) and no_path (zones x zones) for all pairs of zones 1..zones-1.
+    blocked_centroids is the highest centroid that cannot be used as an intermediate node (-1 for none)"""
+    cdef int t, s, found
+    cdef int Z = zones
+    cdef int blocked = blocked_centroids
+    cdef int nodes = hierarchy.up_fs.shape[0] - 1
+    cdef int skims = hierarchy.up_skims.shape[1]
+
+    heap_elements = np.zeros(nodes, np.int32)
+    heap_positions = np.empty(nodes, np.int32)
+    heap_positions.fill(NOT_IN_HEAP)
+    node_costs = np.empty(nodes, np.float64)
+    node_costs.fill(INFINITE)
+    node_skims = np.zeros((nodes, skims), np.float64)
+    reached = np.zeros(nodes, np.int32)
+
+    cdef int [:] up_fs_view = hierarchy.up_fs
+    cdef int [:] up_heads_view = hierarchy.up_heads
+    cdef double [:] up_costs_view = hierarchy.up_costs
+    cdef double [:, :] up_skims_view = hierarchy.up_skims
+    cdef int [:] down_fs_view = hierarchy.down_fs
+    cdef int [:] down_heads_view = hierarchy.down_heads
+    cdef double [:] down_costs_view = hierarchy.down_costs
+    cdef double [:, :] down_skims_view = hierarchy.down_skims
+
+    cdef int [::1] heap_elements_view = heap_elements
+    cdef int [::1] heap_positions_view = heap_positions
+    cdef double [::1] node_costs_view = node_costs
+    cdef double [:, :] node_skims_view = node_skims
+    cdef int [:] reached_view = reached
+
+    # Phase 1: buckets from all destinations
+    bucket_nodes = []
+    bucket_targets = []
+    bucket_costs = []
+    bucket_skims = []
+    for t in range(1, Z):
+        with nogil:
+            found = ch_upward_search(t, blocked, down_fs_view, down_heads_view, down_costs_view, down_skims_view,
+                                     heap_elements_view, heap_positions_view, node_costs_view, node_skims_view,
+                                     reached_view)
+        settled = reached[:found].copy()
+        bucket_nodes.append(settled)
+        bucket_targets.append(np.repeat(np.int32(t), found))
+        bucket_costs.append(node_costs[settled])
+        bucket_skims.append(node_skims[settled, :])
+        with nogil:
+            ch_clear_search(found, reached_view, heap_positions_view, node_costs_view)
+
+    if bucket_nodes:
+        all_nodes = np.hstack(bucket_nodes)
+        order = np.argsort(all_nodes, kind='mergesort')
+        bucket_targets = np.hstack(bucket_targets)[order]
+        bucket_costs = np.hstack(bucket_costs)[order]
+        bucket_skims = np.vstack(bucket_skims)[order, :]
+        bucket_fs = np.zeros(nodes + 1, np.int32)
+        bucket_fs[1:] = np.cumsum(np.bincount(all_nodes, minlength=nodes))
+        del all_nodes, order
+    else:
+        bucket_targets = np.zeros(0, np.int32)
+        bucket_costs = np.zeros(0, np.float64)
+        bucket_skims = np.zeros((0, skims), np.float64)
+        bucket_fs = np.zeros(nodes + 1, np.int32)
+
+    cdef int [:] bucket_fs_view = bucket_fs
+    cdef int [:] bucket_targets_view = bucket_targets
+    cdef double [:] bucket_costs_view = bucket_costs
+    cdef double [:, :] bucket_skims_view = bucket_skims
+
+    best_costs = np.zeros(Z, np.float64)
+    cdef double [:] best_costs_view = best_costs
+    cdef double [:, :] final_skim_matrix_view
+    cdef int [:] no_path_view
+
+    # Phase 2: upward searches from all origins, scanning the buckets
+    for s in range(1, Z):
+        final_skim_matrix_view = skim_matrix[s, :, :]
+        no_path_view = no_path[s, :]
+        skim_matrix[s, :, :] = INFINITE
+        no_path[s, :] = -1
+        best_costs.fill(INFINITE)
+        with nogil:
+            found = ch_upward_search(s, blocked, up_fs_view, up_heads_view, up_costs_view, up_skims_view,
+                                     heap_elements_view, heap_positions_view, node_costs_view, node_skims_view,
+                                     reached_view)
+            ch_scan_buckets(s, found, blocked, reached_view, node_costs_view, node_skims_view, bucket_fs_view,
+                            bucket_targets_view, bucket_costs_view, bucket_skims_view, best_costs_view,
+                            final_skim_matrix_view, no_path_view)
+            ch_clear_search(found, reached_view, heap_positions_view, node_costs_view)
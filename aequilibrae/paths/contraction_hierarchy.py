@@ -0,0 +1,173 @@
+"""
+ -----------------------------------------------------------------------------------------------------------
+ Package:    AequilibraE
+
+ Name:       Contraction hierarchy
+ Purpose:    Preprocessing of a fixed-cost graph for fast repeated skimming between all zones
+
+ Original Author:  Pedro Camargo (c@margo.co)
+ Contributors:
+ Last edited by: Pedro Camargo
+
+ Website:    www.AequilibraE.com
+ Repository:  https://github.com/AequilibraE/AequilibraE
+
+ Created:    2026-10-18
+ Updated:
+ Copyright:   (c) AequilibraE authors
+ Licence:     See LICENSE.TXT
+ -----------------------------------------------------------------------------------------------------------
+
+ Nodes are contracted one at a time (in order of edge difference, with lazy updates). Contracting a node removes it
+ from the graph and adds a shortcut u->w for each pair of neighbors u->v->w whose shortest path goes through it.
+ A shortcut carries the sum of the costs and skims of the two links it replaces. The contraction and its witness
+ searches run in Cython over flat arrays (ch_contract in contraction_hierarchy.pxi).
+
+ If centroid flows are blocked, centroids are contracted first and never create shortcuts, so no path in the
+ hierarchy can go through a centroid.
+
+ The hierarchy is only valid for the cost and skims it was built with. Graph.prepare_contraction_hierarchy keeps it
+ with the graph, and set_graph drops it whenever it changes the cost field
+ """
+
+import hashlib
+import numpy as np
+
+no_binaries = False
+try:
+    from AoN import ch_contract, ch_many_to_many
+except:
+    no_binaries = True
+
+
+class ContractionHierarchy:
+    def __init__(self):
+        self.rank = None        # Contraction order of each node
+
+        # Links to higher ranked nodes, in CSR format indexed by node
+        self.up_fs = None
+        self.up_heads = None
+        self.up_costs = None
+        self.up_skims = None
+
+        # Links coming from higher ranked nodes (reversed: head is the node where the link starts)
+        self.down_fs = None
+        self.down_heads = None
+        self.down_costs = None
+        self.down_skims = None
+
+        self.shortcuts = 0
+        self.cost_field = None
+        self.skim_fields = None
+        self.centroids = None
+        self.block_centroid_flows = None
+        self.signature = None
+
+        self.witness_settle_limit = 500  # Maximum number of nodes settled in each witness search
+
+    def build(self, graph):
+        if graph.cost is None:
+            raise ValueError('Before building a contraction hierarchy, you need to set the cost field')
+        if no_binaries:
+            raise ValueError('Building a contraction hierarchy needs the compiled AoN module')
+
+        nodes = graph.num_nodes + 1
+        blocked = graph.centroids if graph.block_centroid_flows else 0
+
+        # Remaining graph. Loops are dropped and parallel links keep only the cheapest one (the first if tied)
+        a_nodes = graph.graph['a_node']
+        b_nodes = graph.b_node
+        order = np.lexsort((graph.cost, b_nodes, a_nodes))
+        order = order[a_nodes[order] != b_nodes[order]]
+        tails = a_nodes[order]
+        heads = b_nodes[order]
+        first = np.ones(order.shape[0], np.bool_)
+        first[1:] = (tails[1:] != tails[:-1]) | (heads[1:] != heads[:-1])
+        links = order[first]
+
+        rank, shortcuts, tails, heads, costs, skims = ch_contract(nodes, a_nodes[links].astype(np.int32),
+                                                                  b_nodes[links].astype(np.int32),
+                                                                  graph.cost[links].astype(np.float64),
+                                                                  graph.skims[links, :].astype(np.float64), blocked,
+                                                                  self.witness_settle_limit)
+        self.rank = rank
+        self.shortcuts = shortcuts
+
+        # Each link goes from its lower ranked node to the higher ranked one
+        up = rank[tails] < rank[heads]
+        down = ~up
+        self.up_fs, self.up_heads, self.up_costs, self.up_skims = self.__to_csr(tails[up], heads[up], costs[up],
+                                                                                skims[up, :], nodes)
+        self.down_fs, self.down_heads, self.down_costs, self.down_skims = self.__to_csr(heads[down], tails[down],
+                                                                                        costs[down], skims[down, :],
+                                                                                        nodes)
+
+        self.cost_field = graph.cost_field
+        self.skim_fields = list(graph.skim_fields)
+        self.centroids = graph.centroids
+        self.block_centroid_flows = graph.block_centroid_flows
+        self.signature = self.graph_signature(graph)
+
+    # Checks if the hierarchy was built with the same cost, skims and centroids the graph has now
+    def is_valid_for(self, graph):
+        if self.signature is None:
+            return False
+        if graph.centroids != self.centroids or graph.block_centroid_flows != self.block_centroid_flows:
+            return False
+        return self.signature == self.graph_signature(graph)
+
+    @staticmethod
+    def graph_signature(graph):
+        sig = hashlib.md5()
+        sig.update(np.ascontiguousarray(graph.cost).tostring())
+        sig.update(np.ascontiguousarray(graph.skims).tostring())
+        sig.update(np.ascontiguousarray(graph.b_node).tostring())
+        sig.update(np.ascontiguousarray(graph.fs).tostring())
+        return sig.hexdigest()
+
+    def skim(self, results):
+        """Fills results.skims and results.no_path for all pairs of zones"""
+        if no_binaries:
+            raise ValueError('Contraction hierarchy queries need the compiled AoN module')
+        if results.num_skims != self.up_skims.shape[1]:
+            raise ValueError('The results object was prepared with a different number of skims')
+
+        blocked = self.centroids if self.block_centroid_flows else -1
+        ch_many_to_many(self, results.zones, blocked, results.skims, results.no_path)
+
+    def to_dict(self):
+        ch = {}
+        for key in ['rank', 'up_fs', 'up_heads', 'up_costs', 'up_skims', 'down_fs', 'down_heads', 'down_costs',
+                    'down_skims', 'shortcuts', 'cost_field', 'skim_fields', 'centroids', 'block_centroid_flows',
+                    'signature']:
+            ch[key] = getattr(self, key)
+        return ch
+
+    @classmethod
+    def from_dict(cls, ch):
+        hierarchy = cls()
+        for key, value in ch.iteritems():
+            setattr(hierarchy, key, value)
+        return hierarchy
+
+    @staticmethod
+    def __to_csr(tails, heads, costs, skims, nodes):
+        order = np.argsort(tails, kind='mergesort')
+        fs = np.zeros(nodes + 1, np.int32)
+        fs[1:] = np.cumsum(np.bincount(tails, minlength=nodes))
+        return fs, heads[order], costs[order], skims[order, :]
+
+
+def contraction_hierarchy_skims(graph, results):
+    """Computes the skims between all zones (results.skims and results.no_path) with the contraction hierarchy
+    of the graph. Same results as an all-or-nothing run with a full tree for every origin"""
+    if graph.contraction_hierarchy is None:
+        raise ValueError('The graph has no contraction hierarchy. Use graph.prepare_contraction_hierarchy()')
+    if not graph.contraction_hierarchy.is_valid_for(graph):
+        raise ValueError('The contraction hierarchy was built for a different cost, skims or centroids')
+    if results.__graph_id__ is None:
+        raise ValueError('The results object was not prepared. Use results.prepare(graph)')
+    elif results.__graph_id__ != graph.__id__:
+        raise ValueError('The results object was prepared for a different graph')
+
+    graph.contraction_hierarchy.skim(results)
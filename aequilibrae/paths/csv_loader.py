@@ -0,0 +1,194 @@
+"""
+ -----------------------------------------------------------------------------------------------------------
+ Package:    AequilibraE
+
+ Name:       CSV loader
+ Purpose:    Reads network and graph CSV files in chunks straight into typed NumPy columns
+
+ Original Author:  Pedro Camargo (c@margo.co)
+ Contributors:
+ Last edited by: Pedro Camargo
+
+ Website:    www.AequilibraE.com
+ Repository:  https://github.com/AequilibraE/AequilibraE
+
+ Created:    2026-10-18
+ Updated:
+ Copyright:   (c) AequilibraE authors
+ Licence:     See LICENSE.TXT
+ -----------------------------------------------------------------------------------------------------------
+
+ The rows are counted first, so the table is allocated once, and the file is then read chunk_size bytes at a time
+ (always ending at the end of a line). Each chunk is parsed into the table, so only one chunk of text is in memory
+ at any time besides the table itself:
+    - Chunks with numbers only (no quotes, no int64 columns) are parsed by NumPy in a single call
+    - Other chunks (text fields, quotes) go through the csv module, one column at a time
+
+ With cores > 1, groups of chunks are parsed by a pool of processes. Quoted fields can not have line breaks.
+ """
+
+import csv
+import multiprocessing as mp
+import numpy as np
+
+CHUNK_SIZE = 8 * 1024 * 1024  # Bytes of text parsed at a time
+TYPE_ROWS = 10  # Rows used to find the type of the columns without a declared one
+STRING_TYPE = np.dtype('a256')
+
+
+def load_csv(file_name, dtypes=None, cores=1, chunk_size=CHUNK_SIZE):
+    """Structured array with the columns of a CSV file (names in lower case). dtypes: {column: dtype} for the columns
+    with a known type (columns that are not in the file are ignored). The others are int32, float64 or text (256
+    characters) depending on their first rows"""
+    dtypes = dict((str(k).lower(), np.dtype(v)) for k, v in (dtypes or {}).items())
+
+    with open(file_name, 'rb') as f:
+        titles = _titles(f.readline())
+        start = f.tell()
+        sample = []
+        for i in range(TYPE_ROWS):
+            line = f.readline()
+            if line.strip():
+                sample.append(next(csv.reader([line])))
+        f.seek(start)
+        rows = _count_lines(f, chunk_size)
+
+    dtype = []
+    for k, name in enumerate(titles):
+        if name in dtypes:
+            dtype.append((name, dtypes[name]))
+        else:
+            dtype.append((name, _column_type([row[k] for row in sample if k < len(row)])))
+    dtype = np.dtype(dtype)
+
+    table = np.zeros(rows, dtype=dtype)
+    filled = 0
+    pool = mp.Pool(cores) if cores > 1 else None
+    try:
+        for group in _groups(_text_chunks(file_name, start, chunk_size), max(1, cores)):
+            if pool is None:
+                parsed = [_parse_chunk((text, dtype)) for text in group]
+            else:
+                parsed = pool.map(_parse_chunk, [(text, dtype) for text in group])
+            for chunk in parsed:
+                if filled + chunk.shape[0] > table.shape[0]:
+                    table = np.resize(table, filled + chunk.shape[0])
+                table[filled:filled + chunk.shape[0]] = chunk
+                filled += chunk.shape[0]
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return table[:filled]
+
+
+def csv_titles(file_name):
+    """Names of the columns of a CSV file, in lower case"""
+    with open(file_name, 'rb') as f:
+        return _titles(f.readline())
+
+
+def _titles(line):
+    return [x.strip().lower() for x in next(csv.reader([line]))]
+
+
+# Integer if all values are integers, float if they are all numbers and text otherwise
+def _column_type(values):
+    for kind, caster in [(np.int32, int), (np.float64, float)]:
+        try:
+            for value in values:
+                caster(value)
+            return np.dtype(kind)
+        except ValueError:
+            pass
+    return STRING_TYPE
+
+
+# Lines left in the file (rows, if there are no blank lines)
+def _count_lines(f, chunk_size):
+    lines = 0
+    last = '\n'
+    while True:
+        block = f.read(chunk_size)
+        if not block:
+            break
+        lines += block.count('\n')
+        last = block[-1]
+    return lines + (last != '\n')
+
+
+# Text of the file from start on, in pieces of about chunk_size bytes that end at the end of a line
+def _text_chunks(file_name, start, chunk_size):
+    with open(file_name, 'rb') as f:
+        f.seek(start)
+        rest = ''
+        while True:
+            block = f.read(chunk_size)
+            if not block:
+                break
+            end = block.rfind('\n')
+            if end < 0:
+                rest += block
+                continue
+            yield rest + block[:end + 1]
+            rest = block[end + 1:]
+        if rest.strip():
+            yield rest
+
+
+def _groups(iterable, size):
+    group = []
+    for item in iterable:
+        group.append(item)
+        if len(group) == size:
+            yield group
+            group = []
+    if group:
+        yield group
+
+
+# Rows of a chunk of text as an array of dtype. Module level, so it can be sent to other processes
+def _parse_chunk(args):
+    text, dtype = args
+    text = text.strip()
+    if not text:
+        return np.zeros(0, dtype=dtype)
+    columns = len(dtype)
+
+    numbers_only = all(dtype[k].kind == 'f' or (dtype[k].kind in 'iu' and dtype[k].itemsize <= 4)
+                       for k in range(columns))
+    if numbers_only and '"' not in text:
+        rows = text.count('\n') + 1
+        values = np.fromstring(text.replace('\n', ','), dtype=np.float64, sep=',')
+        if values.shape[0] == rows * columns:
+            values = values.reshape(rows, columns)
+            table = np.zeros(rows, dtype=dtype)
+            for k, name in enumerate(dtype.names):
+                if dtype[k].kind in 'iu':
+                    fractions = np.nonzero(values[:, k] != np.floor(values[:, k]))[0]
+                    if fractions.shape[0] > 0:
+                        _wrong_type(name, dtype[k], str(values[fractions[0], k]))
+                table[name] = values[:, k]
+            return table
+
+    # Blank lines, text fields or quotes
+    rows = [row for row in csv.reader(text.splitlines()) if row]
+    for row in rows:
+        if len(row) != columns:
+            raise ValueError('Row with ' + str(len(row)) + ' fields instead of ' + str(columns) + ': ' + ','.join(row))
+    table = np.zeros(len(rows), dtype=dtype)
+    for k, name in enumerate(dtype.names):
+        try:
+            table[name] = np.array([row[k] for row in rows]).astype(dtype[k])
+        except ValueError:
+            for row in rows:
+                try:
+                    np.array([row[k]]).astype(dtype[k])
+                except ValueError:
+                    _wrong_type(name, dtype[k], row[k])
+            raise
+    return table
+
+
+def _wrong_type(name, dtype, value):
+    raise ValueError('Field ' + name + ' has a value that is not ' + str(dtype) + ': ' + value)
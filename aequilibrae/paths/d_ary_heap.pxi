@@ -0,0 +1,144 @@
+"""
+ -----------------------------------------------------------------------------------------------------------
+ Package:    AequilibraE
+
+ Name:       Array-backed d-ary heap
+ Purpose:    Priority queue for the shortest path routines (binary, 4-ary, ...)
+
+ Original Author:  Pedro Camargo (c@margo.co)
+ Contributors:
+ Last edited by: Pedro Camargo
+
+ Website:    www.AequilibraE.com
+ Repository:  https://github.com/AequilibraE/AequilibraE
+
+ Created:    2026-10-18
+ Updated:
+ Copyright:   (c) AequilibraE authors
+ Licence:     See LICENSE.TXT
+ -----------------------------------------------------------------------------------------------------------
+
+ The heap only moves node indices around. The key (distance label) of each node lives in a flat array indexed by
+ node, and the position of each node inside the heap is tracked so decrease-key is a single sift-up.
+ Any non-negative position means the node is in the heap. NOT_IN_HEAP and SCANNED are the other two states.
+ """
+
+cdef struct DAryHeap:
+    ITYPE_t* elements   # Node indices in heap order
+    ITYPE_t* positions  # Position of each node in elements (or NOT_IN_HEAP / SCANNED)
+    DTYPE_t* keys       # Distance label of each node
+    ITYPE_t size
+    ITYPE_t arity
+
+
+cdef void dary_attach(DAryHeap* heap,
+                      ITYPE_t* elements,
+                      ITYPE_t* positions,
+                      DTYPE_t* keys,
+                      ITYPE_t arity) nogil:
+    # Empty heap over existing arrays. Positions and keys are NOT reset, so the caller has to guarantee that all
+    # nodes are NOT_IN_HEAP with INFINITE keys (e.g. by resetting only the nodes touched by a previous search)
+    heap.elements = elements
+    heap.positions = positions
+    heap.keys = keys
+    heap.size = 0
+    heap.arity = arity
+
+
+cdef void dary_initialize(DAryHeap* heap,
+                          ITYPE_t* elements,
+                          ITYPE_t* positions,
+                          DTYPE_t* keys,
+                          ITYPE_t nodes,
+                          ITYPE_t arity) nogil:
+    cdef ITYPE_t i
+
+    dary_attach(heap, elements, positions, keys, arity)
+
+    for i in range(nodes):
+        positions[i] = NOT_IN_HEAP
+        keys[i] = INFINITE
+
+
+@cython.cdivision(True)
+cdef void dary_sift_up(DAryHeap* heap, ITYPE_t pos) nogil:
+    cdef ITYPE_t parent
+    cdef ITYPE_t node = heap.elements[pos]
+    cdef DTYPE_t key = heap.keys[node]
+
+    while pos > 0:
+        parent = (pos - 1) / heap.arity
+        if heap.keys[heap.elements[parent]] <= key:
+            break
+        heap.elements[pos] = heap.elements[parent]
+        heap.positions[heap.elements[pos]] = pos
+        pos = parent
+
+    heap.elements[pos] = node
+    heap.positions[node] = pos
+
+
+cdef void dary_sift_down(DAryHeap* heap, ITYPE_t pos) nogil:
+    cdef ITYPE_t child, last_child, best_child
+    cdef DTYPE_t best_key
+    cdef ITYPE_t node = heap.elements[pos]
+    cdef DTYPE_t key = heap.keys[node]
+
+    while True:
+        child = pos * heap.arity + 1
+        if child >= heap.size:
+            break
+
+        last_child = child + heap.arity
+        if last_child > heap.size:
+            last_child = heap.size
+
+        # Finds the smallest child
+        best_child = child
+        best_key = heap.keys[heap.elements[child]]
+        child += 1
+        while child < last_child:
+            if heap.keys[heap.elements[child]] < best_key:
+                best_child = child
+                best_key = heap.keys[heap.elements[child]]
+            child += 1
+
+        if best_key >= key:
+            break
+
+        heap.elements[pos] = heap.elements[best_child]
+        heap.positions[heap.elements[pos]] = pos
+        pos = best_child
+
+    heap.elements[pos] = node
+    heap.positions[node] = pos
+
+
+cdef void dary_push(DAryHeap* heap, ITYPE_t node, DTYPE_t key) nogil:
+    # Assumptions: - node is not in the heap
+    heap.keys[node] = key
+    heap.elements[heap.size] = node
+    heap.positions[node] = heap.size
+    heap.size += 1
+    dary_sift_up(heap, heap.size - 1)
+
+
+cdef void dary_decrease_key(DAryHeap* heap, ITYPE_t node, DTYPE_t key) nogil:
+    # Assumptions: - node is in the heap
+    #              - key <= current key of node
+    heap.keys[node] = key
+    dary_sift_up(heap, heap.positions[node])
+
+
+cdef ITYPE_t dary_pop(DAryHeap* heap) nogil:
+    # Assumptions: - heap is not empty
+    cdef ITYPE_t node = heap.elements[0]
+
+    heap.size -= 1
+    if heap.size > 0:
+        heap.elements[0] = heap.elements[heap.size]
+        heap.positions[heap.elements[0]] = 0
+        dary_sift_down(heap, 0)
+
+    heap.positions[node] = SCANNED
+    return node
@@ -0,0 +1,119 @@
+"""
+ -----------------------------------------------------------------------------------------------------------
+ Package:    AequilibraE
+
+ Name:       DBF reader
+ Purpose:    Reads columns of the attribute table of a shapefile straight into NumPy arrays
+
+ Original Author:  Pedro Camargo (c@margo.co)
+ Contributors:
+ Last edited by: Pedro Camargo
+
+ Website:    www.AequilibraE.com
+ Repository:  https://github.com/AequilibraE/AequilibraE
+
+ Created:    2026-10-18
+ Updated:
+ Copyright:   (c) AequilibraE authors
+ Licence:     See LICENSE.TXT
+ -----------------------------------------------------------------------------------------------------------
+
+ The attributes of a shapefile are in its .dbf file (dBase III), a table of fixed-width text records after a header
+ that describes the fields. The records are memory-mapped as a structured array, so only the columns asked for are
+ read and the geometries (.shp) are never touched. Numeric columns (types N and F) are parsed by NumPy in a single
+ call, falling back to one value at a time only for columns with empty or invalid values (NaN in the output).
+ """
+
+import os
+import numpy as np
+
+HEADER_SIZE = 32
+FIELD_SIZE = 32
+NUMERIC_TYPES = 'NF'
+
+
+def dbf_file(geo_file):
+    """The .dbf file of a shapefile (given by its .shp file or its name without extension)"""
+    base = os.path.splitext(geo_file)[0] if geo_file[-4:].lower() == '.shp' else geo_file
+    for extension in ['.dbf', '.DBF']:
+        if os.path.isfile(base + extension):
+            return base + extension
+    raise ValueError('Could not find the attribute table (.dbf) of ' + geo_file)
+
+
+def dbf_fields(file_name):
+    """Fields of a .dbf file: list of (name, type, length, decimals)"""
+    with open(file_name, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+        header_size = int(np.fromstring(header[8:10], '<u2')[0])
+        descriptors = f.read(header_size - HEADER_SIZE)
+
+    fields = []
+    for position in range(0, len(descriptors) - FIELD_SIZE + 1, FIELD_SIZE):
+        descriptor = descriptors[position:position + FIELD_SIZE]
+        if descriptor[0] == '\r':
+            break
+        name = descriptor[:11].split('\x00')[0].strip()
+        fields.append((name, descriptor[11], ord(descriptor[16]), ord(descriptor[17])))
+    return fields
+
+
+def read_dbf_columns(file_name, names):
+    """{name: array} for the fields in names. Numeric fields are float64 (NaN for empty or invalid values) and the
+    others are strings without padding. Deleted records are left out"""
+    fields = dbf_fields(file_name)
+    with open(file_name, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+    records = int(np.fromstring(header[4:8], '<u4')[0])
+    header_size = int(np.fromstring(header[8:10], '<u2')[0])
+    record_size = int(np.fromstring(header[10:12], '<u2')[0])
+
+    # Fields go by position, as names in .dbf files are not always unique
+    dtype = [('deleted', 'S1')] + [('f' + str(k), 'S' + str(field[2])) for k, field in enumerate(fields)]
+    padding = record_size - np.dtype(dtype).itemsize
+    if padding > 0:
+        dtype.append(('padding', 'S' + str(padding)))
+    positions = dict((field[0], k) for k, field in reversed(list(enumerate(fields))))
+    for name in names:
+        if name not in positions:
+            raise ValueError('Field ' + str(name) + ' is not in ' + file_name)
+
+    if records == 0:
+        table = np.zeros(0, dtype=dtype)
+    else:
+        table = np.memmap(file_name, dtype=dtype, mode='r', offset=header_size, shape=(records,))
+    kept = table['deleted'] != '*'
+
+    columns = {}
+    for name in names:
+        k = positions[name]
+        column = np.ascontiguousarray(table['f' + str(k)][kept])
+        if fields[k][1] in NUMERIC_TYPES:
+            columns[name] = _numbers(column, fields[k][2])
+        else:
+            columns[name] = np.char.strip(column)
+    del table
+    return columns
+
+
+# Fixed-width numbers (right aligned, padded with spaces) to float64
+def _numbers(column, width):
+    if column.shape[0] == 0:
+        return np.zeros(0, np.float64)
+
+    # A space after each value, so values that take the whole width are still apart
+    chars = np.zeros((column.shape[0], width + 1), 'S1')
+    chars[:, :width] = column.view('S1').reshape(column.shape[0], width)
+    chars[:, width] = ' '
+    values = np.fromstring(chars.tostring(), dtype=np.float64, sep=' ')
+    if values.shape[0] == column.shape[0]:
+        return values
+
+    # Empty (or invalid) values
+    values = np.zeros(column.shape[0], np.float64)
+    for i, value in enumerate(column):
+        try:
+            values[i] = float(value)
+        except ValueError:
+            values[i] = np.nan
+    return values
@@ -0,0 +1,81 @@
+"""
+ -----------------------------------------------------------------------------------------------------------
+ Package:    AequilibraE
+
+ Name:       Demand matrices
+ Purpose:    Common handling of dense and sparse demand matrices for assignment
+
+ Original Author:  Pedro Camargo (c@margo.co)
+ Contributors:
+ Last edited by: Pedro Camargo
+
+ Website:    www.AequilibraE.com
+ Repository:  https://github.com/AequilibraE/AequilibraE
+
+ Created:    2026-10-18
+ Updated:
+ Copyright:   (c) AequilibraE authors
+ Licence:     See LICENSE.TXT
+ -----------------------------------------------------------------------------------------------------------
+
+ Demand can be a NumPy array (zones x zones, or zones x zones x classes) or a scipy.sparse matrix (a single class).
+ Sparse matrices are converted to CSR (no copy if they already are) and never densified: the procedures go through
+ the destinations with demand of each origin (indices[indptr[O]:indptr[O + 1]]). scipy itself is not needed here,
+ anything with tocsr() is taken as a sparse matrix.
+ """
+
+import numpy as np
+
+
+def is_sparse(matrix):
+    return hasattr(matrix, 'tocsr')
+
+
+def as_csr(matrix):
+    """CSR version of a sparse matrix, with the types the compiled procedures need (int32 indices, float64 data)"""
+    matrix = matrix.tocsr()
+    if matrix.indptr.dtype != np.int32 or matrix.indices.dtype != np.int32 or matrix.data.dtype != np.float64:
+        matrix = matrix.copy()
+        matrix.indptr = matrix.indptr.astype(np.int32)
+        matrix.indices = matrix.indices.astype(np.int32)
+        matrix.data = matrix.data.astype(np.float64)
+    return matrix
+
+
+def origin_totals(matrix):
+    """Total demand (all classes) from each origin"""
+    if is_sparse(matrix):
+        matrix = matrix.tocsr()
+        rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+        return np.bincount(rows, weights=matrix.data, minlength=matrix.shape[0])
+    if matrix.ndim == 3:
+        return np.sum(np.sum(matrix, axis=2), axis=1)
+    return np.sum(matrix, axis=1)
+
+
+def destinations_per_origin(matrix):
+    """Number of destinations each origin has demand to (in any class)"""
+    if is_sparse(matrix):
+        matrix = matrix.tocsr()
+        rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+        return np.bincount(rows, weights=matrix.data > 0, minlength=matrix.shape[0]).astype(np.int64)
+    if matrix.ndim == 3:
+        matrix = np.sum(matrix, axis=2)
+    return np.sum(matrix > 0, axis=1)
+
+
+def demand_row(matrix, origin):
+    """Demand from origin to all zones, as a dense vector (a single row of a sparse matrix is densified)"""
+    if is_sparse(matrix):
+        matrix = matrix.tocsr()
+        row = np.zeros(matrix.shape[1], np.float64)
+        first, last = matrix.indptr[origin], matrix.indptr[origin + 1]
+        np.add.at(row, matrix.indices[first:last], matrix.data[first:last])
+        return row
+    return matrix[origin, :]
+
+
+def sparse_row(matrix, origin):
+    """(destinations, demand) of origin in a CSR matrix, as one_to_all takes it"""
+    first, last = matrix.indptr[origin], matrix.indptr[origin + 1]
+    return matrix.indices[first:last], matrix.data[first:last]
@@ -0,0 +1,399 @@
+"""
+ -----------------------------------------------------------------------------------------------------------
+ Package:    AequilibraE
+
+ Name:       User equilibrium assignment
+ Purpose:    Capacity restrained assignment (MSA and Frank-Wolfe family) built on all-or-nothing
+
+ Original Author:  Pedro Camargo (c@margo.co)
+ Contributors:
+ Last edited by: Pedro Camargo
+
+ Website:    www.AequilibraE.com
+ Repository:  https://github.com/AequilibraE/AequilibraE
+
+ Created:    2026-10-18
+ Updated:
+ Copyright:   (c) AequilibraE authors
+ Licence:     See LICENSE.TXT
+ -----------------------------------------------------------------------------------------------------------
+
+ Algorithms:
+    'msa':          Method of successive averages (step 1/k)
+    'frank-wolfe':  Frank-Wolfe with line search over the Beckmann objective
+    'cfw':          Conjugate Frank-Wolfe (Mitradjieva & Lindberg, 2013)
+    'bfw':          Bi-conjugate Frank-Wolfe (Mitradjieva & Lindberg, 2013)
+
+ Link costs come from a volume-delay function (vdf.py: 'bpr', 'conical' or 'akcelik'), with the free-flow time
+ taken from the graph's cost field. Its alpha and beta can be numbers or graph fields. The congested times are written in Graph.cost (and in the skims of the cost field),
+ so at the end the graph holds the equilibrium costs. Use set_graph to get back to the free-flow costs.
+
+ Several user classes (e.g. cars and trucks) come as a zones x zones x classes matrix. All classes see the same
+ costs, so they are loaded on the same trees, and the flow that goes into the volume-delay function is the sum of
+ the class flows weighted by their passenger car equivalents (pce). All classes move with the same step, so the
+ algorithms work on the total flows and apply the same combinations to the flows of each class. The loads of each
+ class end up in results.class_link_loads and the total (in pce) in results.link_loads.
+ """
+
+import sys
+sys.dont_write_bytecode = True
+
+import numpy as np
+import os
+import yaml
+from time import time
+
+from multi_threaded_aon import MultiThreadedAoN
+from assignment import all_or_nothing
+from vdf import VDF, DEFAULT_PARAMETERS
+
+ALGORITHMS = ['msa', 'frank-wolfe', 'cfw', 'bfw']
+
+
+class EquilibriumAssignment:
+    def __init__(self, matrix=None, graph=None, results=None, algorithm='frank-wolfe', capacity_field='capacity',
+                 vdf='bpr', parameters=None, warm_start=False, pce=None):
+        if parameters is None:
+            parameters = self.get_parameters('frank-wolfe')
+            # alpha and beta in the parameters file are the ones of BPR
+            if vdf != 'bpr' and vdf in DEFAULT_PARAMETERS:
+                parameters.update(DEFAULT_PARAMETERS[vdf])
+
+        self.matrix = matrix
+        self.graph = graph
+        self.results = results
+        self.algorithm = algorithm
+        self.capacity_field = capacity_field
+        self.vdf_function = vdf
+        self.parameters = parameters
+        self.warm_start = warm_start  # Starts from the state in results.warm_start (see __warm_start)
+        self.pce = pce  # Passenger car equivalent of each user class (1 for all if None)
+        self.classes = 1
+        self.error = None
+        self.error_free = True
+        self.__required_parameters = ['rgap', 'max iterations', 'alpha', 'beta']
+        self.report = ['  #####    Equilibrium assignment    #####  ', '']
+
+        self.iteration = 0
+        self.rgap = np.inf
+        self.gaps = []  # Relative gap at each iteration
+        self.steps = []  # Step size at each iteration
+
+        self.aux_res = None
+        self.vdf = None
+        self.congested_time = None  # Same array as Graph.cost during the assignment
+        self.link_flows = None  # Current solution (x)
+        self.aon_flows = None  # All-or-nothing flows for the current costs (y)
+        self.step_direction = None  # Target of the current step (s_k)
+        self.previous_direction = None  # s_(k-1)
+        self.older_direction = None  # s_(k-2)
+        self.previous_step = None  # Step size of the previous iteration
+
+        # Flows by user class, when there are several. DIMENSION: # of links x # of classes
+        self.class_flows = None
+        self.class_aon_flows = None
+        self.class_direction = None
+        self.class_previous_direction = None
+        self.class_older_direction = None
+
+        # Work arrays, so iterations do not allocate memory
+        self.vdf_derivative = None
+        self.direction = None
+        self.search_flows = None
+        self.search_time = None
+        self.work = None
+
+    def check_data(self):
+        self.error = None
+        self.check_parameters()
+
+        if self.matrix is None or self.graph is None or self.results is None:
+            self.error = 'missing data'
+
+        if self.error is None:
+            if self.algorithm not in ALGORITHMS:
+                self.error = 'Algorithm ' + str(self.algorithm) + ' is not available. Use one of ' + str(ALGORITHMS)
+            elif self.graph.cost is None:
+                self.error = 'The graph has no cost field set'
+            elif self.results.__graph_id__ != self.graph.__id__:
+                self.error = 'The results object was not prepared for this graph. Use results.prepare(graph)'
+            elif self.matrix.ndim not in [2, 3]:
+                self.error = 'Matrix needs to be zones x zones or zones x zones x classes'
+            elif self.matrix.shape[0] > self.results.zones or self.matrix.shape[1] > self.results.zones:
+                self.error = 'Matrix has more zones than the graph'
+            elif self.pce is not None and len(self.pce) != (self.matrix.shape[2] if self.matrix.ndim == 3 else 1):
+                self.error = 'There needs to be one pce for each user class'
+            elif self.warm_start and self.results.warm_start is None:
+                self.error = 'There is no assignment state to start from. Use results.load_warm_start'
+
+        if self.error is not None:
+            self.error_free = False
+
+    def check_parameters(self):
+        for i in self.__required_parameters:
+            if i not in self.parameters:
+                self.error = 'Parameters error. It needs to be a dictionary with the following keys: '
+                for t in self.__required_parameters:
+                    self.error = self.error + t + ', '
+                break
+
+    def execute(self):
+        t = time()
+        self.check_data()
+        if not self.error_free:
+            raise ValueError(self.error)
+
+        max_iter = self.parameters['max iterations']
+        target_gap = self.parameters['rgap']
+
+        self.report.append('Algorithm: ' + self.algorithm)
+        self.report.append('Target relative gap: ' + str(target_gap))
+        self.report.append('Maximum iterations: ' + str(max_iter))
+        self.report.append('')
+        self.report.append('Iteration,   Relative gap')
+
+        # The same buffers are used by all iterations
+        self.__initialize()
+
+        self.iteration = 0
+        if self.warm_start and self.__warm_start():
+            # We already have a solution, so the first iteration is a regular one
+            self.iteration = 1
+        self.rgap = np.inf
+        self.gaps = []
+        self.steps = []
+        while self.iteration < max_iter:
+            self.iteration += 1
+
+            errors = all_or_nothing(self.matrix, self.graph, self.results, aux_res=self.aux_res)
+            if errors:
+                raise ValueError('All-or-nothing failed: ' + str(errors))
+            if self.class_flows is None:
+                self.aon_flows[:] = self.results.link_loads[self.graph.ids]
+            else:
+                self.class_aon_flows[:, :] = self.results.class_link_loads[self.graph.ids, :]
+                np.dot(self.class_aon_flows, self.pce, out=self.aon_flows)
+
+            if self.iteration == 1:
+                self.link_flows[:] = self.aon_flows
+                if self.class_flows is not None:
+                    self.class_flows[:, :] = self.class_aon_flows
+                step = 1.0
+            else:
+                self.rgap = self.relative_gap()
+                self.gaps.append(self.rgap)
+                self.report.append(str(self.iteration - 1) + '   ,   ' + str("{:4,.10f}".format(self.rgap)))
+                if self.rgap < target_gap:
+                    break
+
+                self.__find_direction()
+                step = self.__step_size()
+                self.link_flows += step * (self.step_direction - self.link_flows)
+                if self.class_flows is not None:
+                    self.class_flows += step * (self.class_direction - self.class_flows)
+
+            self.steps.append(step)
+            self.previous_step = step
+            self.__update_costs()
+
+        # Final loads are the equilibrium ones, not the last all-or-nothing
+        self.results.link_loads.fill(0)
+        self.results.link_loads[self.graph.ids] = self.link_flows
+        class_flows = None
+        if self.class_flows is not None:
+            self.results.class_link_loads = np.zeros((self.results.links, self.classes), np.float64)
+            self.results.class_link_loads[self.graph.ids, :] = self.class_flows
+            class_flows = self.class_flows.copy()
+        self.results.set_warm_start(self.graph, self.matrix, self.link_flows.copy(), self.congested_time.copy(),
+                                    class_flows=class_flows)
+
+        self.report.append('')
+        if self.rgap < target_gap:
+            self.report.append('Converged in ' + str(self.iteration) + ' iterations')
+        else:
+            self.report.append('Did not converge in ' + str(max_iter) + ' iterations')
+        self.report.append('Running time: ' + str("{:4,.3f}".format(time() - t)) + 's')
+
+    def relative_gap(self):
+        # (total system travel time - shortest path travel time) / total system travel time
+        tstt = np.sum(self.link_flows * self.congested_time)
+        sptt = np.sum(self.aon_flows * self.congested_time)
+        if tstt == 0:
+            return 0
+        return (tstt - sptt) / tstt
+
+    def __initialize(self):
+        g = self.graph
+        links = g.num_links
+        self.vdf = VDF(self.vdf_function, self.parameters['alpha'], self.parameters['beta'], self.capacity_field)
+        self.vdf.set_cores(self.results.cores)
+        self.vdf.prepare(g)
+
+        if self.matrix.ndim == 3:
+            self.classes = self.matrix.shape[2]
+        if self.pce is None:
+            self.pce = np.ones(self.classes, np.float64)
+        self.pce = np.array(self.pce, np.float64)
+
+        self.aux_res = MultiThreadedAoN()
+        self.aux_res.prepare(g, self.results, self.classes)
+
+        # Graph.cost may be a view of the cost field, so we give the graph its own array before changing it
+        self.congested_time = np.array(self.vdf.free_flow_time)
+        g.cost = self.congested_time
+        self.__update_skims()
+
+        self.link_flows = np.zeros(links, np.float64)
+        self.aon_flows = np.zeros(links, np.float64)
+        self.step_direction = np.zeros(links, np.float64)
+        self.previous_direction = np.zeros(links, np.float64)
+        self.older_direction = np.zeros(links, np.float64)
+        self.previous_step = 1.0
+
+        self.vdf_derivative = np.zeros(links, np.float64)
+        self.direction = np.zeros(links, np.float64)
+        self.search_flows = np.zeros(links, np.float64)
+        self.search_time = np.zeros(links, np.float64)
+        self.work = np.zeros(links, np.float64)
+
+        if self.matrix.ndim == 3:
+            self.class_flows = np.zeros((links, self.classes), np.float64)
+            self.class_aon_flows = np.zeros((links, self.classes), np.float64)
+            self.class_direction = np.zeros((links, self.classes), np.float64)
+            self.class_previous_direction = np.zeros((links, self.classes), np.float64)
+            self.class_older_direction = np.zeros((links, self.classes), np.float64)
+
+    # Flows of the previous assignment are only a valid solution if the demand is the same and all links with flow
+    # are still in the graph
+    def __warm_start(self):
+        ws = self.results.warm_start
+        positions = self.results.warm_start_positions(self.graph)
+
+        if ws['demand'] != self.results.demand_signature(self.matrix):
+            self.report.insert(-2, 'Warm start discarded: demand is different')
+            return False
+        if np.any(ws['link_flows'][positions < 0] > 0):
+            self.report.insert(-2, 'Warm start discarded: links with flow are not in the graph anymore')
+            return False
+        if self.class_flows is not None and (ws.get('class_flows') is None or
+                                             ws['class_flows'].shape[1] != self.classes):
+            self.report.insert(-2, 'Warm start discarded: there are no flows for these user classes')
+            return False
+
+        self.link_flows[positions[positions >= 0]] = ws['link_flows'][positions >= 0]
+        if self.class_flows is not None:
+            self.class_flows[positions[positions >= 0], :] = ws['class_flows'][positions >= 0, :]
+            np.dot(self.class_flows, self.pce, out=self.link_flows)
+        self.__update_costs()
+        self.report.insert(-2, 'Warm start from a previous assignment')
+        return True
+
+    def __update_costs(self):
+        self.vdf.apply(self.congested_time, self.link_flows)
+        self.__update_skims()
+
+    def __update_skims(self):
+        for i, field in enumerate(self.graph.skim_fields):
+            if field == self.graph.cost_field:
+                self.graph.skims[:, i] = self.congested_time
+
+    # sum(a * h * b), with h the derivative of the link costs
+    def __weighted_product(self, a, b):
+        np.multiply(a, self.vdf_derivative, out=self.work)
+        return np.dot(self.work, b)
+
+    # Computes the target of the step (step_direction) for the algorithm chosen. It is always a combination
+    # a * y + b * s_(k-1) + c * s_(k-2), with the coefficients computed on the total flows
+    def __find_direction(self):
+        x = self.link_flows
+        y = self.aon_flows
+        conjugate = self.algorithm == 'cfw' or (self.algorithm == 'bfw' and self.iteration == 3)
+
+        if self.algorithm in ['msa', 'frank-wolfe'] or self.iteration == 2:
+            a, b, c = 1.0, 0.0, 0.0
+
+        elif conjugate:
+            self.vdf.apply_derivative(self.vdf_derivative, x)
+            np.subtract(self.previous_direction, x, out=self.direction)  # s_(k-1) - x
+            np.subtract(y, x, out=self.search_flows)  # y - x
+            numerator = self.__weighted_product(self.direction, self.search_flows)
+            np.subtract(y, self.previous_direction, out=self.search_flows)  # y - s_(k-1)
+            denominator = self.__weighted_product(self.direction, self.search_flows)
+            alpha = 0
+            if denominator != 0:
+                alpha = min(max(numerator / denominator, 0), 1 - 1e-6)
+            a, b, c = 1 - alpha, alpha, 0.0
+
+        else:
+            # Bi-conjugate
+            self.vdf.apply_derivative(self.vdf_derivative, x)
+            tau = self.previous_step
+            np.subtract(y, x, out=self.search_flows)  # y - x
+
+            # tau * s_(k-1) + (1 - tau) * s_(k-2) - x
+            np.multiply(self.previous_direction, tau, out=self.direction)
+            self.direction += (1 - tau) * self.older_direction
+            self.direction -= x
+            np.subtract(self.older_direction, self.previous_direction, out=self.search_time)  # s_(k-2) - s_(k-1)
+            mu = 0
+            denominator = self.__weighted_product(self.direction, self.search_time)
+            if denominator != 0:
+                mu = max(0, -self.__weighted_product(self.direction, self.search_flows) / denominator)
+
+            np.subtract(self.previous_direction, x, out=self.direction)  # s_(k-1) - x
+            nu = 0
+            denominator = self.__weighted_product(self.direction, self.direction)
+            if denominator != 0 and tau < 1:
+                nu = max(0, -self.__weighted_product(self.direction, self.search_flows) / denominator +
+                         mu * tau / (1 - tau))
+
+            beta_0 = 1.0 / (1 + mu + nu)
+            a, b, c = beta_0, nu * beta_0, mu * beta_0
+
+        self.__combine(self.step_direction, y, self.previous_direction, self.older_direction, a, b, c)
+        if self.class_flows is not None:
+            self.__combine(self.class_direction, self.class_aon_flows, self.class_previous_direction,
+                           self.class_older_direction, a, b, c)
+
+    @staticmethod
+    def __combine(direction, y, previous, older, a, b, c):
+        np.multiply(y, a, out=direction)
+        if b != 0:
+            direction += b * previous
+        if c != 0:
+            direction += c * older
+        older[...] = previous
+        previous[...] = direction
+
+    def __step_size(self):
+        if self.algorithm == 'msa':
+            return 1.0 / self.iteration
+
+        # Bisection on the derivative of the Beckmann objective along the direction
+        np.subtract(self.step_direction, self.link_flows, out=self.direction)
+        if self.__objective_derivative(1.0) <= 0:
+            return 1.0
+
+        lower, upper = 0.0, 1.0
+        for i in range(50):
+            step = (lower + upper) / 2
+            if self.__objective_derivative(step) > 0:
+                upper = step
+            else:
+                lower = step
+            if upper - lower < 1e-10:
+                break
+        return (lower + upper) / 2
+
+    # sum(d * t(x + step * d))
+    def __objective_derivative(self, step):
+        np.multiply(self.direction, step, out=self.search_flows)
+        self.search_flows += self.link_flows
+        self.vdf.apply(self.search_time, self.search_flows)
+        return np.dot(self.direction, self.search_time)
+
+    def get_parameters(self, model):
+        path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+        with open(path + '/parameters.yml', 'r') as yml:
+            path = yaml.safe_load(yml)
+        return path['assignment'][model]
@@ -20,10 +20,15 @@
  """
 
 import numpy as np
-import os, csv
+import os
 import cPickle
 from datetime import datetime
 import uuid
+from contraction_hierarchy import ContractionHierarchy
+from graph_file import is_graph_file, write_graph_file, read_graph_file
+from graph_compression import degree_two_chains
+from csv_loader import load_csv, csv_titles
+from dbf_reader import dbf_file, read_dbf_columns
 
 VERSION = ''
 a = open(os.path.join(os.path.dirname(__file__),'parameters.pxi'), 'r')
@@ -78,11 +83,37 @@ class Graph:
         self.cost_field = False # Name of the cost field
         self.ids = False     # 1-D Array with link IDs (sequence from 0 to N-1)
 
+        # Backward star, used by the searches that run from the destination
+        self.bs = False       # Index of each node in bs_links. DIMENSION: # Of nodes +2
+        self.bs_links = False # Position in the forward star of the links, sorted by b_node
+
+        # Landmarks for the A* lower bounds. They are only valid for the cost they were computed with
+        self.landmarks = None       # Landmark nodes
+        self.from_landmarks = None  # 2-D array (landmarks x nodes) with the cost from each landmark to all nodes
+        self.to_landmarks = None    # 2-D array (landmarks x nodes) with the cost from all nodes to each landmark
+
+        # Contraction hierarchy for repeated skimming. Also only valid for the cost it was built with
+        self.contraction_hierarchy = None
+
         self.block_centroid_flows = False
         self.penalty_through_centroids = np.inf
 
+        # Priority queue used by path finding. One of 'quaternary', 'binary' or 'fibonacci' (kept for reference)
+        self.heap_type = 'quaternary'
+
         self.centroids = 0  # ID of the highest node in the network that is a centroid
 
+        # Node renumbering (renumber_nodes). Node IDs in the graph are internal and node_ids has the external (network)
+        # ID of each one. Nodes up to renumbered_centroids keep their IDs, so zones are the same in both
+        self.node_ids = None
+        self.renumbered_centroids = 0
+
+        # Degree-2 compression (compress). Link i of a compressed graph replaces the links (positions) of the original
+        # graph chain_links[chains[i]:chains[i + 1]]
+        self.chains = None
+        self.chain_links = None
+        self.original_links = -1  # Number of links of the original graph
+
         self.status = 'NO network loaded'
         self.network_ok = False
         self.type_loaded = False
@@ -98,118 +129,68 @@ class Graph:
         self.__layer_name__ = None
 
     # Create a graph from a shapefile. To be upgraded to ANY geographic file in the future
+    # Only the attribute table (.dbf) is read, column by column (see dbf_reader.py). Geometries are not needed
     def create_from_geography(self, geo_file, id_field, dir_field, cost_field, skim_fields = [], anode="A_NODE", bnode="B_NODE"):
-        import shapefile
-        cost_field_name = cost_field
-        error = None
-        geo_file_records = shapefile.Reader(geo_file)
-        records = geo_file_records.records()
-
-        a = []
-        def find_field_index(fields, field_name):
-            for i, f in enumerate(fields):
-                if f[0] == field_name:
-                    return i - 1
-            return -1
-
-        # collect the fields in the network
-        check_titles = [id_field, dir_field, anode, bnode, cost_field]
-        id_field = find_field_index(geo_file_records.fields, id_field)
-        dir_field = find_field_index(geo_file_records.fields, dir_field)
-        cost_field = find_field_index(geo_file_records.fields, cost_field)
-        anode = find_field_index(geo_file_records.fields, anode)
-        bnode = find_field_index(geo_file_records.fields, bnode)
+        self.network_ok = False
+        integer_fields = [id_field, dir_field, anode, bnode]
+        float_fields = [cost_field] + [k for k in skim_fields if k != cost_field]
+        columns = read_dbf_columns(dbf_file(geo_file), integer_fields + float_fields)
 
-        # Appends all fields to the list of fields to be used
-        all_types = [np.int32, np.int32, np.int32, np.float64, np.float64, np.int8]
-        all_titles = ['link_id', 'a_node', 'b_node', cost_field_name.lower() + '_ab', cost_field_name.lower() + '_ba', 'direction']
-        check_fields = [id_field, dir_field, anode, bnode, cost_field]
-        types_to_check = [int, int, int, int, float]
-
-        # Loads the skim index fields
-        dict_field = {}
-        for k in skim_fields:
-            skim_index = find_field_index(geo_file_records.fields, k)
-            check_fields.append(skim_index)
-            check_titles.append(k)
-            types_to_check.append(float)
-
-            all_types.append(np.float64)
-            all_types.append(np.float64)
-            all_titles.append((k + '_ab').encode('ascii', 'ignore'))
-            all_titles.append((k + '_ba').encode('ascii', 'ignore'))
-            dict_field[k + '_ab'] = skim_index
-            dict_field[k + '_ba'] = skim_index
-
-        dt = [(t, d) for t, d in zip(all_titles, all_types)]
-
-        # Check ID uniqueness and if there are any non-valid values
-        all_ids = []
-        for feat in records:
-            for i, j in enumerate(check_fields):
-                k = feat[j]
-                if not isinstance(k, types_to_check[i]):
-                    error = check_titles[i], "field has wrong type or empty values"
-                    break
-            all_ids.append(feat[check_fields[0]])
+        # Check if there are any non-valid values and ID uniqueness
+        error = None
+        for field in integer_fields + float_fields:
+            values = columns[field]
+            if values.dtype != np.float64 or np.isnan(values).any():
+                error = field + ' field has wrong type or empty values'
+            elif field in integer_fields and (values != np.floor(values)).any():
+                error = field + ' field has wrong type or empty values'
             if error is not None:
                 break
 
         if error is None:
-            # Checking uniqueness
-            all_ids = np.array(all_ids, np.int)
-            y = np.bincount(all_ids)
-            if np.max(y) > 1:
+            ids, counts = np.unique(columns[id_field], return_counts=True)
+            if counts.shape[0] > 0 and np.max(counts) > 1:
                 error = 'IDs are not unique.'
 
-        if error is None:
-            data = []
-
-            for feat in records:
-                line = []
-                line.append(feat[id_field])
-                line.append(feat[anode])
-                line.append(feat[bnode])
-                line.append(feat[cost_field])
-                line.append(feat[cost_field])
-                line.append(feat[dir_field])
-
-                # We append the skims now
-                for k in all_titles:
-                    if k in dict_field:
-                        line.append(feat[dict_field[k]])
-                data.append(line)
-
-            network = np.asarray(data)
-            del data
-
-            self.network = np.zeros(network.shape[0], dtype=dt)
-            for k, t in enumerate(dt):
-                self.network[t[0]] = network[:, k].astype(t[1])
-            del network
-
-            self.type_loaded = 'SHAPEFILE'
-            self.status = 'OK'
-            self.network_ok = True
-            self.prepare_graph()
-            self.__source__ = geo_file
-            self.__field_name__ = None
-            self.__layer_name__ = None
+        if error is not None:
+            self.status = error
+            raise ValueError(error)
+
+        # Appends all fields to the list of fields to be used
+        titles = dict((k, k.encode('ascii', 'ignore')) for k in float_fields)
+        titles[cost_field] = cost_field.lower()
+        dt = [('link_id', np.int32), ('a_node', np.int32), ('b_node', np.int32)]
+        for k in float_fields:
+            dt.extend([(titles[k] + '_ab', np.float64), (titles[k] + '_ba', np.float64)])
+            if k == cost_field:
+                dt.append(('direction', np.int8))
+
+        self.network = np.zeros(columns[id_field].shape[0], dtype=dt)
+        self.network['link_id'] = columns[id_field]
+        self.network['a_node'] = columns[anode]
+        self.network['b_node'] = columns[bnode]
+        self.network['direction'] = columns[dir_field]
+        for k in float_fields:
+            self.network[titles[k] + '_ab'] = columns[k]
+            self.network[titles[k] + '_ba'] = columns[k]
+        del columns
+
+        self.type_loaded = 'SHAPEFILE'
+        self.status = 'OK'
+        self.network_ok = True
+        self.prepare_graph()
+        self.__source__ = geo_file
+        self.__field_name__ = None
+        self.__layer_name__ = None
 
-    # Procedure to load csv network from disk
-    def load_network_from_csv(self, netw):
+    # Procedure to load csv network from disk. dtypes: {field: dtype} for fields with a known type (see csv_loader.py
+    # for the others). With cores > 1, chunks of the file are parsed in parallel
+    def load_network_from_csv(self, netw, dtypes=None, cores=1):
         self.network_ok = False
         self.type_loaded = 'NET'
 
-        with open(netw, 'r') as n:
-            net_iter = csv.reader(n,
-                                  delimiter=',',
-                                  quotechar='"')
-
-            data = [data for data in net_iter]
-
-        all_titles = [x.lower() for x in data[0]]
-        data.pop(0)
+        network = load_csv(netw, self.__csv_types__(netw, dtypes), cores)
+        all_titles = list(network.dtype.names)
 
         # Check if all dual fields are provided
         for i in all_titles:
@@ -233,28 +214,7 @@ class Graph:
                 else:
                     raise ValueError('Non permitted field ' + i + ' in the network')
 
-        # determining types.  We analyze the first ten links of the network to determine type of each field
-        all_types = []
-        for k in range(len(data[0])):
-            all_types.append(long)
-        for i in range(10):
-            for k in range(len(data[i])):
-                all_types[k] = self.__determine_types__(data[i][k], all_types[k])
-
-        for k in range(len(all_types)):
-            if all_types[k] == long:
-                all_types[k] = np.int32
-            elif all_types[k] == float:
-                all_types[k] = np.float64
-            elif all_types[k] == str:
-                all_types[k] = np.dtype('a256')
-
-        dt = [(t, d) for t, d in zip(all_titles, all_types)]
-        network = np.asarray(data)
-        del data
-        self.network = np.zeros(network.shape[0], dtype=dt)
-        for k, t in enumerate(dt):
-            self.network[t[0]] = network[:, k].astype(t[1])
+        self.network = network
         del network
 
         self.type_loaded = 'NETWORK'
@@ -271,48 +231,21 @@ class Graph:
             self.network_ok = True
             self.status = 'OK'
 
-    def load_graph_from_csv(self, netw):
+    def load_graph_from_csv(self, netw, dtypes=None, cores=1):
         self.add_single_field('id')
         self.network_ok = False
         self.type_loaded = 'GRAPH'
 
-        with open(netw, 'r') as n:
-            net_iter = csv.reader(n,
-                                  delimiter=',',
-                                  quotechar='"')
-            data = [data for data in net_iter]
-
-        all_titles = [x.lower() for x in data[0]]
-        data.pop(0)
+        graph = load_csv(netw, self.__csv_types__(netw, dtypes, ['id']), cores)
+        all_titles = list(graph.dtype.names)
 
         # Check if all dual fields are provided
         for i in all_titles:
             if i not in self.required_default_fields:
                 raise ValueError('Non permitted field ' + i + ' in the network')
 
-        # determining types.  We analyze the first ten links of the network to determine type of each field
-        all_types = []
-        for k in range(len(data[0])):
-            all_types.append(long)
-        for i in range(10):
-            for k in range(len(data[i])):
-                all_types[k] = self.__determine_types__(data[i][k], all_types[k])
-
-        for k in range(len(all_types)):
-            if all_types[k] == long:
-                all_types[k] = np.int32
-            elif all_types[k] == float:
-                all_types[k] = np.float64
-            elif all_types[k] == str:
-                all_types[k] = np.dtype('a256')
-
-        dt = [(t, d) for t, d in zip(all_titles, all_types)]
-        network = np.asarray(data)
-        del data
-        self.graph = np.zeros(network.shape[0], dtype=dt)
-        for k, t in enumerate(dt):
-            self.graph[t[0]] = network[:, k].astype(t[1])
-        del network
+        self.graph = graph
+        del graph
 
         self.type_loaded = 'GRAPH'
 
@@ -329,27 +262,14 @@ class Graph:
         ind = np.lexsort((self.graph['b_node'], self.graph['a_node']))
         self.graph = self.graph[ind]
 
-        self.fs = np.zeros(self.num_nodes +2, dtype=np.int32)
-
-        a = self.graph['a_node'][0]
-        p = 0
-        k = 0
-        for i in xrange(1, self.num_links):
-            if a != self.graph['a_node'][i]:
-                for j in xrange(p, self.graph['a_node'][i]):
-                    self.fs[j + 1] = k
-                p = a
-                a = self.graph['a_node'][i]
-                k = i
-
-        for j in xrange(p, self.graph['a_node'][i-1]):
-            self.fs[j + 1] = k
-
-        self.fs[-1] = self.num_links
+        self.build_forward_star()
         self.ids = self.graph['id']
         self.b_node = self.graph['b_node']
+        self.node_ids = None
+        self.renumbered_centroids = 0
 
-    def prepare_graph(self):
+    # renumber: None (node IDs of the network) or one of the methods of renumber_nodes, for which centroids is needed
+    def prepare_graph(self, renumber=None, centroids=None):
         if not self.network_ok:
             raise ValueError('Network not yet properly loaded')
         else:
@@ -418,25 +338,163 @@ class Graph:
 
                 self.graph['id'] = np.arange(self.num_links)
                 self.num_nodes = max(np.max(self.graph['a_node']), np.max(self.graph['b_node']))
-                self.fs = np.zeros(self.num_nodes + 2, dtype=np.int32)  # NOT SURE IF IT SHOULD BE +1 OR +2. SINCE IT IS WORKING AND DOES NOT AFFECT RESULTS, LEAVING AS +2 FOR NOW
-
-                a = self.graph['a_node'][0]
-                p = 0
-                k = 0
-                for i in xrange(1, self.num_links):
-                    if a != self.graph['a_node'][i]:
-                        for j in xrange(p, self.graph['a_node'][i]):
-                            self.fs[j + 1] = k
-                        p = a
-                        a = self.graph['a_node'][i]
-                        k = i
-
-                for j in xrange(p, self.num_nodes):
-                    self.fs[j + 1] = k
-
-                self.fs[self.num_nodes +1] = self.graph.shape[0]  # IF ENDS UP BEING +2 IN THE COMMENT ON LINE 299, THEN THIS LINE BECOMES IRRELEVANT
+                self.build_forward_star()
                 self.ids = self.graph['id']
                 self.b_node = self.graph['b_node']
+                self.node_ids = None
+                self.renumbered_centroids = 0
+
+                if renumber is not None:
+                    if centroids is None:
+                        raise ValueError('Renumbering nodes needs the number of centroids, which keep their IDs')
+                    self.renumber_nodes(centroids, renumber)
+
+    # Gives the nodes new (internal) IDs, so nodes close to each other in the network are also close in the arrays
+    # indexed by node (forward star, costs, predecessors, ...), which makes path finding use the cache much better in
+    # large networks. Centroids (and node 0) keep their IDs, the other nodes get IDs from centroids + 1 on in the order
+    # of the method and IDs not used by any link are dropped:
+    #   'rcm': reverse Cuthill-McKee (breadth-first from a low degree node, visiting lower degree neighbors first)
+    #   'bfs': breadth-first order
+    # Outputs with nodes (paths, path files, warm starts) are given in the original IDs (see external_nodes)
+    def renumber_nodes(self, centroids, method='rcm'):
+        if method not in ['rcm', 'bfs']:
+            raise ValueError('Renumbering method ' + str(method) + ' is not available. Use one of: rcm, bfs')
+        if self.graph is False:
+            raise ValueError('Graph not yet prepared')
+        if self.chains is not None:
+            raise ValueError('Nodes of a compressed graph can not be renumbered. Renumber them before compressing')
+
+        a_nodes = self.external_nodes(self.graph['a_node'])
+        b_nodes = self.external_nodes(self.graph['b_node'])
+        nodes = max(int(np.max(a_nodes)), int(np.max(b_nodes)), centroids) + 1
+
+        # Centroids are not part of the traversal, so it does not jump between zones through the connectors
+        fixed = np.ones(nodes, np.bool_)
+        fixed[a_nodes] = False
+        fixed[b_nodes] = False
+        fixed[:centroids + 1] = True
+        order = _traversal_order(a_nodes, b_nodes, nodes, fixed, method == 'rcm')
+        if method == 'rcm':
+            order = order[::-1]
+
+        new_ids = np.zeros(nodes, np.int32) - 1
+        new_ids[:centroids + 1] = np.arange(centroids + 1)
+        new_ids[order] = np.arange(centroids + 1, centroids + 1 + order.shape[0])
+        self.node_ids = np.hstack((np.arange(centroids + 1), order)).astype(np.int32)
+        self.renumbered_centroids = centroids
+
+        self.graph['a_node'] = new_ids[a_nodes]
+        self.graph['b_node'] = new_ids[b_nodes]
+        ind = np.lexsort((self.graph['b_node'], self.graph['a_node']))
+        self.graph = self.graph[ind]
+        self.graph['id'] = np.arange(self.num_links)
+        self.num_nodes = self.node_ids.shape[0] - 1
+        self.build_forward_star()
+        self.ids = self.graph['id']
+        self.b_node = self.graph['b_node']
+        self.bs = False
+        self.bs_links = False
+        self.clear_landmarks()
+        self.contraction_hierarchy = None
+
+        # Cost and skims follow the new order of the links
+        if self.cost is not None:
+            skim_fields = [x for x in self.skim_fields if x != self.cost_field]
+            self.cost = None
+            self.set_graph(cost_field=self.cost_field, skim_fields=skim_fields,
+                           block_centroid_flows=self.block_centroid_flows)
+
+    # Compressed graph: a new graph where chains of nodes that only join two other nodes are collapsed into single
+    # links, with the sum of the costs and skims of the links they replace (see graph_compression.py). Nodes keep
+    # their IDs. Shortest paths and all-or-nothing loads are the same as in this graph, and are brought back to it
+    # with expand_link_loads and expand_path of the compressed graph. The cost field needs to be set
+    def compress(self):
+        if self.cost is None:
+            raise ValueError('Before compressing the graph, you need to set the cost field')
+        if self.chains is not None:
+            raise ValueError('Graph is already compressed')
+
+        a_nodes, b_nodes, chains, chain_links = degree_two_chains(self.graph['a_node'], self.b_node, self.fs,
+                                                                  self.centroids)
+        links = a_nodes.shape[0]
+        starts = chains[:-1]
+
+        fields = []
+        for i in self.skim_fields:
+            if i not in fields:
+                fields.append(i)
+        dtype = [('link_id', np.int32), ('a_node', np.int32), ('b_node', np.int32), ('direction', np.int8),
+                 ('id', np.int32)] + [(i, np.float64) for i in fields]
+
+        compressed = Graph()
+        compressed.description = self.description
+        compressed.network = self.network
+        compressed.graph = np.zeros(links, dtype=dtype)
+        # Link IDs are the positions, so paths found in the compressed graph can be expanded
+        compressed.graph['link_id'] = np.arange(links)
+        compressed.graph['a_node'] = a_nodes
+        compressed.graph['b_node'] = b_nodes
+        compressed.graph['direction'] = 1
+        compressed.graph['id'] = np.arange(links)
+        compressed.cost = np.add.reduceat(self.cost[chain_links], starts) if links > 0 else np.zeros(0)
+        compressed.skims = np.add.reduceat(self.skims[chain_links, :], starts, axis=0) if links > 0 else \
+            np.zeros((0, self.skims.shape[1]))
+        compressed.graph[self.cost_field] = compressed.cost
+        for k, i in enumerate(self.skim_fields):
+            compressed.graph[i] = compressed.skims[:, k]
+        compressed.cost_field = self.cost_field
+        compressed.skim_fields = self.skim_fields
+
+        compressed.num_links = links
+        compressed.num_nodes = self.num_nodes
+        compressed.build_forward_star()
+        compressed.ids = compressed.graph['id']
+        compressed.b_node = compressed.graph['b_node']
+        compressed.chains = chains
+        compressed.chain_links = chain_links
+        compressed.original_links = self.num_links
+
+        compressed.node_ids = self.node_ids
+        compressed.renumbered_centroids = self.renumbered_centroids
+        compressed.centroids = self.centroids
+        compressed.block_centroid_flows = self.block_centroid_flows
+        compressed.penalty_through_centroids = self.penalty_through_centroids
+        compressed.heap_type = self.heap_type
+        compressed.status = 'OK'
+        compressed.network_ok = True
+        compressed.type_loaded = 'COMPRESSED'
+        compressed.__source__ = self.__source__
+        return compressed
+
+    # Link loads of the original graph (same layout as AssignmentResults.link_loads or class_link_loads) from the link
+    # loads of this compressed graph. Links that are not part of any link of the compressed graph get no load
+    def expand_link_loads(self, link_loads):
+        if self.chains is None:
+            raise ValueError('Graph is not compressed')
+        expanded = np.zeros((self.original_links + 1,) + link_loads.shape[1:], link_loads.dtype)
+        expanded[self.chain_links] = np.repeat(link_loads[:self.num_links], np.diff(self.chains), axis=0)
+        return expanded
+
+    # Links of the original graph (positions) in a path given by links of this compressed graph (positions, which are
+    # also the link IDs of the compressed graph, as in PathResults.path)
+    def expand_path(self, links):
+        if self.chains is None:
+            raise ValueError('Graph is not compressed')
+        return np.hstack([self.chain_links[self.chains[i]:self.chains[i + 1]] for i in links] +
+                         [np.zeros(0, np.int32)])
+
+    # External (network) IDs of internal node IDs. The same IDs if the graph was not renumbered
+    def external_nodes(self, nodes):
+        if self.node_ids is None:
+            return np.asarray(nodes)
+        return self.node_ids[nodes]
+
+    # Internal IDs of external (network) node IDs. -1 for nodes that are not in the graph
+    def internal_nodes(self, nodes):
+        nodes = np.asarray(nodes)
+        if self.node_ids is None:
+            return nodes
+        return _lookup(self.node_ids, nodes)
 
     # We set which are the fields that are going to be minimized in this file
     def set_graph(self, centroids=None, cost_field=None, skim_fields=False, block_centroid_flows=False):
@@ -445,29 +503,35 @@ class Graph:
         :type skim_fields: list of fields for skims
         """
         if centroids is not None:
+            if self.node_ids is not None and centroids > self.renumbered_centroids:
+                raise ValueError('Nodes were renumbered for ' + str(self.renumbered_centroids) + ' centroids. ' +
+                                 'Renumber them again for ' + str(centroids))
             self.centroids = centroids
         self.block_centroid_flows = block_centroid_flows
 
         if cost_field is not None:
             self.cost_field = cost_field
+            self.clear_landmarks()
+            self.contraction_hierarchy = None
             if self.graph[cost_field].dtype == np.float64:
                 self.cost = self.graph[cost_field]
             else:
                 print 'Cost field with wrong type. Converting to float64'
                 self.cost = self.graph[cost_field].astype(np.float64)
 
-        skim_fields = []
         if self.cost is not None:
             if not skim_fields:
                 skim_fields = [self.cost_field, self.cost_field]
             else:
                 s = [self.cost_field]
                 for i in skim_fields:
-                    s.append(i)
+                    if i != self.cost_field:
+                        s.append(i)
                 skim_fields = s
         else:
             if skim_fields:
                 print 'Before setting skims, you need to set the cost field'
+            skim_fields = []
 
         t = False
         for i in skim_fields:
@@ -486,7 +550,8 @@ class Graph:
         self.skim_fields = skim_fields
 
     # Procedure to pickle graph and save to disk
-    def save_to_disk(self, filename):
+    # Saves the graph in the binary format of graph_file.py (pickle=True writes the format used before it)
+    def save_to_disk(self, filename, pickle=False):
         mygraph = {}
         mygraph['description'] = self.description
         mygraph['num_links'] = self.num_links
@@ -498,16 +563,39 @@ class Graph:
         mygraph['cost'] = self.cost
         mygraph['skims'] = self.skims
         mygraph['ids'] = self.ids
+        mygraph['cost_field'] = self.cost_field
+        mygraph['skim_fields'] = self.skim_fields
+        mygraph['landmarks'] = self.landmarks
+        mygraph['from_landmarks'] = self.from_landmarks
+        mygraph['to_landmarks'] = self.to_landmarks
+        if self.contraction_hierarchy is not None:
+            mygraph['contraction_hierarchy'] = self.contraction_hierarchy.to_dict()
+        else:
+            mygraph['contraction_hierarchy'] = None
         mygraph['block_centroid_flows'] = self.block_centroid_flows
+        mygraph['heap_type'] = self.heap_type
         mygraph['centroids'] = self.centroids
+        mygraph['node_ids'] = self.node_ids
+        mygraph['renumbered_centroids'] = self.renumbered_centroids
+        mygraph['chains'] = self.chains
+        mygraph['chain_links'] = self.chain_links
+        mygraph['original_links'] = self.original_links
         mygraph['status'] = self.status
         mygraph['network_ok'] = self.network_ok
         mygraph['type_loaded'] = self.type_loaded
 
-        cPickle.dump(mygraph, open(filename, 'wb'))
+        if pickle:
+            cPickle.dump(mygraph, open(filename, 'wb'))
+        else:
+            write_graph_file(filename, mygraph)
 
+    # Arrays of graphs in the binary format are memory-mapped (copy-on-write) instead of read. Pickled graphs are
+    # still read
     def load_from_disk(self, filename):
-        mygraph = cPickle.load(open(filename, 'rb'))
+        if is_graph_file(filename):
+            mygraph = read_graph_file(filename)
+        else:
+            mygraph = cPickle.load(open(filename, 'rb'))
         self.description = mygraph['description']
         self.num_links = mygraph['num_links']
         self.num_nodes = mygraph['num_nodes']
@@ -518,13 +606,102 @@ class Graph:
         self.cost = mygraph['cost']
         self.skims = mygraph['skims']
         self.ids = mygraph['ids']
+        self.cost_field = mygraph.get('cost_field', False)
+        self.skim_fields = mygraph.get('skim_fields', False)
+        if 'landmarks' in mygraph:
+            self.landmarks = mygraph['landmarks']
+            self.from_landmarks = mygraph['from_landmarks']
+            self.to_landmarks = mygraph['to_landmarks']
+        if mygraph.get('contraction_hierarchy') is not None:
+            self.contraction_hierarchy = ContractionHierarchy.from_dict(mygraph['contraction_hierarchy'])
         self.block_centroid_flows = mygraph['block_centroid_flows']
+        if 'heap_type' in mygraph:
+            self.heap_type = mygraph['heap_type']
         self.centroids = mygraph['centroids']
+        self.node_ids = mygraph.get('node_ids')
+        self.renumbered_centroids = mygraph.get('renumbered_centroids', 0)
+        self.chains = mygraph.get('chains')
+        self.chain_links = mygraph.get('chain_links')
+        self.original_links = mygraph.get('original_links', -1)
         self.status = mygraph['status']
         self.network_ok = mygraph['network_ok']
         self.type_loaded = mygraph['type_loaded']
         del mygraph
 
+    # Builds the forward star from the current graph, which needs to be sorted by a_node. The links leaving node n
+    # are fs[n]:fs[n + 1] (an empty range for nodes without links, including IDs not used in the network)
+    def build_forward_star(self):
+        self.fs = np.zeros(self.num_nodes + 2, dtype=np.int32)
+        self.fs[1:] = np.cumsum(np.bincount(self.graph['a_node'], minlength=self.num_nodes + 1))
+
+    # Builds the backward star (links sorted by b_node) from the current graph
+    def build_backward_star(self):
+        self.bs_links = np.argsort(self.b_node, kind='mergesort').astype(np.int32)
+        self.bs = np.zeros(self.num_nodes + 2, dtype=np.int32)
+        self.bs[1:] = np.cumsum(np.bincount(self.b_node, minlength=self.num_nodes + 1))
+
+    # Chooses landmarks (farthest-node heuristic) and computes the costs to and from them for the current cost
+    # field, so point-to-point paths can be computed with A*. Needs to be redone if the cost changes
+    def set_landmarks(self, num_landmarks=8):
+        from AoN import landmark_distances
+
+        if self.cost is None:
+            raise ValueError('Before setting landmarks, you need to set the cost field')
+
+        self.build_backward_star()
+        nodes = self.num_nodes + 1
+        landmarks = []
+        from_landmarks = []
+        to_landmarks = []
+
+        # Nodes that have links
+        candidates = np.zeros(nodes, np.bool_)
+        candidates[self.graph['a_node']] = True
+        candidates[self.b_node] = True
+
+        # The first landmark is the farthest node from an arbitrary one
+        seed = self.graph['a_node'][0]
+        from_seed = np.zeros(nodes, np.float64)
+        to_seed = np.zeros(nodes, np.float64)
+        landmark_distances(seed, self, from_seed, to_seed)
+        separation = np.where(candidates & (from_seed < np.inf), from_seed, -1)
+
+        for i in range(min(num_landmarks, np.sum(candidates))):
+            new_landmark = int(np.argmax(separation))
+            if separation[new_landmark] < 0:
+                break
+            from_landmark = np.zeros(nodes, np.float64)
+            to_landmark = np.zeros(nodes, np.float64)
+            landmark_distances(new_landmark, self, from_landmark, to_landmark)
+
+            landmarks.append(new_landmark)
+            from_landmarks.append(from_landmark)
+            to_landmarks.append(to_landmark)
+
+            # Next one is the node farthest away from all landmarks so far
+            reachable = candidates & (from_landmark < np.inf)
+            if i == 0:
+                separation = np.where(reachable, from_landmark, -1)
+            else:
+                separation = np.where(reachable, np.minimum(separation, from_landmark), separation)
+            separation[landmarks] = -1
+
+        self.landmarks = np.array(landmarks, np.int32)
+        self.from_landmarks = np.vstack(from_landmarks)
+        self.to_landmarks = np.vstack(to_landmarks)
+
+    # Builds the contraction hierarchy for the current cost and skims, so skims between all zones can be computed
+    # with contraction_hierarchy_skims. Needs to be redone if the cost, skims or centroids change
+    def prepare_contraction_hierarchy(self):
+        hierarchy = ContractionHierarchy()
+        hierarchy.build(self)
+        self.contraction_hierarchy = hierarchy
+
+    def clear_landmarks(self):
+        self.landmarks = None
+        self.from_landmarks = None
+        self.to_landmarks = None
+
     # We return the list of the fields that are the same for both directions to their initial states
     def reset_single_fields(self):
         self.required_default_fields = ['link_id', 'a_node', 'b_node', 'direction', 'length']
@@ -564,6 +741,10 @@ class Graph:
         if np.max(self.network['direction']) > 1 or np.min(self.network['direction']) < -1:
             self.status = '"direction" field not limited to (-1,0,1) values'
 
+            # Node IDs index the forward star
+        if min(np.min(self.network['a_node']), np.min(self.network['b_node'])) < 0:
+            self.status = 'Node IDs need to be zero or positive'
+
     # Needed for when we load the graph directly
     def __graph_error_checking__(self):
         # Checking field names
@@ -595,29 +776,68 @@ class Graph:
         if np.max(self.graph['id']) > self.graph['id'].shape[0]-1:
             self.status = '"id" field needs to start in 0 and go to number of links - 1'
 
-    def __determine_types__(self, new_type, current_type):
-
-        if new_type.isdigit():
-            new_type = int(new_type)
-        else:
-            try:
-                new_type = float(new_type)
-            except:
-                pass
-        nt = type(new_type)
-        def_type = None
-        if nt == int or nt == int:
-            def_type = long
-            if current_type == float:
-                def_type == float
-            elif current_type == str:
-                def_type = str
-        elif nt == float:
-            def_type = float
-            if current_type == str:
-                def_type = str
-        elif nt == str:
-            def_type = str
-        else:
-            raise ValueError('WRONG TYPE OR NULL VALUE')
-        return def_type
\ No newline at end of file
+        if min(np.min(self.graph['a_node']), np.min(self.graph['b_node'])) < 0:
+            self.status = 'Node IDs need to be zero or positive'
+
+    # Types of the fields read from CSV files: the ones given, int32 for the node and link fields and float64 for all
+    # others (a type found from the first rows could silently truncate the values further down the file)
+    def __csv_types__(self, netw, dtypes, extra_fields=[]):
+        integers = ['link_id', 'a_node', 'b_node', 'direction'] + extra_fields
+        types = dict((x, np.int32 if x in integers else np.float64) for x in csv_titles(netw))
+        if dtypes is not None:
+            types.update(dict((str(k).lower(), v) for k, v in dtypes.items()))
+        return types
+
+
+# Order in which a breadth-first traversal of the network (links in both directions) visits the nodes that are not
+# fixed. Each component starts from its lowest degree node and, with by_degree, the neighbors of each node are
+# visited from the lowest degree up (Cuthill-McKee). The traversal goes one level at a time, so it is vectorized
+def _traversal_order(a_nodes, b_nodes, nodes, fixed, by_degree):
+    tails = np.hstack((a_nodes, b_nodes))
+    heads = np.hstack((b_nodes, a_nodes))
+    keep = ~(fixed[tails] | fixed[heads])
+    tails = tails[keep]
+    heads = heads[keep]
+    neighbors = heads[np.argsort(tails, kind='mergesort')]
+    degree = np.bincount(tails, minlength=nodes)
+    star = np.zeros(nodes + 1, np.int64)
+    star[1:] = np.cumsum(degree)
+
+    visited = fixed.copy()
+    starts = np.argsort(degree, kind='mergesort')
+    order = []
+    s = 0
+    while True:
+        while s < nodes and visited[starts[s]]:
+            s += 1
+        if s == nodes:
+            break
+        level = starts[s:s + 1]
+        visited[level] = True
+        while level.shape[0] > 0:
+            order.append(level)
+            counts = degree[level]
+            total = int(np.sum(counts))
+            firsts = np.cumsum(counts) - counts
+            positions = np.repeat(star[level] - firsts, counts) + np.arange(total)
+            parents = np.repeat(np.arange(level.shape[0]), counts)
+            candidates = neighbors[positions]
+            new = ~visited[candidates]
+            candidates = candidates[new]
+            if by_degree:
+                candidates = candidates[np.lexsort((degree[candidates], parents[new]))]
+            _, first = np.unique(candidates, return_index=True)
+            level = candidates[np.sort(first)]
+            visited[level] = True
+    if not order:
+        return np.zeros(0, np.int32)
+    return np.hstack(order).astype(np.int32)
+
+
+# Position of each value in keys (-1 if not there)
+def _lookup(keys, values):
+    if keys.shape[0] == 0:
+        return np.zeros(values.shape, np.int32) - 1
+    sorter = np.argsort(keys, kind='mergesort')
+    positions = sorter[np.searchsorted(keys, values, sorter=sorter).clip(0, keys.shape[0] - 1)]
+    return np.where(keys[positions] == values, positions, -1).astype(np.int32)
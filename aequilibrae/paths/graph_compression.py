@@ -0,0 +1,107 @@
+"""
+ -----------------------------------------------------------------------------------------------------------
+ Package:    AequilibraE
+
+ Name:       Graph compression
+ Purpose:    Collapses chains of degree-2 nodes of a graph into single links
+
+ Original Author:  Pedro Camargo (c@margo.co)
+ Contributors:
+ Last edited by: Pedro Camargo
+
+ Website:    www.AequilibraE.com
+ Repository:  https://github.com/AequilibraE/AequilibraE
+
+ Created:    2026-10-18
+ Updated:
+ Copyright:   (c) AequilibraE authors
+ Licence:     See LICENSE.TXT
+ -----------------------------------------------------------------------------------------------------------
+
+ Networks digitised from GIS layers have many nodes that only join two link segments (shape points, changes of
+ attributes). A node can be bypassed when it is not a centroid, it is connected to exactly two other nodes and all
+ traffic that enters it from one of them has to leave to the other: the same number of links in and out, no
+ parallel links and no loops. Each chain of links through such nodes becomes a single link of the compressed graph,
+ with the sum of their costs and skims, so shortest paths (and therefore all-or-nothing loads) are the same.
+
+ Chains that are closed loops of degree-2 nodes can not be used by any path between other nodes and are dropped,
+ as are chains that start and end at the same node.
+ """
+
+import numpy as np
+
+
+def degree_two_nodes(a_nodes, b_nodes, nodes, centroids):
+    """Nodes that can be bypassed (boolean array indexed by node)"""
+    links_out = np.bincount(a_nodes, minlength=nodes)
+    links_in = np.bincount(b_nodes, minlength=nodes)
+
+    # Number of different nodes each node is connected to
+    pairs = np.unique(np.hstack((a_nodes, b_nodes)).astype(np.int64) * nodes + np.hstack((b_nodes, a_nodes)))
+    neighbors = np.bincount(pairs // nodes, minlength=nodes)
+
+    bypass = (neighbors == 2) & (links_in == links_out) & (links_out > 0)
+    bypass[:centroids + 1] = False
+
+    # Parallel links and loops
+    keys = a_nodes.astype(np.int64) * nodes + b_nodes
+    unique_keys, counts = np.unique(keys, return_counts=True)
+    parallel = unique_keys[counts > 1]
+    bypass[parallel // nodes] = False
+    bypass[parallel % nodes] = False
+    bypass[a_nodes[a_nodes == b_nodes]] = False
+    return bypass
+
+
+def degree_two_chains(a_nodes, b_nodes, fs, centroids):
+    """Chains of links (graph positions) between nodes that can not be bypassed. The graph needs to be sorted by
+    a_node (fs is its forward star). Returns the first and last node of each chain, sorted by them, and the chains in
+    CSR format: the links of chain i are chain_links[chains[i]:chains[i + 1]], in the order they are traversed"""
+    nodes = fs.shape[0] - 1
+    bypass = degree_two_nodes(a_nodes, b_nodes, nodes, centroids)
+
+    # The link that follows each link into a node that is bypassed: its only link out or, if it has two, the one that
+    # does not go back
+    following = np.zeros(a_nodes.shape[0], np.int64) - 1
+    into = np.nonzero(bypass[b_nodes])[0]
+    first_out = fs[b_nodes[into]]
+    turns_back = b_nodes[first_out] == a_nodes[into]
+    following[into] = np.where(turns_back, first_out + 1, first_out)
+
+    # All chains are walked together, one link at a time
+    current = np.nonzero(~bypass[a_nodes])[0]
+    chain = np.arange(current.shape[0])
+    chain_of = [chain]
+    links = [current]
+    while current.shape[0] > 0:
+        going_on = following[current] >= 0
+        chain = chain[going_on]
+        current = following[current[going_on]]
+        chain_of.append(chain)
+        links.append(current)
+    chain_of = np.hstack(chain_of)
+    links = np.hstack(links)
+
+    order = np.argsort(chain_of, kind='mergesort')
+    chain_of = chain_of[order]
+    links = links[order]
+    sizes = np.bincount(chain_of)
+    last_links = links[np.cumsum(sizes) - 1]
+    first_nodes = a_nodes[links[np.cumsum(sizes) - sizes]]
+    last_nodes = b_nodes[last_links]
+
+    # Chains that come back to where they started are of no use
+    keep = first_nodes != last_nodes
+    new_order = np.lexsort((last_nodes[keep], first_nodes[keep]))
+    kept = np.nonzero(keep)[0][new_order]
+    new_chain = np.zeros(sizes.shape[0], np.int64) - 1
+    new_chain[kept] = np.arange(kept.shape[0])
+
+    in_use = new_chain[chain_of] >= 0
+    chain_of = new_chain[chain_of[in_use]]
+    links = links[in_use]
+    order = np.argsort(chain_of, kind='mergesort')
+    chain_links = links[order].astype(np.int32)
+    chains = np.zeros(kept.shape[0] + 1, np.int64)
+    chains[1:] = np.cumsum(np.bincount(chain_of, minlength=kept.shape[0]))
+    return first_nodes[kept], last_nodes[kept], chains, chain_links
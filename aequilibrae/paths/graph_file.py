@@ -0,0 +1,138 @@
+"""
+ -----------------------------------------------------------------------------------------------------------
+ Package:    AequilibraE
+
+ Name:       Graph file
+ Purpose:    Binary format for graphs saved to disk, opened with memory maps
+
+ Original Author:  Pedro Camargo (c@margo.co)
+ Contributors:
+ Last edited by: Pedro Camargo
+
+ Website:    www.AequilibraE.com
+ Repository:  https://github.com/AequilibraE/AequilibraE
+
+ Created:    2026-10-18
+ Updated:
+ Copyright:   (c) AequilibraE authors
+ Licence:     See LICENSE.TXT
+ -----------------------------------------------------------------------------------------------------------
+
+ The file has a JSON header followed by the arrays, each one contiguous and aligned to 64 bytes:
+
+        MAGIC | format (uint32) | header size (uint32) | header (JSON) | array | array | ...
+
+ The header has the values that are not arrays and, for each array, its position, type and shape (arrays are
+ replaced by {"__block__": name} in the values). Reading maps the arrays copy-on-write (np.memmap mode 'c'), so
+ nothing is read until it is used and processes that open the same file share the pages in the cache.
+ """
+
+import os
+import json
+import tempfile
+import numpy as np
+
+MAGIC = 'AEQGRAPH'
+FORMAT = 1
+ALIGNMENT = 64
+
+
+def is_graph_file(file_name):
+    with open(file_name, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def write_graph_file(file_name, values):
+    """values: dictionary (can be nested) with the arrays and the other (JSON) values of the graph"""
+    blocks = []
+    header = {'format': FORMAT, 'blocks': {}, 'values': _split(values, '', blocks)}
+
+    offset = 0
+    offsets = {}
+    for name, array in blocks:
+        offset = _align(offset)
+        offsets[name] = offset
+        header['blocks'][name] = {'offset': offset, 'dtype': repr(np.lib.format.dtype_to_descr(array.dtype)),
+                                  'shape': list(array.shape)}
+        offset += array.nbytes
+    header = json.dumps(header)
+    start = _align(len(MAGIC) + 8 + len(header))
+
+    # Written to another file first, so a graph loaded from this file (memory-mapped) can be saved over it
+    folder = os.path.dirname(os.path.abspath(file_name))
+    handle, temp_name = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            f.write(MAGIC)
+            f.write(np.array([FORMAT, len(header)], np.uint32).tostring())
+            f.write(header)
+            for name, array in blocks:
+                f.seek(start + offsets[name])
+                np.ascontiguousarray(array).tofile(f)
+            f.truncate(start + _align(offset))
+
+        # mkstemp creates files only the user can read
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temp_name, 0666 & ~umask)
+        if os.name == 'nt' and os.path.isfile(file_name):
+            os.remove(file_name)
+        os.rename(temp_name, file_name)
+    except:
+        if os.path.isfile(temp_name):
+            os.remove(temp_name)
+        raise
+
+
+def read_graph_file(file_name):
+    """The values saved by write_graph_file, with the arrays mapped to the file"""
+    with open(file_name, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(file_name + ' is not a graph file')
+        file_format, size = np.fromstring(f.read(8), np.uint32)
+        if file_format > FORMAT:
+            raise ValueError('Graph file format ' + str(file_format) + ' is newer than this version of AequilibraE')
+        header = json.loads(f.read(int(size)))
+    start = _align(len(MAGIC) + 8 + int(size))
+
+    arrays = {}
+    for name, block in header['blocks'].items():
+        dtype = np.dtype(np.lib.format.safe_eval(block['dtype']))
+        shape = tuple(block['shape'])
+        if np.prod(shape) == 0:
+            arrays[name] = np.zeros(shape, dtype)
+        else:
+            arrays[name] = np.memmap(file_name, dtype=dtype, mode='c', offset=start + block['offset'], shape=shape)
+    return _join(header['values'], arrays)
+
+
+def _align(position):
+    return (position + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+# Replaces the arrays in values by references to the blocks (added to blocks)
+def _split(values, prefix, blocks):
+    if isinstance(values, dict):
+        return dict((str(k), _split(v, prefix + str(k) + '.', blocks)) for k, v in values.items())
+    if isinstance(values, np.ndarray):
+        if values.dtype.hasobject:
+            raise ValueError('Arrays of Python objects cannot be saved in a graph file (' + prefix[:-1] + ')')
+        blocks.append((prefix[:-1], values))
+        return {'__block__': prefix[:-1]}
+    if isinstance(values, (list, tuple)):
+        return [_split(v, prefix + str(i) + '.', blocks) for i, v in enumerate(values)]
+    if isinstance(values, np.generic):
+        return values.item()
+    return values
+
+
+def _join(values, arrays):
+    if isinstance(values, dict):
+        if '__block__' in values:
+            return arrays[values['__block__']]
+        return dict((str(k), _join(v, arrays)) for k, v in values.items())
+    if isinstance(values, list):
+        return [_join(v, arrays) for v in values]
+    if isinstance(values, unicode):
+        return values.encode('utf-8')
+    return values
@@ -0,0 +1,252 @@
+"""
+ -----------------------------------------------------------------------------------------------------------
+ Package:    AequilibraE
+
+ Name:       Multi-process all-or-nothing assignment
+ Purpose:    Loads the origins of a matrix in worker processes that share the graph and results through files
+
+ Original Author:  Pedro Camargo (c@margo.co)
+ Contributors:
+ Last edited by: Pedro Camargo
+
+ Website:    www.AequilibraE.com
+ Repository:  https://github.com/AequilibraE/AequilibraE
+
+ Created:    2026-10-18
+ Updated:
+ Copyright:   (c) AequilibraE authors
+ Licence:     See LICENSE.TXT
+ -----------------------------------------------------------------------------------------------------------
+
+ For when AoN was compiled without OpenMP, so threads spend most of their time waiting for the GIL.
+ prepare copies the arrays of the graph one_to_all needs and the outputs (skims, paths without a path and one row
+ of link loads per worker) to memory-mapped files in a temporary folder, and starts the worker processes. Each
+ worker opens these files once, so nothing but the list of origins goes to the workers with each task. The demand
+ matrix is copied to these files before each assignment (only its non-zero entries, for sparse matrices). Each
+ worker loads its share of the origins with one_to_all and the link loads are added up at the end.
+
+ The pool is kept until close() is called, so iterative procedures only copy the link costs (and skims) before each
+ all-or-nothing:
+
+        aux_res = MultiProcessAoN()
+        aux_res.prepare(graph, results, processes=4)
+        all_or_nothing(matrix, graph, results, aux_res=aux_res)
+        aux_res.close()
+ """
+
+import sys
+sys.dont_write_bytecode = True
+
+import os
+import shutil
+import tempfile
+import multiprocessing as mp
+import numpy as np
+
+from multi_threaded_aon import MultiThreadedAoN
+from demand import is_sparse, as_csr, origin_totals, sparse_row
+
+no_binaries = False
+try:
+    from AoN import one_to_all
+except:
+    no_binaries = True
+
+# What each worker process opened in _start_worker
+_worker = {}
+
+
+class _SharedData:
+    # Holds the attributes of a Graph/AssignmentResults that one_to_all uses
+    def __init__(self, attributes):
+        for key, value in attributes.items():
+            setattr(self, key, value)
+
+
+class MultiProcessAoN:
+    def __init__(self):
+        self.processes = None
+        self.folder = None  # Temporary folder with the memory-mapped arrays
+        self.pool = None
+        self.graph_id = None
+        self.classes = 1  # User classes in the matrices (see all_or_nothing)
+
+        # Memory-mapped arrays shared with the workers
+        self.cost = None
+        self.skims = None  # Skims of the graph (one column per skim field)
+        self.matrix = None  # DIMENSION: zones x zones x classes (only created for dense matrices)
+        self.result_skims = None
+        self.no_path = None
+        self.link_loads = None  # One row per task. DIMENSION: processes x links x classes
+
+    def prepare(self, graph, results, processes=None, classes=1):
+        if no_binaries:
+            raise ValueError('Multi-process assignment needs the compiled AoN module')
+        if results.__graph_id__ != graph.__id__:
+            raise ValueError('The results object was not prepared for this graph. Use results.prepare(graph)')
+        if results.critical_links['save']:
+            raise ValueError('Select link analysis is not available for multi-process assignment')
+        if results.path_file['save']:
+            raise ValueError('The path file is not available for multi-process assignment')
+
+        self.close()
+        if processes is None:
+            processes = results.cores
+        self.processes = processes
+        self.classes = classes
+        self.graph_id = graph.__id__
+        self.folder = tempfile.mkdtemp(prefix='aequilibrae_')
+
+        shared_graph = {'fs': self.__share('fs', graph.fs),
+                        'b_node': self.__share('b_node', graph.b_node),
+                        'ids': self.__share('ids', graph.ids),
+                        'cost': self.__share('cost', graph.cost),
+                        'skims': self.__share('skims', graph.skims),
+                        'num_nodes': graph.num_nodes,
+                        'centroids': graph.centroids,
+                        'block_centroid_flows': graph.block_centroid_flows,
+                        'heap_type': graph.heap_type,
+                        '__version__': graph.__version__,
+                        '__id__': graph.__id__}
+
+        shared_results = {'skims': self.__share('result_skims', results.skims),
+                          'no_path': self.__share('no_path', results.no_path),
+                          'nodes': results.nodes,
+                          'zones': results.zones,
+                          'links': results.links,
+                          'num_skims': results.num_skims,
+                          'classes': classes,
+                          '__graph_id__': results.__graph_id__}
+
+        shared = {'link_loads': self.__share('link_loads', np.zeros((processes, results.links, classes), np.float64))}
+
+        self.cost = _open_shared(shared_graph['cost'])
+        self.skims = _open_shared(shared_graph['skims'])
+        self.result_skims = _open_shared(shared_results['skims'])
+        self.no_path = _open_shared(shared_results['no_path'])
+        self.link_loads = _open_shared(shared['link_loads'])
+
+        self.pool = mp.Pool(processes, initializer=_start_worker, initargs=(shared_graph, shared_results, shared))
+
+    def execute(self, matrix, graph, results, early_exit=None):
+        """Loads all origins with demand in matrix and returns the problems found (see one_to_all)"""
+        if self.pool is None:
+            raise ValueError('Worker processes not started. Use prepare(graph, results)')
+        if graph.__id__ != self.graph_id or results.__graph_id__ != self.graph_id:
+            raise ValueError('The worker processes were prepared for a different graph')
+        if matrix.shape[1] > results.zones:
+            return ['Matrix has more zones than the graph']
+        sparse = is_sparse(matrix)
+        if sparse:
+            matrix = as_csr(matrix)
+        elif matrix.ndim == 2:
+            matrix = matrix[:, :, np.newaxis]
+        if (1 if sparse else matrix.shape[2]) != self.classes:
+            raise ValueError('The worker processes were prepared for ' + str(self.classes) + ' user classes')
+
+        report = []
+        origins = []
+        for O in np.nonzero(origin_totals(matrix) > 0)[0]:
+            if O >= results.zones:
+                report.append("Centroid " + str(O) + " is outside the range of zones in the graph")
+            else:
+                origins.append(O)
+
+        # The costs change between iterations of equilibrium assignment, the network does not
+        self.cost[:] = graph.cost
+        self.skims[:, :] = graph.skims
+        if sparse:
+            demand = ('sparse', [self.__share(name, getattr(matrix, name)) for name in ['indptr', 'indices', 'data']])
+        else:
+            if self.matrix is None:
+                shape = (results.zones, results.zones, self.classes)
+                self.matrix = _open_shared(self.__share('matrix', np.zeros(shape, np.float64)))
+            rows = min(matrix.shape[0], results.zones)
+            self.matrix.fill(0)
+            self.matrix[:rows, :matrix.shape[1], :] = matrix[:rows, :, :]
+            self.matrix.flush()
+            demand = ('dense', (self.matrix.filename, self.matrix.dtype.str, self.matrix.shape))
+        self.link_loads.fill(0)
+
+        tasks = [(i, origins[i::self.processes], early_exit, demand) for i in range(self.processes)]
+        for errors in self.pool.map(_load_origins, tasks, chunksize=1):
+            report.extend(errors)
+
+        loads = np.sum(self.link_loads, axis=0)
+        results.link_loads = np.sum(loads, axis=1)
+        results.class_link_loads = loads if self.classes > 1 else None
+        results.skims[origins, :, :] = self.result_skims[origins, :, :]
+        results.no_path[origins, :] = self.no_path[origins, :]
+        return report
+
+    def close(self):
+        """Stops the worker processes and deletes the shared files"""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+        # The memory maps need to be closed before the files can be deleted (on Windows)
+        self.cost = self.skims = self.matrix = self.result_skims = self.no_path = self.link_loads = None
+        if self.folder is not None:
+            shutil.rmtree(self.folder, ignore_errors=True)
+            self.folder = None
+
+    def __share(self, name, array):
+        file_name = os.path.join(self.folder, name + '.aem')
+        shared = np.memmap(file_name, dtype=array.dtype, mode='w+', shape=array.shape)
+        shared[:] = array[:]
+        shared.flush()
+        del shared
+        return file_name, array.dtype.str, array.shape
+
+
+def _open_shared(description):
+    file_name, dtype, shape = description
+    return np.memmap(file_name, dtype=np.dtype(dtype), mode='r+', shape=shape)
+
+
+def _start_worker(shared_graph, shared_results, shared):
+    graph = dict(shared_graph)
+    for key in ['fs', 'b_node', 'ids', 'cost', 'skims']:
+        graph[key] = _open_shared(graph[key])
+    graph = _SharedData(graph)
+
+    results = dict(shared_results)
+    results['skims'] = _open_shared(results['skims'])
+    results['no_path'] = _open_shared(results['no_path'])
+    results['path_file'] = {'save': False, 'results': None}
+    results['critical_links'] = {'save': False, 'queries': {}, 'results': {}}
+    results['link_extraction'] = {'save': False, 'queries': {}, 'output': None}
+    results['cores'] = 1
+    results = _SharedData(results)
+
+    aux_res = MultiThreadedAoN()
+    aux_res.prepare(graph, results, results.classes)
+
+    _worker['graph'] = graph
+    _worker['results'] = results
+    _worker['aux_res'] = aux_res
+    _worker['link_loads'] = _open_shared(shared['link_loads'])
+
+
+def _load_origins(task):
+    i, origins, early_exit, demand = task
+    graph, results, aux_res = _worker['graph'], _worker['results'], _worker['aux_res']
+
+    # The demand changes between tasks, so it is opened every time
+    sparse = demand[0] == 'sparse'
+    if sparse:
+        matrix = _SharedData(dict((name, _open_shared(d)) for name, d in zip(['indptr', 'indices', 'data'], demand[1])))
+    else:
+        matrix = _open_shared(demand[1])
+
+    errors = []
+    aux_res.temp_link_loads.fill(0)
+    for O in origins:
+        a = one_to_all(O, sparse_row(matrix, O) if sparse else matrix[O, :, :], graph, results, aux_res, 0,
+                       early_exit)
+        if a != O:
+            errors.append(a)
+    _worker['link_loads'][i, :, :] = aux_res.temp_link_loads[0, :, :]
+    return errors
@@ -9,15 +9,56 @@ class MultiThreadedAoN:
         self.connectors = None  # The previous link for each node in the tree
         self.temp_link_loads = None  # Temporary results for assignment. Necessary for parallelization
         self.temp_node_loads = None  # Temporary nodes for assignment. Necessary for cascading
+        self.classes = 1  # User classes loaded together (last dimension of temp_link_loads and temp_node_loads)
 
         self.temp_b_nodes = None  #  holds the b_nodes in case of flows through centroid connectors are blocked
 
+        # Per-thread workspace for path finding. Allocated only once, so each origin only needs to reset it
+        self.heap_elements = None  # Storage for the heap
+        self.heap_positions = None  # Position of each node in the heap (or its state if not in the heap)
+        self.node_costs = None  # Distance labels for each node
+        self.destination_flags = None  # Centroids that need to be settled when path finding exits early
+        self.connected_centroids = None  # 1 for the centroids with links (the only ones path finding can settle)
+
+        # Select link analysis (one column per query). Only allocated if the results have select link queries
+        self.sl_counts = None  # Number of links of each query on the path to each node
+        self.sl_node_loads = None  # Demand through the links of each query, cascaded to the origin
+        self.sl_link_loads = None  # Select link loads of each link
+        self.sl_od = None  # Demand of each destination of the current origin that goes through each query
+
+        # Used to schedule the origins of the next all-or-nothing assignment
+        self.settled = None  # Number of nodes settled in the last tree built from each origin (0 if never built)
+        self.thread_report = None  # What each thread did in the last one (see assignment.all_or_nothing)
+
     # In case we want to do by hand, we can prepare each method individually
-    def prepare(self, graph, results):
-        self.predecessors = np.zeros((results.nodes, results.cores), dtype=np.int32)
-        self.temporary_skims = np.zeros((results.nodes, results.num_skims, results.cores), dtype=np.float64)
-        self.reached_first = np.zeros((results.nodes, results.cores), dtype=np.int32)
-        self.connectors = np.zeros((results.nodes, results.cores), dtype=np.int32)
-        self.temp_link_loads = np.zeros((results.links, results.cores), dtype=np.float64)
-        self.temp_node_loads = np.zeros((results.nodes, results.cores), dtype=np.float64)
-        self.temp_b_nodes = graph.b_node.copy()
\ No newline at end of file
+    def prepare(self, graph, results, classes=1):
+        self.classes = classes
+        # All buffers have one contiguous block per thread (first dimension), so threads never write to the same
+        # cache lines
+        self.predecessors = np.zeros((results.cores, results.nodes), dtype=np.int32)
+        self.temporary_skims = np.zeros((results.cores, results.nodes, results.num_skims), dtype=np.float64)
+        self.reached_first = np.zeros((results.cores, results.nodes), dtype=np.int32)
+        self.connectors = np.zeros((results.cores, results.nodes), dtype=np.int32)
+        self.temp_link_loads = np.zeros((results.cores, results.links, classes), dtype=np.float64)
+        self.temp_node_loads = np.zeros((results.cores, results.nodes, classes), dtype=np.float64)
+        self.temp_b_nodes = np.zeros((results.cores, graph.b_node.shape[0]), dtype=np.int32)
+        self.temp_b_nodes[:, :] = graph.b_node[:]
+
+        self.heap_elements = np.zeros((results.cores, results.nodes), dtype=np.int32)
+        self.heap_positions = np.zeros((results.cores, results.nodes), dtype=np.int32)
+        self.node_costs = np.zeros((results.cores, results.nodes), dtype=np.float64)
+        self.destination_flags = np.zeros((results.cores, results.zones), dtype=np.int32)
+        links_at = np.bincount(graph.b_node, minlength=results.zones)[:results.zones]
+        links_at += np.diff(graph.fs[:results.zones + 1])
+        self.connected_centroids = (links_at > 0).astype(np.int32)
+        self.connected_centroids[0] = 0
+        self.settled = np.zeros(results.zones, dtype=np.int32)
+
+        nodes, links, zones, queries = 1, 1, 1, 0
+        if results.critical_links['save']:
+            nodes, links, zones = results.nodes, results.links, results.zones
+            queries = results.critical_links['sizes'].shape[0]
+        self.sl_counts = np.zeros((results.cores, nodes, queries), dtype=np.int32)
+        self.sl_node_loads = np.zeros((results.cores, nodes, queries), dtype=np.float64)
+        self.sl_link_loads = np.zeros((results.cores, links, queries), dtype=np.float64)
+        self.sl_od = np.zeros((results.cores, zones, queries), dtype=np.float64)
@@ -14,5 +14,27 @@ cdef ITYPE_t NULL_IDX = -9999
 
 cdef double INFINITE = 1.79769313e+308
 
+# Heap engines available for path finding. The d-ary heaps are identified by their arity
+cdef int FIBONACCI_HEAP = 0
+HEAP_TYPES = {'fibonacci': FIBONACCI_HEAP,
+              'binary': 2,
+              'quaternary': 4}
+
+# States of a node in the array-backed heaps (any non-negative value is the position of the node in the heap)
+cdef ITYPE_t NOT_IN_HEAP = -1
+cdef ITYPE_t SCANNED = -2
+
+# Criteria to stop path finding before the whole network is settled (None builds the full tree)
+EARLY_EXIT_MODES = [None, 'demand', 'centroids']
+
+# Values of AssignmentResults.no_path: a path was found, there is no path, or the destination was not settled because
+# path finding stopped early (its skims are left as they were)
+cdef int PATH_FOUND = 0
+cdef int NO_PATH = -1
+cdef int NOT_SETTLED = 1
+
+# Records of the OD pairs found by select link analysis (query is the position of the query in the list)
+SELECT_LINK_TYPE = [('origin', np.int32), ('destination', np.int32), ('query', np.int32), ('flow', np.float64)]
+
 VERSION = "0.3.5"
 SUB_VERSION = '0'
\ No newline at end of file
@@ -0,0 +1,287 @@
+"""
+ -----------------------------------------------------------------------------------------------------------
+ Package:    AequilibraE
+
+ Name:       Point-to-point shortest path
+ Purpose:    Bidirectional Dijkstra and A* (with landmark lower bounds) for single OD path queries
+
+ Original Author:  Pedro Camargo (c@margo.co)
+ Contributors:
+ Last edited by: Pedro Camargo
+
+ Website:    www.AequilibraE.com
+ Repository:  https://github.com/AequilibraE/AequilibraE
+
+ Created:    2026-10-18
+ Updated:
+ Copyright:   (c) AequilibraE authors
+ Licence:     See LICENSE.TXT
+ -----------------------------------------------------------------------------------------------------------
+
+ Both engines keep the rule used by blocking_centroid_flows: centroids (nodes up to graph.centroids) other than
+ the origin and the destination cannot be used as intermediate nodes. They can be reached, but are not expanded.
+
+ The backward search uses the backward star of the graph (Graph.bs / Graph.bs_links), where bs_links holds the
+ position in the forward star of each link ending in a node. Links are always referred to by that position.
+ """
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef int bidirectional_path_finding(int origin,
+                                    int destination,
+                                    int centroids,
+                                    double[:] graph_costs,
+                                    int [:] graph_fs,
+                                    int [:] b_nodes,
+                                    int [:] graph_bs,
+                                    int [:] bs_links,
+                                    int [:] a_nodes,
+                                    int [:] pred,
+                                    int [:] pred_links,
+                                    int [:] succ,
+                                    int [:] succ_links,
+                                    int [::1] forward_elements,
+                                    int [::1] forward_positions,
+                                    double [::1] forward_costs,
+                                    int [::1] backward_elements,
+                                    int [::1] backward_positions,
+                                    double [::1] backward_costs) nogil:
+    # Returns the node where the shortest forward and backward half-paths meet (-1 if there is no path).
+    # pred/pred_links hold the forward tree and succ/succ_links the backward tree
+    cdef unsigned int M = pred.shape[0]
+    cdef int i, j, k, v, w
+    cdef int meeting = -1
+    cdef DTYPE_t new_cost
+    cdef DTYPE_t best = INFINITE
+
+    cdef DAryHeap forward
+    cdef DAryHeap backward
+
+    for i in range(M):
+        pred[i] = -1
+        pred_links[i] = -1
+        succ[i] = -1
+        succ_links[i] = -1
+
+    if origin == destination:
+        return origin
+
+    dary_initialize(&forward, <ITYPE_t*> &forward_elements[0], <ITYPE_t*> &forward_positions[0],
+                    &forward_costs[0], M, 4)
+    dary_initialize(&backward, <ITYPE_t*> &backward_elements[0], <ITYPE_t*> &backward_positions[0],
+                    &backward_costs[0], M, 4)
+    dary_push(&forward, origin, 0)
+    dary_push(&backward, destination, 0)
+
+    while forward.size > 0 and backward.size > 0:
+        # No better meeting point can be found anymore
+        if forward_costs[forward.elements[0]] + backward_costs[backward.elements[0]] >= best:
+            break
+
+        # We always grow the smallest frontier
+        if forward.size <= backward.size:
+            v = dary_pop(&forward)
+            if v <= centroids and v != origin:
+                continue
+
+            for j in range(graph_fs[v], graph_fs[v + 1]):
+                w = b_nodes[j]
+                if forward_positions[w] == SCANNED:
+                    continue
+
+                new_cost = forward_costs[v] + graph_costs[j]
+                if forward_positions[w] == NOT_IN_HEAP:
+                    dary_push(&forward, w, new_cost)
+                elif forward_costs[w] > new_cost:
+                    dary_decrease_key(&forward, w, new_cost)
+                else:
+                    continue
+                pred[w] = v
+                pred_links[w] = j
+
+                if backward_positions[w] != NOT_IN_HEAP and (w > centroids or w == origin or w == destination):
+                    if forward_costs[w] + backward_costs[w] < best:
+                        best = forward_costs[w] + backward_costs[w]
+                        meeting = w
+        else:
+            v = dary_pop(&backward)
+            if v <= centroids and v != destination:
+                continue
+
+            for k in range(graph_bs[v], graph_bs[v + 1]):
+                j = bs_links[k]
+                w = a_nodes[j]
+                if backward_positions[w] == SCANNED:
+                    continue
+
+                new_cost = backward_costs[v] + graph_costs[j]
+                if backward_positions[w] == NOT_IN_HEAP:
+                    dary_push(&backward, w, new_cost)
+                elif backward_costs[w] > new_cost:
+                    dary_decrease_key(&backward, w, new_cost)
+                else:
+                    continue
+                succ[w] = v
+                succ_links[w] = j
+
+                if forward_positions[w] != NOT_IN_HEAP and (w > centroids or w == origin or w == destination):
+                    if forward_costs[w] + backward_costs[w] < best:
+                        best = forward_costs[w] + backward_costs[w]
+                        meeting = w
+
+    return meeting
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef DTYPE_t landmark_bound(int node,
+                            int destination,
+                            double[:, :] from_landmarks,
+                            double[:, :] to_landmarks) nogil:
+    # Lower bound for the cost from node to destination given by the triangle inequality on each landmark
+    cdef int l
+    cdef DTYPE_t bound = 0
+    cdef unsigned int landmarks = from_landmarks.shape[0]
+
+    for l in range(landmarks):
+        if from_landmarks[l, destination] < INFINITE and from_landmarks[l, node] < INFINITE:
+            if from_landmarks[l, destination] - from_landmarks[l, node] > bound:
+                bound = from_landmarks[l, destination] - from_landmarks[l, node]
+        if to_landmarks[l, node] < INFINITE and to_landmarks[l, destination] < INFINITE:
+            if to_landmarks[l, node] - to_landmarks[l, destination] > bound:
+                bound = to_landmarks[l, node] - to_landmarks[l, destination]
+    return bound
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef int astar_path_finding(int origin,
+                            int destination,
+                            int centroids,
+                            double[:] graph_costs,
+                            int [:] graph_fs,
+                            int [:] b_nodes,
+                            double[:, :] from_landmarks,
+                            double[:, :] to_landmarks,
+                            int [:] pred,
+                            int [:] pred_links,
+                            int [::1] heap_elements,
+                            int [::1] heap_positions,
+                            double [::1] node_costs) nogil:
+    # A* search with landmark (ALT) potentials. Running Dijkstra on the reduced costs
+    # c(v, w) - h(v) + h(w) is the same as A*, and the reduced costs are not negative because the bounds are
+    # consistent. Returns the destination if it was reached and -1 otherwise
+    cdef unsigned int M = pred.shape[0]
+    cdef int i, j, v, w
+    cdef DTYPE_t new_cost, bound_v
+
+    cdef DAryHeap heap
+
+    for i in range(M):
+        pred[i] = -1
+        pred_links[i] = -1
+
+    dary_initialize(&heap, <ITYPE_t*> &heap_elements[0], <ITYPE_t*> &heap_positions[0], &node_costs[0], M, 4)
+    dary_push(&heap, origin, 0)
+
+    while heap.size > 0:
+        v = dary_pop(&heap)
+        if v == destination:
+            return destination
+        if v <= centroids and v != origin:
+            continue
+
+        bound_v = landmark_bound(v, destination, from_landmarks, to_landmarks)
+        for j in range(graph_fs[v], graph_fs[v + 1]):
+            w = b_nodes[j]
+            if heap_positions[w] == SCANNED:
+                continue
+
+            new_cost = node_costs[v] + graph_costs[j] - bound_v + landmark_bound(w, destination, from_landmarks,
+                                                                                to_landmarks)
+            if heap_positions[w] == NOT_IN_HEAP:
+                dary_push(&heap, w, new_cost)
+            elif node_costs[w] > new_cost:
+                dary_decrease_key(&heap, w, new_cost)
+            else:
+                continue
+            pred[w] = v
+            pred_links[w] = j
+
+    return -1
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef void star_distances(int source,
+                         double[:] graph_costs,
+                         int [:] star,
+                         int [:] star_links,
+                         int [:] heads,
+                         int [::1] heap_elements,
+                         int [::1] heap_positions,
+                         double [::1] node_costs) nogil:
+    # Plain Dijkstra over a forward or backward star, with no centroid blocking. node_costs ends up with the
+    # distance to every node (INFINITE if not reached)
+    cdef unsigned int M = node_costs.shape[0]
+    cdef int j, k, v, w
+    cdef DTYPE_t new_cost
+
+    cdef DAryHeap heap
+
+    dary_initialize(&heap, <ITYPE_t*> &heap_elements[0], <ITYPE_t*> &heap_positions[0], &node_costs[0], M, 4)
+    dary_push(&heap, source, 0)
+
+    while heap.size > 0:
+        v = dary_pop(&heap)
+        for k in range(star[v], star[v + 1]):
+            j = star_links[k]
+            w = heads[j]
+            if heap_positions[w] == SCANNED:
+                continue
+
+            new_cost = node_costs[v] + graph_costs[j]
+            if heap_positions[w] == NOT_IN_HEAP:
+                dary_push(&heap, w, new_cost)
+            elif node_costs[w] > new_cost:
+                dary_decrease_key(&heap, w, new_cost)
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+def landmark_distances(landmark, graph, from_landmark, to_landmark):
+    """Computes the costs from a landmark to all nodes (from_landmark) and from all nodes to it (to_landmark).
+    Nodes not connected to the landmark get np.inf"""
+    cdef int L = landmark
+    cdef int nodes = graph.num_nodes + 1
+
+    forward_links = np.arange(graph.num_links, dtype=np.int32)
+    heap_elements = np.zeros(nodes, np.int32)
+    heap_positions = np.zeros(nodes, np.int32)
+
+    cdef double [:] g_view = graph.cost
+    cdef int [:] graph_fs_view = graph.fs
+    cdef int [:] forward_links_view = forward_links
+    cdef int [:] b_nodes_view = graph.b_node
+    cdef int [:] graph_bs_view = graph.bs
+    cdef int [:] bs_links_view = graph.bs_links
+    cdef int [:] a_nodes_view = graph.graph['a_node']
+    cdef int [::1] heap_elements_view = heap_elements
+    cdef int [::1] heap_positions_view = heap_positions
+    cdef double [::1] from_view = from_landmark
+    cdef double [::1] to_view = to_landmark
+
+    with nogil:
+        star_distances(L, g_view, graph_fs_view, forward_links_view, b_nodes_view,
+                       heap_elements_view, heap_positions_view, from_view)
+        star_distances(L, g_view, graph_bs_view, bs_links_view, a_nodes_view,
+                       heap_elements_view, heap_positions_view, to_view)
+
+    # Nodes not connected to the landmark
+    from_landmark[from_landmark >= INFINITE] = np.inf
+    to_landmark[to_landmark >= INFINITE] = np.inf
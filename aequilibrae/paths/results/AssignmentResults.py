@@ -1,36 +1,42 @@
 import multiprocessing as mp
 import numpy as np
 import warnings
-import sqlite3
 import sys
 import os
+import cPickle
+import hashlib
 from memory_mapped_files_handling import saveDataFileDictionary
+from path_file import PathFile
+from output_writers import link_flows_table, skims_table, skim_names, chunks, write_csv, write_sqlite, write_binary
+from ..demand import is_sparse, as_csr
 
 
 class AssignmentResults:
     def __init__(self):
         """
         @type graph: Set of numpy arrays to store Computation results
-        self.critical={required:{"links":[lnk_id1, lnk_id2, ..., lnk_idn], "path file": False}, results:{}}
         """
         self.link_loads = None       # The actual results for assignment
+        self.class_link_loads = None  # Loads of each user class (links x classes), if the matrix had more than one
         self.skims = None            # The array of skims
-        self.no_path = None          # The list os paths
+        self.no_path = None          # 0 if there is a path, -1 if not, 1 if not computed (early exit in all_or_nothing)
         self.num_skims = None        # number of skims that will be computed. Depends on the setting of the graph provided
+        self.skim_names = []         # Graph fields of the skims
         self.cores = mp.cpu_count()
 
         self.critical_links = {'save': False,
-                               'queries': {},  # Queries are a dictionary
-                               'results': False}
+                               'queries': {},  # Queries are a dictionary (see setCriticalLinks)
+                               'results': {}}
 
         self.link_extraction = {"save": False,
                                 'queries': {},  # Queries are a dictionary
                                 "output": None}
 
         self.path_file = {"save": False,
-                          "results": None}
+                          "results": None}  # PathFile being written
 
         self.nodes = -1
+        self.node_ids = None         # External ID of each node, if the graph nodes were renumbered
         self.zones = -1
         self.links = -1
         self.__graph_id__ = None
@@ -38,15 +44,23 @@ class AssignmentResults:
         self.lids = None
         self.direcs = None
 
+        # State of a converged equilibrium assignment, so a similar scenario can start from it. Filled by the
+        # equilibrium procedures and saved/loaded with save_warm_start/load_warm_start
+        self.warm_start = None
+
         # We set the critical analysis, link extraction and path file saving to False
 
     # In case we want to do by hand, we can prepare each method individually
     def prepare(self, graph):
 
         self.nodes = graph.num_nodes + 1
+        self.node_ids = graph.node_ids
         self.zones = graph.centroids + 1
         self.links = graph.num_links + 1
         self.num_skims = graph.skims.shape[1]
+        self.skim_names = list(graph.skim_fields) if graph.skim_fields else []
+        if len(self.skim_names) != self.num_skims:
+            self.skim_names = ['skim_' + str(k + 1) for k in range(self.num_skims)]
 
         self.lids = graph.graph['link_id']
         self.direcs = graph.graph['direction']
@@ -65,6 +79,7 @@ class AssignmentResults:
 
     def __redim(self):
         self.link_loads = np.zeros(self.links, np.float64)
+        self.class_link_loads = None
         self.skims = np.zeros((self.zones, self.zones, self.num_skims), np.float64)
         self.no_path = np.zeros((self.zones, self.zones), dtype=np.int32)
 
@@ -82,39 +97,95 @@ class AssignmentResults:
         else:
             raise ValueError("Number of cores needs to be an integer")
 
-    def setCriticalLinks(self, save=False, queries={}, crit_res_result=None):
-        a = np.zeros((max(1,self.zones), 2, 2), dtype=np.float64)
-        if save:
-            if crit_res_result is None:
-                warnings.warn("Critical Link analysis not set properly. Need to specify output file too")
-            else:
-                if crit_res_result[-3:].lower() != 'aes':
-                    dictio_name = crit_res_result + '.aed'
-                    crit_res_result += '.aes'
-                else:
-                    dictio_name = crit_res_result[:-3] + 'aed'
-
-                if self.nodes > 0 and self.zones > 0:
-                    if ['elements', 'labels', 'type'] in queries.keys():
-                        if len(queries['labels']) == len(queries['elements']) == len(queries['type']):
-                            num_queries = len(queries['labels'])
-                            a = np.memmap(crit_res_result, dtype=np.float64, mode='w+', shape=(self.zones,self.zones, num_queries))
-                            saveDataFileDictionary(self.__graph_id__,'critical link analysis', [int(x) for x in a.shape[:]], dictio_name)
-                        else:
-                            raise ValueError("Queries are inconsistent. 'Labels', 'elements' and 'type' need to have same dimensions")
-                    else:
-                        raise ValueError("Queries are inconsistent. It needs to contain the following elements: 'Labels', 'elements' and 'type'")
-
-        self.critical_links = {'save': save,
-                               'queries': queries,
-                               'results': a
-                               }
+    def setCriticalLinks(self, save=False, queries={}):
+        """Select link analysis
+    Args:
+        save: True to do select link analysis in the next all-or-nothing assignments
+        queries: {'labels': [name of each query],
+                  'elements': [graph positions (graph.ids) of the links of each query],
+                  'type': ['and' (paths through all links of the query) or 'or' (through any of them), ...]}
+
+    After all_or_nothing, critical_links['results'] has the OD pairs whose paths go through each query
+    ({label: array of (origin, destination, flow)}) and critical_links['link_loads'] the loads of those paths on
+    each link (links x queries)"""
+        self.critical_links = {'save': False,
+                               'queries': {},
+                               'results': {},
+                               'link_loads': None,
+                               'od': [],  # OD pairs found for each origin by one_to_all, see gather_critical_links
+                               'link_queries': None,  # Queries of each link as a CSR (pointers, query positions)
+                               'sizes': None,  # Number of links in each query
+                               'types': None}  # 0 for 'and', 1 for 'or'
+        if not save:
+            return
+
+        if self.links < 0:
+            raise ValueError('Results object not prepared. Use --> results.prepare(graph)')
+        for key in ['labels', 'elements', 'type']:
+            if key not in queries:
+                raise ValueError("Queries are inconsistent. It needs to contain the following elements: 'labels', "
+                                 "'elements' and 'type'")
+        if not len(queries['labels']) == len(queries['elements']) == len(queries['type']):
+            raise ValueError("Queries are inconsistent. 'labels', 'elements' and 'type' need to have same dimensions")
+        if len(queries['labels']) == 0:
+            raise ValueError('There are no queries for select link analysis')
+
+        links = []
+        query_ids = []
+        sizes = []
+        for q, elements in enumerate(queries['elements']):
+            elements = np.unique(np.array(elements, dtype=np.int64))
+            if elements.shape[0] == 0:
+                raise ValueError('Query ' + str(queries['labels'][q]) + ' has no links')
+            if elements.min() < 0 or elements.max() >= self.links - 1:
+                raise ValueError('Query ' + str(queries['labels'][q]) + ' has links that are not in the graph')
+            if queries['type'][q] not in ['and', 'or']:
+                raise ValueError("Query types need to be 'and' or 'or'")
+            links.append(elements)
+            query_ids.append(np.zeros(elements.shape[0], np.int32) + q)
+            sizes.append(elements.shape[0])
+
+        links = np.hstack(links)
+        query_ids = np.hstack(query_ids)
+        order = np.argsort(links, kind='mergesort')
+        pointers = np.zeros(self.links + 1, np.int32)
+        pointers[1:] = np.cumsum(np.bincount(links, minlength=self.links))
+
+        self.critical_links['save'] = True
+        self.critical_links['queries'] = queries
+        self.critical_links['link_queries'] = (pointers, query_ids[order].astype(np.int32))
+        self.critical_links['sizes'] = np.array(sizes, np.int32)
+        self.critical_links['types'] = np.array([int(x == 'or') for x in queries['type']], np.int32)
+
+    def gather_critical_links(self, aux_res):
+        """Puts together the select link results of all origins loaded since the last call (see setCriticalLinks)"""
+        od = self.critical_links['od']
+        self.critical_links['od'] = []
+        od = np.hstack(od) if od else None
+
+        results = {}
+        for q, label in enumerate(self.critical_links['queries']['labels']):
+            records = od[od['query'] == q] if od is not None else np.zeros(0)
+            query_od = np.zeros(records.shape[0], dtype=[('origin', np.int32), ('destination', np.int32),
+                                                          ('flow', np.float64)])
+            if records.shape[0] > 0:
+                for field in ['origin', 'destination', 'flow']:
+                    query_od[field] = records[field]
+            results[label] = np.sort(query_od, order=['origin', 'destination'])
+        self.critical_links['results'] = results
+        self.critical_links['link_loads'] = np.sum(aux_res.sl_link_loads, axis=0)
 
     def setSavePathFile(self, save=False, path_result=None):
-        a = np.zeros((max(1,self.zones), 1, 2), dtype=np.int32)
+        """Saves the shortest path trees of the next all-or-nothing assignments to path_result (.aep, see PathFile).
+        The file can be read once the assignment is over, or after path_file['results'].flush()"""
+        if isinstance(self.path_file['results'], PathFile):
+            self.path_file['results'].close()
+
+        a = None
         if save:
             if path_result is None:
                 warnings.warn("Path file not set properly. Need to specify output file too")
+                save = False
             else:
                 if path_result[-3:].lower() != 'aep':
                     dictio_name = path_result + '.aed'
@@ -123,81 +194,132 @@ class AssignmentResults:
                     dictio_name = path_result[:-3] + 'aed'
 
                 if self.nodes > 0 and self.zones > 0:
-                    a = np.memmap(path_result, dtype=np.int32, mode='w+', shape=(self.zones,self.nodes, 2))
-                    saveDataFileDictionary(self.__graph_id__,'path file', [int(x) for x in a.shape[:]], dictio_name)
+                    a = PathFile()
+                    a.create(path_result, self.zones, node_ids=self.node_ids)
+                    saveDataFileDictionary(self.__graph_id__, 'path file', [self.zones, self.nodes], dictio_name)
+                else:
+                    save = False
 
         self.path_file = {'save': save,
                           'results': a
                           }
 
+    def set_warm_start(self, graph, matrix, link_flows, link_costs, origins=None, bushes=None, bush_flows=None,
+                       class_flows=None):
+        """Keeps the state of an equilibrium assignment. Links are identified by ID and direction, so the state can
+        be used with a graph that is not exactly the same (nodes are kept with their external IDs, so also one with
+        the nodes renumbered differently). All link arrays are in the order of the graph. Bushes are lists with one
+        array per origin: the positions of the links of the bush in the graph and the flows of the origin on them"""
+        self.warm_start = {'link_id': graph.graph['link_id'].copy(),
+                           'direction': graph.graph['direction'].copy(),
+                           'a_node': graph.external_nodes(graph.graph['a_node']).copy(),
+                           'b_node': graph.external_nodes(graph.graph['b_node']).copy(),
+                           'demand': self.demand_signature(matrix),
+                           'link_flows': link_flows,
+                           'link_costs': link_costs,
+                           'origins': origins,
+                           'bushes': bushes,
+                           'bush_flows': bush_flows,
+                           'class_flows': class_flows}
+
+    def save_warm_start(self, file_name):
+        if self.warm_start is None:
+            raise ValueError('There is no assignment state to save')
+        cPickle.dump(self.warm_start, open(file_name, 'wb'), cPickle.HIGHEST_PROTOCOL)
+
+    def load_warm_start(self, file_name):
+        self.warm_start = cPickle.load(open(file_name, 'rb'))
+
+    def warm_start_positions(self, graph):
+        """Position in graph of each link in the warm start state (-1 if the link is not there anymore)"""
+        if self.warm_start is None:
+            raise ValueError('There is no assignment state loaded')
+
+        ws = self.warm_start
+        keys = graph.graph['link_id'].astype(np.int64) * 2 + (graph.graph['direction'] > 0)
+        saved_keys = ws['link_id'].astype(np.int64) * 2 + (ws['direction'] > 0)
+
+        order = np.argsort(keys)
+        found = np.searchsorted(keys[order], saved_keys)
+        found[found >= keys.shape[0]] = 0
+        positions = order[found]
+
+        # Same link ID and direction, but a different link
+        a_nodes = graph.external_nodes(graph.graph['a_node'][positions])
+        b_nodes = graph.external_nodes(graph.graph['b_node'][positions])
+        missing = (keys[positions] != saved_keys) | (a_nodes != ws['a_node']) | (b_nodes != ws['b_node'])
+        positions[missing] = -1
+        return positions
+
+    @staticmethod
+    def demand_signature(matrix):
+        if is_sparse(matrix):
+            matrix = as_csr(matrix)
+            signature = hashlib.md5(str(matrix.shape))
+            for array in [matrix.indptr, matrix.indices, matrix.data]:
+                signature.update(np.ascontiguousarray(array).tostring())
+            return signature.hexdigest()
+        return hashlib.md5(np.ascontiguousarray(matrix, dtype=np.float64).tostring()).hexdigest()
+
     def save_to_disk(self, output='loads', output_file_name ='link_flows', file_type='csv'):
         ''' Function to write to disk all outputs computed during assignment
     Args:
-        output: 'loads', for writing the link loads
+        output: 'loads', for writing the link loads (one row per link ID, with the flows of each class if there
+                         were more than one)
+                'skims', for writing the skims (one row per OD pair in csv and sqlite, one zones x zones matrix
+                         per skim in binary)
                 'path_file', for writing the path file to a format different than the native binary
 
         output_file_name: Name of the file, with extension
 
         file_type: 'csv', for comma-separated files
                    'sqlite' for sqlite databases
+                   'binary' for NumPy .npz files (one array per column), not available for the path file
     Returns:
         Nothing'''
-        if output == 'loads':
-            dt = [('Link ID', np.int), ('AB Flow', np.float), ('BA Flow', np.float), ('Tot Flow', np.float)]
-            res = np.zeros(np.max(self.lids) + 1, dtype=dt)
-
-            res['Link ID'][:] = np.arange(np.max(self.lids) + 1)[:]
-
-            # Indices of links BA and AB
-            ABs = self.direcs < 0
-            BAs = self.direcs > 0
+        if file_type not in ['csv', 'sqlite', 'binary']:
+            raise ValueError("File type needs to be 'csv', 'sqlite' or 'binary'")
 
-            link_flows = self.link_loads[:-1]
-
-            # AB Flows
-            link_ids = self.lids[ABs]
-            res['AB Flow'][link_ids] = link_flows[ABs]
-
-            # BA Flows
-            link_ids = self.lids[BAs]
-            res['BA Flow'][link_ids] = link_flows[BAs]
-
-            # Tot Flow
-            res['Tot Flow'] = res['AB Flow'] + res['BA Flow']
-
-            # Save to disk
+        if output == 'loads':
+            table = link_flows_table(self.lids, self.direcs, self.link_loads, self.class_link_loads)
             if file_type == 'csv':
-                np.savetxt(output_file_name, res, fmt="%d "+",%1.10f"*3, header='Link_ID,AB Flow,BA Flow,Tot Flow')
-
-            if file_type == 'sqlite':
-            # Connecting to the database file
-                conn = sqlite3.connect(output_file_name)
-                c = conn.cursor()
-            # Creating the flows table
-                c.execute('''DROP TABLE IF EXISTS link_flows''')
-                c.execute('''CREATE TABLE link_flows (link_id INTEGER PRIMARY KEY, ab_flow REAL, ba_flow REAL, tot_flow REAL)''')
+                write_csv(chunks(table), output_file_name, float_format='%.10f')
+            elif file_type == 'sqlite':
+                write_sqlite(chunks(table), output_file_name, 'link_flows', primary_key='link_id')
+            else:
+                write_binary(dict((name, table[name]) for name in table.dtype.names), output_file_name)
 
-                c.executemany('INSERT INTO link_flows VALUES (?,?,?,?)', res)
-                conn.commit()
-                conn.close()
+        elif output == 'skims':
+            if file_type == 'csv':
+                write_csv(skims_table(self.skims, self.skim_names), output_file_name)
+            elif file_type == 'sqlite':
+                write_sqlite(skims_table(self.skims, self.skim_names), output_file_name, 'skims')
+            else:
+                names = skim_names(self.skim_names)
+                write_binary(dict((name, self.skims[:, :, k]) for k, name in enumerate(names)), output_file_name)
 
         elif output == 'path_file':
-            conn = sqlite3.connect(output_file_name)
-            c = conn.cursor()
-
-            # Creating the flows table
-            c.execute('''DROP TABLE IF EXISTS path_file''')
-            c.execute('''CREATE TABLE path_file (origin_zone INTEGER, node INTEGER, predecessor INTEGER)''')
-
-            path_file = path_file = self.path_file['results']
-            for i in range(self.zones):
-                data = np.zeros((self.nodes, 3), np.int64)
-                data[:,0].fill(i)
-                data[:,1] = path_file[i,:,0]
-                data[:,2] = path_file[i,:,1]
-                c.executemany('''INSERT INTO path_file VALUES(?, ?, ?)''', data)
-
-            conn.commit()
-            conn.close()
-
+            if not self.path_file['save']:
+                raise ValueError('No path file was saved. Use setSavePathFile before the assignment')
+            if file_type != 'sqlite':
+                raise ValueError('The path file can only be converted to sqlite')
+            self.path_file['results'].flush()
+            paths = PathFile()
+            paths.open(self.path_file['results'].file_name)
+            write_sqlite(self.__path_file_table(paths), output_file_name, 'path_file')
+            paths.close()
 
+        else:
+            raise ValueError("Output needs to be 'loads', 'skims' or 'path_file'")
+
+    def __path_file_table(self, paths):
+        # Only the nodes reached from each origin
+        dtype = [('origin_zone', np.int64), ('node', np.int64), ('predecessor', np.int64), ('link', np.int64)]
+        for i in range(self.zones):
+            nodes, predecessors, links = paths.tree(i)
+            table = np.zeros(nodes.shape[0], dtype=dtype)
+            table['origin_zone'] = i
+            table['node'] = nodes
+            table['predecessor'] = predecessors
+            table['link'] = links
+            yield table
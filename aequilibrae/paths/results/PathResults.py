@@ -17,6 +17,18 @@ class PathResults:
         self.path_nodes = None
         self.milepost = None
         self.reached_first = None
+        self.heap_elements = None
+        self.heap_positions = None
+        self.node_costs = None
+        self.temp_b_nodes = None
+
+        # Workspace for the point-to-point searches
+        self.predecessor_links = None  # Position in the graph of the link used to reach each node
+        self.successors = None  # Next node towards the destination (backward search)
+        self.successor_links = None  # Position in the graph of the link leaving each node (backward search)
+        self.backward_heap_elements = None
+        self.backward_heap_positions = None
+        self.backward_node_costs = None
 
         self.links = -1
         self.nodes = -1
@@ -35,6 +47,17 @@ class PathResults:
         self.connectors = np.zeros(self.nodes, dtype=np.int32)
         self.reached_first = np.zeros(self.nodes, dtype=np.int32)
         self.temporary_skims = np.zeros((self.nodes, self.num_skims), np.float64)
+        self.heap_elements = np.zeros(self.nodes, dtype=np.int32)
+        self.heap_positions = np.zeros(self.nodes, dtype=np.int32)
+        self.node_costs = np.zeros(self.nodes, np.float64)
+        self.temp_b_nodes = graph.b_node.copy()
+
+        self.predecessor_links = np.zeros(self.nodes, dtype=np.int32)
+        self.successors = np.zeros(self.nodes, dtype=np.int32)
+        self.successor_links = np.zeros(self.nodes, dtype=np.int32)
+        self.backward_heap_elements = np.zeros(self.nodes, dtype=np.int32)
+        self.backward_heap_positions = np.zeros(self.nodes, dtype=np.int32)
+        self.backward_node_costs = np.zeros(self.nodes, np.float64)
         self.__graph_id__ = graph.__id__
 
     def reset(self):
@@ -13,4 +13,5 @@ __date__ = "$Date: 2016-07-02$"
 
 from AssignmentResults import AssignmentResults
 from PathResults import PathResults
+from path_file import PathFile
 from memory_mapped_files_handling import saveDataFileDictionary
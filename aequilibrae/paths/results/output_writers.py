@@ -0,0 +1,133 @@
+"""
+ -----------------------------------------------------------------------------------------------------------
+ Package:    AequilibraE
+
+ Name:       Output writers
+ Purpose:    Writes assignment outputs (link flows and skims) to CSV, SQLite and NumPy binary files in bulk
+
+ Original Author:  Pedro Camargo (c@margo.co)
+ Contributors:
+ Last edited by: Pedro Camargo
+
+ Website:    www.AequilibraE.com
+ Repository:  https://github.com/AequilibraE/AequilibraE
+
+ Created:    2026-10-18
+ Updated:
+ Copyright:   (c) AequilibraE authors
+ Licence:     See LICENSE.TXT
+ -----------------------------------------------------------------------------------------------------------
+
+ Tables are structured arrays that come in chunks (any iterable of them), so tables larger than memory (e.g. the
+ skims of a large model in long format) can be written as they are built:
+    - CSV: each chunk is formatted with a single string operation (one format repeated for all rows)
+    - SQLite: a single transaction, with the rollback journal in memory and no syncing to disk, and one executemany
+      per chunk
+    - Binary: one array per column (or per skim) in a NumPy .npz file, which np.load reads without parsing
+ """
+
+import sqlite3
+import itertools
+import numpy as np
+
+CHUNK_SIZE = 200000
+
+
+def link_flows_table(link_ids, directions, link_loads, class_link_loads=None):
+    """One row per link ID in the graph, with the flows in each direction (direction 1 is AB and -1 is BA)"""
+    ids, position = np.unique(link_ids, return_inverse=True)
+    loads = [link_loads[:link_ids.shape[0]]]
+    names = ['']
+    if class_link_loads is not None:
+        for k in range(class_link_loads.shape[1]):
+            loads.append(class_link_loads[:link_ids.shape[0], k])
+            names.append('_class_' + str(k + 1))
+
+    dtype = [('link_id', np.int64)]
+    for name in names:
+        dtype.extend([('ab_flow' + name, np.float64), ('ba_flow' + name, np.float64), ('tot_flow' + name, np.float64)])
+    table = np.zeros(ids.shape[0], dtype=dtype)
+    table['link_id'] = ids
+
+    ABs = directions > 0
+    BAs = directions < 0
+    for name, flows in zip(names, loads):
+        table['ab_flow' + name][position[ABs]] = flows[ABs]
+        table['ba_flow' + name][position[BAs]] = flows[BAs]
+        table['tot_flow' + name] = table['ab_flow' + name] + table['ba_flow' + name]
+    return table
+
+
+def skim_names(names):
+    """Column names for the skims (the graph repeats the cost field when there are no other skims)"""
+    columns = []
+    for name in names:
+        column = str(name)
+        k = 1
+        while column in columns or column in ['origin', 'destination']:
+            k += 1
+            column = str(name) + '_' + str(k)
+        columns.append(column)
+    return columns
+
+
+def skims_table(skims, names, chunk_size=CHUNK_SIZE):
+    """Skims (zones x zones x skims) in long format (origin, destination, one column per skim), in chunks"""
+    zones = skims.shape[0]
+    names = skim_names(names)
+    dtype = [('origin', np.int64), ('destination', np.int64)] + [(name, np.float64) for name in names]
+    rows = max(1, chunk_size // max(1, zones))
+    for first in range(0, zones, rows):
+        last = min(zones, first + rows)
+        table = np.zeros((last - first) * zones, dtype=dtype)
+        table['origin'] = np.repeat(np.arange(first, last), zones)
+        table['destination'] = np.tile(np.arange(zones), last - first)
+        for k, name in enumerate(names):
+            table[name] = skims[first:last, :, k].flatten()
+        yield table
+
+
+def chunks(table, chunk_size=CHUNK_SIZE):
+    for first in range(0, table.shape[0], chunk_size):
+        yield table[first:first + chunk_size]
+
+
+def write_csv(tables, file_name, float_format='%.10g'):
+    with open(file_name, 'w') as f:
+        fmt = None
+        for table in tables:
+            if fmt is None:
+                f.write(','.join(table.dtype.names) + '\n')
+                fmt = ','.join(['%d' if table.dtype[k].kind in 'iub' else float_format
+                                for k in range(len(table.dtype))]) + '\n'
+            if table.shape[0] > 0:
+                f.write((fmt * table.shape[0]) % tuple(itertools.chain.from_iterable(table.tolist())))
+
+
+def write_sqlite(tables, file_name, table_name, primary_key=None):
+    conn = sqlite3.connect(file_name)
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute('PRAGMA journal_mode=MEMORY')
+    c = conn.cursor()
+
+    insert = None
+    for table in tables:
+        if insert is None:
+            fields = []
+            for k, name in enumerate(table.dtype.names):
+                field = name + (' INTEGER' if table.dtype[k].kind in 'iub' else ' REAL')
+                if name == primary_key:
+                    field += ' PRIMARY KEY'
+                fields.append(field)
+            c.execute('DROP TABLE IF EXISTS ' + table_name)
+            c.execute('CREATE TABLE ' + table_name + ' (' + ', '.join(fields) + ')')
+            insert = 'INSERT INTO ' + table_name + ' VALUES (' + ', '.join(['?'] * len(fields)) + ')'
+        c.executemany(insert, table.tolist())
+    conn.commit()
+    conn.close()
+
+
+def write_binary(columns, file_name):
+    """columns: {name: array}. Each one is stored as an array of its own (np.load(file_name)[name])"""
+    with open(file_name, 'wb') as f:
+        np.savez(f, **columns)
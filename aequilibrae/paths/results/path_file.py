@@ -0,0 +1,227 @@
+"""
+ -----------------------------------------------------------------------------------------------------------
+ Package:    AequilibraE
+
+ Name:       Path file
+ Purpose:    Compressed storage of the shortest path trees built during assignment
+
+ Original Author:  Pedro Camargo (c@margo.co)
+ Contributors:
+ Last edited by: Pedro Camargo
+
+ Website:    www.AequilibraE.com
+ Repository:  https://github.com/AequilibraE/AequilibraE
+
+ Created:    2026-10-18
+ Updated:
+ Copyright:   (c) AequilibraE authors
+ Licence:     See LICENSE.TXT
+ -----------------------------------------------------------------------------------------------------------
+
+ Only the part of each tree that was reached is stored: node, predecessor and link (graph position, as in
+ graph.ids) of each node in the order they were settled, compressed with zlib origin by origin. The compressed
+ trees are written one after the other by a thread of their own, so the threads doing assignment only hand the
+ arrays over. The external ID of each node (graph.node_ids, if the graph nodes were renumbered) and the index
+ (offset, compressed size and nodes of each origin) go at the end of the file:
+
+        MAGIC | tree | tree | ... | node IDs (int32) | index (zones x 3 int64) | index offset (int64) | zones (int64)
+              | node IDs offset (int64) | node IDs (int64) | MAGIC
+
+ Trees are stored with the node IDs of the graph and read with the external ones.
+
+ Reading a path decompresses only the tree of its origin:
+
+        paths = PathFile()
+        paths.open('path_file.aep')
+        nodes, links = paths.path(origin, destination)
+ """
+
+import os
+import zlib
+import threading
+import Queue
+import numpy as np
+
+MAGIC = 'AEQPATH1'
+FOOTER = 32 + len(MAGIC)
+
+
+class PathFile:
+    def __init__(self):
+        self.file_name = None
+        self.mode = None
+        self.zones = 0
+        self.index = None  # offset, compressed size and nodes of the tree of each origin (-1 if not there)
+        self.node_ids = None  # External ID of each node of the graph (None if they are the same)
+        self.level = 1  # zlib compression level
+
+        self.__file = None
+        self.__end = len(MAGIC)  # Where the next tree goes
+        self.__queue = None
+        self.__writer = None
+        self.__error = None
+        self.__tree = None  # Last tree read: origin, position of each node in it, nodes, predecessors, links
+        self.__sorter = None  # Order of node_ids, to find the graph ID of external IDs
+
+    def create(self, file_name, zones, level=1, max_pending=256, node_ids=None):
+        """Opens a new path file for writing. max_pending trees can wait to be written before put() blocks.
+        node_ids: external ID of each node of the graph (graph.node_ids)"""
+        self.close()
+        self.file_name = file_name
+        self.mode = 'w'
+        self.zones = zones
+        self.level = level
+        self.node_ids = None if node_ids is None else np.asarray(node_ids, np.int32)
+        self.index = np.zeros((zones, 3), np.int64) - 1
+
+        self.__file = open(file_name, 'w+b')
+        self.__file.write(MAGIC)
+        self.__end = len(MAGIC)
+        self.__error = None
+        self.__queue = Queue.Queue(max_pending)
+        self.__writer = threading.Thread(target=self.__write_trees)
+        self.__writer.daemon = True
+        self.__writer.start()
+        self.flush()
+
+    def put(self, origin, nodes, predecessors, links):
+        """Queues the tree of origin to be written. Thread safe. The arrays are not copied"""
+        if self.mode != 'w':
+            raise ValueError('Path file not open for writing. Use create(file_name, zones)')
+        if self.__error is not None:
+            raise self.__error
+        self.__queue.put((origin, nodes, predecessors, links))
+
+    def reset(self):
+        """Drops all trees written so far (e.g. before a new assignment)"""
+        self.flush()
+        self.index.fill(-1)
+        self.__end = len(MAGIC)
+        self.flush()
+
+    def flush(self):
+        """Waits for the queued trees and writes the index, so the file can be read"""
+        if self.mode != 'w':
+            return
+        self.__queue.join()
+        if self.__error is not None:
+            raise self.__error
+        node_ids = np.zeros(0, np.int32) if self.node_ids is None else self.node_ids
+        self.__file.seek(self.__end)
+        self.__file.write(node_ids.tostring())
+        index_offset = self.__end + node_ids.nbytes
+        self.__file.write(self.index.astype(np.int64).tostring())
+        self.__file.write(np.array([index_offset, self.zones, self.__end, node_ids.shape[0]], np.int64).tostring())
+        self.__file.write(MAGIC)
+        self.__file.truncate()
+        self.__file.flush()
+
+    def close(self):
+        if self.mode == 'w':
+            self.flush()
+            self.__queue.put(None)
+            self.__writer.join()
+        if self.__file is not None:
+            self.__file.close()
+        self.__file = None
+        self.__writer = None
+        self.__queue = None
+        self.__tree = None
+        self.__sorter = None
+        self.mode = None
+
+    def open(self, file_name):
+        """Opens a path file for reading"""
+        self.close()
+        self.file_name = file_name
+        self.__file = open(file_name, 'rb')
+        if self.__file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(file_name + ' is not a path file')
+        self.__file.seek(-FOOTER, os.SEEK_END)
+        offset, zones, ids_offset, ids = np.fromstring(self.__file.read(32), np.int64)
+        if self.__file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(file_name + ' is incomplete. It was not flushed/closed after it was written')
+        self.__file.seek(offset)
+        self.index = np.fromstring(self.__file.read(int(zones) * 24), np.int64).reshape(int(zones), 3)
+        self.zones = int(zones)
+        self.node_ids = None
+        if ids > 0:
+            self.__file.seek(ids_offset)
+            self.node_ids = np.fromstring(self.__file.read(int(ids) * 4), np.int32)
+            self.__sorter = np.argsort(self.node_ids, kind='mergesort')
+        self.mode = 'r'
+
+    def tree(self, origin):
+        """Nodes reached from origin (in the order they were settled), their predecessors and the links to them"""
+        if self.mode != 'r':
+            raise ValueError('Path file not open for reading. Use open(file_name)')
+        if origin < 0 or origin >= self.zones:
+            raise ValueError('Origin ' + str(origin) + ' is outside the range of zones in the path file')
+        if self.__tree is None or self.__tree[0] != origin:
+            self.__read_tree(origin)
+        nodes, predecessors, links = self.__tree[2:]
+        return self.__external(nodes), self.__external(predecessors), links
+
+    def path(self, origin, destination):
+        """Nodes (external IDs) and links of the path from origin to destination. None if destination was not
+        reached"""
+        self.tree(origin)
+        position, nodes, predecessors, links = self.__tree[1:]
+        if destination == origin:
+            return np.array([origin], np.int32), np.zeros(0, np.int32)
+        destination = self.__internal(destination)
+        if destination < 0 or destination >= position.shape[0] or position[destination] < 0:
+            return None
+
+        path_nodes = [destination]
+        path_links = []
+        p = position[destination]
+        while p >= 0:
+            path_links.append(links[p])
+            path_nodes.append(predecessors[p])
+            p = position[predecessors[p]] if predecessors[p] < position.shape[0] else -1
+        return self.__external(np.array(path_nodes[::-1], np.int32)), np.array(path_links[::-1], np.int32)
+
+    def __read_tree(self, origin):
+        offset, size, nodes = self.index[origin, :]
+        if offset < 0:
+            tree = np.zeros((3, 0), np.int32)
+        else:
+            self.__file.seek(offset)
+            tree = np.fromstring(zlib.decompress(self.__file.read(size)), np.int32).reshape(3, nodes)
+
+        position = np.zeros(int(np.max(tree[0, :])) + 1 if nodes > 0 else 0, np.int32) - 1
+        position[tree[0, :]] = np.arange(tree.shape[1])
+        self.__tree = (origin, position, tree[0, :], tree[1, :], tree[2, :])
+
+    def __external(self, nodes):
+        if self.node_ids is None:
+            return nodes
+        return self.node_ids[nodes]
+
+    def __internal(self, node):
+        if self.node_ids is None:
+            return node
+        k = np.searchsorted(self.node_ids, node, sorter=self.__sorter)
+        if k < self.node_ids.shape[0] and self.node_ids[self.__sorter[k]] == node:
+            return int(self.__sorter[k])
+        return -1
+
+    def __write_trees(self):
+        while True:
+            item = self.__queue.get()
+            try:
+                if item is None:
+                    return
+                if self.__error is None:
+                    origin, nodes, predecessors, links = item
+                    tree = np.vstack((nodes, predecessors, links)).astype(np.int32)
+                    data = zlib.compress(tree.tostring(), self.level)
+                    self.__file.seek(self.__end)
+                    self.__file.write(data)
+                    self.index[origin, :] = [self.__end, len(data), tree.shape[1]]
+                    self.__end += len(data)
+            except Exception as e:
+                self.__error = e
+            finally:
+                self.__queue.task_done()
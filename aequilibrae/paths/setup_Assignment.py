@@ -37,11 +37,20 @@ import Cython.Compiler.Options
 Cython.Compiler.Options.annotate = True
 
 
+# OpenMP is what makes all_to_all and the volume-delay functions run in parallel. Apple's compiler does not come
+# with it, so the module is built without it there (everything still works, in a single thread)
+if sys.platform == 'win32':
+    openmp_args = ['/openmp']
+elif sys.platform == 'darwin':
+    openmp_args = []
+else:
+    openmp_args = ['-fopenmp']
+
 ext_module = Extension(
     'AoN',
     ["AoN.pyx"],
-    #extra_compile_args=['/fopenmp'],
-    #extra_link_args=['/fopenmp'],
+    extra_compile_args=openmp_args,
+    extra_link_args=openmp_args if sys.platform != 'win32' else [],
     include_dirs=[np.get_include()])
 
 
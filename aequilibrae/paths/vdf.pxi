@@ -0,0 +1,202 @@
+"""
+ -----------------------------------------------------------------------------------------------------------
+ Package:    AequilibraE
+
+ Name:       Volume-delay functions
+ Purpose:    Link costs (and their derivatives) as a function of link flows
+
+ Original Author:  Pedro Camargo (c@margo.co)
+ Contributors:
+ Last edited by: Pedro Camargo
+
+ Website:    www.AequilibraE.com
+ Repository:  https://github.com/AequilibraE/AequilibraE
+
+ Created:    2026-10-18
+ Updated:
+ Copyright:   (c) AequilibraE authors
+ Licence:     See LICENSE.TXT
+ -----------------------------------------------------------------------------------------------------------
+
+ All array functions write their results in the first array, release the GIL and split the links among cores
+ threads. Nothing is allocated, so they can be called at every iteration of an equilibrium assignment.
+ The single link versions (link_cost and link_derivative) are used by the procedures that update costs as they move
+ flows around (e.g. bush-based assignment).
+
+    BPR:      t = t0 * (1 + alpha * (v/c) ^ beta)
+    Conical:  t = t0 * (2 + sqrt(alpha^2 * (1 - v/c)^2 + b^2) - alpha * (1 - v/c) - b), with b = (2 alpha - 1) / (2 alpha - 2)
+              (Spiess, 1990). Only defined for alpha > 1 (checked by VDF.prepare). beta is not used
+    Akcelik:  t = t0 + 0.25 * beta * ((v/c - 1) + sqrt((v/c - 1)^2 + 8 * alpha * (v/c) / (c * beta)))
+              alpha is the delay parameter (J) and beta the duration of the analysis period (T), in the same units as
+              the free-flow time (Akcelik, 1991)
+ """
+
+from cython.parallel import prange
+from libc.math cimport pow, sqrt
+
+# Position of each function in VDF_FUNCTIONS
+cdef int BPR = 0
+cdef int CONICAL = 1
+cdef int AKCELIK = 2
+VDF_FUNCTIONS = ['bpr', 'conical', 'akcelik']
+
+
+@cython.cdivision(True)
+cdef inline double bpr_link(double flow, double capacity, double fftime, double alpha, double beta) nogil:
+    return fftime * (1.0 + alpha * pow(flow / capacity, beta))
+
+
+@cython.cdivision(True)
+cdef inline double delta_bpr_link(double flow, double capacity, double fftime, double alpha, double beta) nogil:
+    return fftime * alpha * beta * pow(flow / capacity, beta - 1.0) / capacity
+
+
+@cython.cdivision(True)
+cdef inline double conical_link(double flow, double capacity, double fftime, double alpha, double beta) nogil:
+    cdef double x = 1.0 - flow / capacity
+    cdef double b = (2.0 * alpha - 1.0) / (2.0 * alpha - 2.0)
+    return fftime * (2.0 + sqrt(alpha * alpha * x * x + b * b) - alpha * x - b)
+
+
+@cython.cdivision(True)
+cdef inline double delta_conical_link(double flow, double capacity, double fftime, double alpha, double beta) nogil:
+    cdef double x = 1.0 - flow / capacity
+    cdef double b = (2.0 * alpha - 1.0) / (2.0 * alpha - 2.0)
+    return fftime * (alpha - alpha * alpha * x / sqrt(alpha * alpha * x * x + b * b)) / capacity
+
+
+@cython.cdivision(True)
+cdef inline double akcelik_link(double flow, double capacity, double fftime, double alpha, double beta) nogil:
+    cdef double x = flow / capacity
+    return fftime + 0.25 * beta * ((x - 1.0) + sqrt((x - 1.0) * (x - 1.0) + 8.0 * alpha * x / (capacity * beta)))
+
+
+@cython.cdivision(True)
+cdef inline double delta_akcelik_link(double flow, double capacity, double fftime, double alpha, double beta) nogil:
+    cdef double x = flow / capacity
+    cdef double k = 8.0 * alpha / (capacity * beta)
+    return 0.25 * beta * (1.0 + ((x - 1.0) + k / 2.0) / sqrt((x - 1.0) * (x - 1.0) + k * x)) / capacity
+
+
+cdef double link_cost(int function, double flow, double capacity, double fftime, double alpha, double beta) nogil:
+    if function == BPR:
+        return bpr_link(flow, capacity, fftime, alpha, beta)
+    elif function == CONICAL:
+        return conical_link(flow, capacity, fftime, alpha, beta)
+    return akcelik_link(flow, capacity, fftime, alpha, beta)
+
+
+cdef double link_derivative(int function, double flow, double capacity, double fftime, double alpha, double beta) nogil:
+    if function == BPR:
+        return delta_bpr_link(flow, capacity, fftime, alpha, beta)
+    elif function == CONICAL:
+        return delta_conical_link(flow, capacity, fftime, alpha, beta)
+    return delta_akcelik_link(flow, capacity, fftime, alpha, beta)
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cpdef void bpr(double[:] congested_time,
+               double[:] link_flows,
+               double[:] capacity,
+               double[:] fftime,
+               double[:] alpha,
+               double[:] beta,
+               int cores):
+    cdef int i
+    cdef int links = congested_time.shape[0]
+
+    with nogil:
+        for i in prange(links, num_threads=cores):
+            congested_time[i] = bpr_link(link_flows[i], capacity[i], fftime[i], alpha[i], beta[i])
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cpdef void delta_bpr(double[:] derivative,
+                     double[:] link_flows,
+                     double[:] capacity,
+                     double[:] fftime,
+                     double[:] alpha,
+                     double[:] beta,
+                     int cores):
+    cdef int i
+    cdef int links = derivative.shape[0]
+
+    with nogil:
+        for i in prange(links, num_threads=cores):
+            derivative[i] = delta_bpr_link(link_flows[i], capacity[i], fftime[i], alpha[i], beta[i])
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cpdef void conical(double[:] congested_time,
+                   double[:] link_flows,
+                   double[:] capacity,
+                   double[:] fftime,
+                   double[:] alpha,
+                   double[:] beta,
+                   int cores):
+    cdef int i
+    cdef int links = congested_time.shape[0]
+
+    with nogil:
+        for i in prange(links, num_threads=cores):
+            congested_time[i] = conical_link(link_flows[i], capacity[i], fftime[i], alpha[i], beta[i])
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cpdef void delta_conical(double[:] derivative,
+                         double[:] link_flows,
+                         double[:] capacity,
+                         double[:] fftime,
+                         double[:] alpha,
+                         double[:] beta,
+                         int cores):
+    cdef int i
+    cdef int links = derivative.shape[0]
+
+    with nogil:
+        for i in prange(links, num_threads=cores):
+            derivative[i] = delta_conical_link(link_flows[i], capacity[i], fftime[i], alpha[i], beta[i])
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cpdef void akcelik(double[:] congested_time,
+                   double[:] link_flows,
+                   double[:] capacity,
+                   double[:] fftime,
+                   double[:] alpha,
+                   double[:] beta,
+                   int cores):
+    cdef int i
+    cdef int links = congested_time.shape[0]
+
+    with nogil:
+        for i in prange(links, num_threads=cores):
+            congested_time[i] = akcelik_link(link_flows[i], capacity[i], fftime[i], alpha[i], beta[i])
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cpdef void delta_akcelik(double[:] derivative,
+                         double[:] link_flows,
+                         double[:] capacity,
+                         double[:] fftime,
+                         double[:] alpha,
+                         double[:] beta,
+                         int cores):
+    cdef int i
+    cdef int links = derivative.shape[0]
+
+    with nogil:
+        for i in prange(links, num_threads=cores):
+            derivative[i] = delta_akcelik_link(link_flows[i], capacity[i], fftime[i], alpha[i], beta[i])
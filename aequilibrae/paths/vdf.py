@@ -0,0 +1,115 @@
+"""
+ -----------------------------------------------------------------------------------------------------------
+ Package:    AequilibraE
+
+ Name:       Volume-delay functions
+ Purpose:    Link cost functions for capacity restrained assignment
+
+ Original Author:  Pedro Camargo (c@margo.co)
+ Contributors:
+ Last edited by: Pedro Camargo
+
+ Website:    www.AequilibraE.com
+ Repository:  https://github.com/AequilibraE/AequilibraE
+
+ Created:    2026-10-18
+ Updated:
+ Copyright:   (c) AequilibraE authors
+ Licence:     See LICENSE.TXT
+ -----------------------------------------------------------------------------------------------------------
+
+ The parameters of the function (alpha and beta) can be a single number for all links or the name of a field in the
+ graph, so each link has its own. Parameters that are not given take the defaults of the function (DEFAULT_PARAMETERS).
+ All arrays are created once in prepare and the functions (vdf.pxi) write their results in place.
+ """
+
+import multiprocessing as mp
+import numpy as np
+
+import aequilibrae.reserved_fields as reserved_fields
+
+no_binaries = False
+try:
+    from AoN import bpr, delta_bpr, conical, delta_conical, akcelik, delta_akcelik, VDF_FUNCTIONS
+except:
+    no_binaries = True
+    VDF_FUNCTIONS = ['bpr', 'conical', 'akcelik']
+
+# The conical function is only defined for alpha > 1 and does not use beta
+DEFAULT_PARAMETERS = {'bpr': {'alpha': 0.15, 'beta': 4.0},
+                      'conical': {'alpha': 4.0, 'beta': 0.0},
+                      'akcelik': {'alpha': 0.15, 'beta': 4.0}}
+
+
+class VDF:
+    def __init__(self, function='bpr', alpha=None, beta=None, capacity_field=reserved_fields.capacity_ab[:-3]):
+        if function not in VDF_FUNCTIONS:
+            raise ValueError('Volume-delay function ' + str(function) + ' is not available. Use one of ' +
+                             str(VDF_FUNCTIONS))
+        self.function = function
+        self.function_code = VDF_FUNCTIONS.index(function)  # How the compiled procedures refer to the function
+        self.alpha = DEFAULT_PARAMETERS[function]['alpha'] if alpha is None else alpha
+        self.beta = DEFAULT_PARAMETERS[function]['beta'] if beta is None else beta
+        self.capacity_field = capacity_field
+        self.cores = mp.cpu_count()
+
+        # Per-link arrays (DIMENSION: # of links in the graph)
+        self.free_flow_time = None
+        self.capacity = None
+        self.alphas = None
+        self.betas = None
+
+        self.__cost = None
+        self.__derivative = None
+
+    def prepare(self, graph):
+        """Reads the free-flow time (the graph's cost field), capacity and parameters for all links"""
+        if no_binaries:
+            raise ValueError('Volume-delay functions need the compiled AoN module')
+        if graph.cost is None:
+            raise ValueError('The graph has no cost field set')
+
+        self.free_flow_time = graph.graph[graph.cost_field].astype(np.float64)
+        self.capacity = self.__link_values(graph, self.capacity_field)
+        if np.any(self.capacity <= 0):
+            raise ValueError('Capacity needs to be positive for all links')
+        self.alphas = self.__link_values(graph, self.alpha)
+        self.betas = self.__link_values(graph, self.beta)
+        if self.function == 'conical' and np.any(self.alphas <= 1):
+            raise ValueError('The conical function needs alpha > 1 for all links')
+
+        if self.function == 'bpr':
+            self.__cost, self.__derivative = bpr, delta_bpr
+        elif self.function == 'conical':
+            self.__cost, self.__derivative = conical, delta_conical
+        else:
+            self.__cost, self.__derivative = akcelik, delta_akcelik
+
+    def set_cores(self, cores):
+        if isinstance(cores, int):
+            if cores > 0:
+                self.cores = cores
+            else:
+                raise ValueError("Number of cores needs to be equal or bigger than one")
+        else:
+            raise ValueError("Number of cores needs to be an integer")
+
+    def apply(self, congested_time, link_flows):
+        """Writes the cost of all links for link_flows in congested_time"""
+        self.__cost(congested_time, link_flows, self.capacity, self.free_flow_time, self.alphas, self.betas,
+                    self.cores)
+
+    def apply_derivative(self, derivative, link_flows):
+        """Writes the derivative of the cost of all links for link_flows in derivative"""
+        self.__derivative(derivative, link_flows, self.capacity, self.free_flow_time, self.alphas, self.betas,
+                          self.cores)
+
+    @staticmethod
+    def __link_values(graph, value):
+        if isinstance(value, str):
+            if value not in graph.graph.dtype.names:
+                raise ValueError('Field ' + value + ' is not in the graph')
+            return graph.graph[value].astype(np.float64)
+        values = np.empty(graph.num_links, np.float64)
+        values.fill(value)
+        return values
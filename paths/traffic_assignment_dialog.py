@@ -389,17 +389,18 @@ class TrafficAssignmentDialog(QDialog, FORM_CLASS):
                 query_type = self.select_link_list.item(i, 1).text()
                 query_name = self.select_link_list.item(i, 2).text()
 
+                lk = []
                 for l in links:
                     d = directions_dictionary[l[1]]
-                    lk = self.graph.ids[(self.graph.graph['link_id'] == int(l[0])) & (self.graph.graph['direction'] == d)]
+                    lk.extend(self.graph.ids[(self.graph.graph['link_id'] == int(l[0])) & (self.graph.graph['direction'] == d)])
 
                 query_labels.append(query_name)
                 query_elements.append(lk)
-                query_types(query_type)
+                query_types.append(query_type)
 
         self.critical_queries = {'labels': query_labels,
                                  'elements': query_elements,
-                                 ' type': query_types}
+                                 'type': query_types}
 
     def progress_range_from_thread(self, val):
         self.progressbar0.setRange(0, val)
@@ -430,6 +431,7 @@ class TrafficAssignmentDialog(QDialog, FORM_CLASS):
                                               output_file_name = os.path.join(self.output_path, 'path_file.db'),
                                               file_type='sqlite')
                 else:
+                    self.results.path_file['results'].close()
                     shutil.move(self.path_file.temp_file + '.aep', self.path_file.output_name + '.aep')
                     shutil.move(self.path_file.temp_file + '.aed', self.path_file.output_name + '.aed')
 
@@ -27,10 +27,14 @@ from ..common_tools import WorkerThread
 from multiprocessing.dummy import Pool as ThreadPool
 import numpy as np
 import thread
+import threading
 
 no_binary = False
 try:
-    from aequilibrae.paths import one_to_all, MultiThreadedAoN
+    from aequilibrae.paths import one_to_all, MultiThreadedAoN, MultiProcessAoN
+    from aequilibrae.paths import EquilibriumAssignment, BushBasedAssignment
+    from aequilibrae.paths.assignment import all_or_nothing
+    from aequilibrae.paths.equilibrium import ALGORITHMS as EQUILIBRIUM_ALGORITHMS
 except:
     no_binary = True
 
@@ -45,6 +49,7 @@ class TrafficAssignmentProcedure(WorkerThread):
         self.skims = skims
         self.critical = critical
         self.all_threads = {}
+        self.threads_lock = threading.Lock()  # Two threads cannot get the same index (and buffers)
         self.performed = 0
         self.report = []
         self.aux_res = MultiThreadedAoN()
@@ -54,8 +59,19 @@ class TrafficAssignmentProcedure(WorkerThread):
 
         self.emit(SIGNAL("ProgressMaxValue(PyQt_PyObject)"), self.matrix.shape[0])
         self.emit(SIGNAL("ProgressValue(PyQt_PyObject)"), 0)
+        # All or Nothing in worker processes (method['backend'] == 'processes'). There is no progress by origin
+        if self.method['algorithm'] == 'AoN' and self.method.get('backend') == 'processes':
+            aux_res = MultiProcessAoN()
+            try:
+                aux_res.prepare(self.graph, self.results)
+                self.report.extend(all_or_nothing(self.matrix, self.graph, self.results, aux_res=aux_res))
+            except ValueError as e:
+                self.report.append(str(e))
+            finally:
+                aux_res.close()
+
         # If we are going to perform All or Nothing
-        if self.method['algorithm'] == 'AoN':
+        elif self.method['algorithm'] == 'AoN':
             pool = ThreadPool(self.results.cores)
             self.all_threads['count'] = 0
             for O in range(self.results.zones):
@@ -64,21 +80,38 @@ class TrafficAssignmentProcedure(WorkerThread):
                     pool.apply_async(self.func_assig_thread, args=(O, a))
             pool.close()
             pool.join()
+            self.results.link_loads = np.sum(np.sum(self.aux_res.temp_link_loads, axis=0), axis=1)
+
+        # Capacity restrained assignment. method['capacity'] has the capacity field in the graph
+        elif self.method['algorithm'] in EQUILIBRIUM_ALGORITHMS or self.method['algorithm'] == 'algorithm-b':
+            self.emit(SIGNAL("ProgressText (PyQt_PyObject)"), "Equilibrium assignment")
+            if self.method['algorithm'] == 'algorithm-b':
+                assig = BushBasedAssignment(self.matrix, self.graph, self.results,
+                                            capacity_field=self.method.get('capacity', 'capacity'))
+            else:
+                assig = EquilibriumAssignment(self.matrix, self.graph, self.results,
+                                              algorithm=self.method['algorithm'],
+                                              capacity_field=self.method.get('capacity', 'capacity'))
+            try:
+                assig.execute()
+            except ValueError as e:
+                # The dialog treats anything in the report as an error
+                self.report.append(str(e))
 
         self.emit(SIGNAL("ProgressValue(PyQt_PyObject)"), self.matrix.shape[0])
-        self.results.link_loads = np.sum(self.aux_res.temp_link_loads, axis=1)
 
         self.emit(SIGNAL("ProgressText (PyQt_PyObject)"), "Saving Outputs")
         self.emit(SIGNAL("finished_threaded_procedure( PyQt_PyObject )"), None)
 
 
     def func_assig_thread(self, O, a):
-        if thread.get_ident() in self.all_threads:
-            th = self.all_threads[thread.get_ident()]
-        else:
-            self.all_threads[thread.get_ident()] = self.all_threads['count']
-            th = self.all_threads['count']
-            self.all_threads['count'] += 1
+        with self.threads_lock:
+            if thread.get_ident() in self.all_threads:
+                th = self.all_threads[thread.get_ident()]
+            else:
+                self.all_threads[thread.get_ident()] = self.all_threads['count']
+                th = self.all_threads['count']
+                self.all_threads['count'] += 1
         a = one_to_all(O, a, self.graph, self.results, self.aux_res, th)
         if a != O:
             self.report.append(a)
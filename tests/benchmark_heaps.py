@@ -0,0 +1,42 @@
+# Compares the heap engines available for path finding on the same graph and demand
+from aequilibrae.paths import Graph, AssignmentResults, all_or_nothing, HEAP_TYPES
+import os
+import sys
+from time import time
+import numpy as np
+
+path_files = '/media/pedro/LargeDrive/GOOGLE_DRIVES/UCI/DATA/Pedro/AequilibraE/Testing data/Assignment'
+reference_graph = 'SydneyGraph.aeg'
+repetitions = 3
+
+graph = Graph()
+graph.load_from_disk(os.path.join(path_files, reference_graph))
+graph.set_graph(centroids=393, cost_field='length2', block_centroid_flows=True)
+
+zones = graph.centroids + 1
+np.random.seed(1)
+matrix = np.random.rand(zones, zones) * 100
+matrix[0, :] = 0
+matrix[:, 0] = 0
+
+loads = {}
+for heap in sorted(HEAP_TYPES.keys()):
+    graph.heap_type = heap
+    results = AssignmentResults()
+    results.prepare(graph)
+
+    times = []
+    for i in range(repetitions):
+        t = time()
+        report = all_or_nothing(matrix, graph, results)
+        times.append(time() - t)
+        if report:
+            raise ValueError('Assignment with ' + heap + ' heap failed: ' + str(report))
+    loads[heap] = results.link_loads.copy()
+    print '{0:>12}: best {1:8.3f}s   mean {2:8.3f}s'.format(heap, min(times), sum(times) / repetitions)
+
+# All engines need to produce the same loads
+for heap in loads.keys():
+    if not np.allclose(loads[heap], loads['fibonacci']):
+        raise ValueError('Loads with the ' + heap + ' heap differ from the ones with the fibonacci heap')
+        sys.exit(1)
@@ -0,0 +1,68 @@
+# Compares all-or-nothing assignment on a graph with the node IDs of the network and on the same graph with the nodes
+# renumbered (Graph.renumber_nodes), on a synthetic grid whose node IDs are shuffled (as IDs of real networks often
+# are, after years of edits), so neighbouring nodes are far apart in the arrays indexed by node
+from aequilibrae.paths import Graph, AssignmentResults, all_or_nothing
+from aequilibrae.paths.results.output_writers import link_flows_table
+import os
+import shutil
+import tempfile
+from time import time
+import numpy as np
+
+side = 600
+zones = 200
+repetitions = 3
+folder = tempfile.mkdtemp()
+
+np.random.seed(1)
+ids = np.arange(1, side * side + 1).reshape(side, side)
+a_nodes = np.hstack((ids[:, :-1].flatten(), ids[:-1, :].flatten()))
+b_nodes = np.hstack((ids[:, 1:].flatten(), ids[1:, :].flatten()))
+
+# Centroids (1..zones) spread over the grid, the other nodes shuffled
+new_ids = np.zeros(side * side + 1, np.int64)
+spread = np.random.choice(side * side, zones, replace=False) + 1
+new_ids[spread] = np.arange(1, zones + 1)
+others = np.setdiff1d(np.arange(1, side * side + 1), spread)
+new_ids[others] = np.random.permutation(others.shape[0]) + zones + 1
+
+net_file = os.path.join(folder, 'grid.csv')
+links = a_nodes.shape[0]
+net = np.zeros(links, dtype=[('link_id', np.int64), ('a_node', np.int64), ('b_node', np.int64),
+                             ('direction', np.int64), ('time_ab', np.float64), ('time_ba', np.float64)])
+net['link_id'] = np.arange(1, links + 1)
+net['a_node'] = new_ids[a_nodes]
+net['b_node'] = new_ids[b_nodes]
+net['time_ab'] = np.random.rand(links) * 10 + 1
+net['time_ba'] = np.random.rand(links) * 10 + 1
+np.savetxt(net_file, net, fmt='%d,%d,%d,%d,%f,%f', header='link_id,a_node,b_node,direction,time_ab,time_ba',
+           comments='')
+
+matrix = np.random.rand(zones + 1, zones + 1) * 100
+matrix[0, :] = 0
+matrix[:, 0] = 0
+
+tables = {}
+for method in [None, 'bfs', 'rcm']:
+    graph = Graph()
+    graph.load_network_from_csv(net_file)
+    t = time()
+    graph.prepare_graph(renumber=method, centroids=zones if method else None)
+    preparation = time() - t
+    graph.set_graph(centroids=zones, cost_field='time', block_centroid_flows=True)
+
+    results = AssignmentResults()
+    results.prepare(graph)
+    times = []
+    for i in range(repetitions):
+        t = time()
+        all_or_nothing(matrix, graph, results)
+        times.append(time() - t)
+    tables[method] = link_flows_table(results.lids, results.direcs, results.link_loads)
+    print '{0:>12}: graph {1:6.2f}s   assignment best {2:8.3f}s'.format(str(method), preparation, min(times))
+
+shutil.rmtree(folder)
+
+for method in tables.keys():
+    if not np.allclose(tables[method]['tot_flow'], tables[None]['tot_flow']):
+        raise ValueError('Loads with nodes renumbered by ' + str(method) + ' differ from the ones without')
@@ -0,0 +1,58 @@
+# Compares the output writers of AssignmentResults.save_to_disk with writing the same link flows row by row
+# (np.savetxt and a plain executemany) on a synthetic network with a million links (and sparse link IDs)
+from aequilibrae.paths import AssignmentResults
+import os
+import shutil
+import sqlite3
+import tempfile
+from time import time
+import numpy as np
+
+links = 1000000
+zones = 1000
+folder = tempfile.mkdtemp()
+
+np.random.seed(1)
+results = AssignmentResults()
+results.lids = np.repeat(np.random.choice(links * 5, links // 2, replace=False), 2).astype(np.int32)
+results.direcs = np.tile(np.array([1, -1], np.int8), links // 2)
+results.link_loads = np.random.rand(links + 1) * 1000
+results.skims = np.random.rand(zones, zones, 2) * 100
+results.skim_names = ['time', 'distance']
+
+
+def naive_csv(file_name):
+    res = np.zeros(np.max(results.lids) + 1, dtype=[('a', np.int64), ('b', np.float64), ('c', np.float64),
+                                                    ('d', np.float64)])
+    res['a'] = np.arange(res.shape[0])
+    res['b'][results.lids[results.direcs > 0]] = results.link_loads[:-1][results.direcs > 0]
+    res['c'][results.lids[results.direcs < 0]] = results.link_loads[:-1][results.direcs < 0]
+    res['d'] = res['b'] + res['c']
+    np.savetxt(file_name, res, fmt="%d " + ",%1.10f" * 3, header='Link_ID,AB Flow,BA Flow,Tot Flow')
+
+
+def naive_sqlite(file_name):
+    conn = sqlite3.connect(file_name)
+    c = conn.cursor()
+    c.execute('''CREATE TABLE link_flows (link_id INTEGER PRIMARY KEY, ab_flow REAL, ba_flow REAL, tot_flow REAL)''')
+    ids = np.unique(results.lids)
+    c.executemany('INSERT INTO link_flows VALUES (?,?,?,?)', [(int(i), 1.0, 1.0, 2.0) for i in ids])
+    conn.commit()
+    conn.close()
+
+
+tasks = [('loads csv, np.savetxt', lambda f: naive_csv(f + '.csv')),
+         ('loads csv', lambda f: results.save_to_disk('loads', f + '.csv', 'csv')),
+         ('loads sqlite, plain executemany', lambda f: naive_sqlite(f + '.db')),
+         ('loads sqlite', lambda f: results.save_to_disk('loads', f + '.db', 'sqlite')),
+         ('loads binary', lambda f: results.save_to_disk('loads', f + '.npz', 'binary')),
+         ('skims csv', lambda f: results.save_to_disk('skims', f + '.csv', 'csv')),
+         ('skims sqlite', lambda f: results.save_to_disk('skims', f + '.db', 'sqlite')),
+         ('skims binary', lambda f: results.save_to_disk('skims', f + '.npz', 'binary'))]
+
+for i, (name, task) in enumerate(tasks):
+    t = time()
+    task(os.path.join(folder, 'output_' + str(i)))
+    print '{0:>32}: {1:8.3f}s'.format(name, time() - t)
+
+shutil.rmtree(folder)
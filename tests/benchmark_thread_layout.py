@@ -0,0 +1,58 @@
+# Compares the layout of the per-thread buffers of MultiThreadedAoN: one contiguous block per thread (the default)
+# against the buffers interleaved by thread ((n, cores) arrays, where neighbouring elements belong to different
+# threads and threads keep writing to the same cache lines). Only makes sense with many cores
+from aequilibrae.paths import Graph, AssignmentResults, MultiThreadedAoN, all_or_nothing
+import multiprocessing as mp
+import os
+import sys
+from time import time
+import numpy as np
+
+path_files = '/media/pedro/LargeDrive/GOOGLE_DRIVES/UCI/DATA/Pedro/AequilibraE/Testing data/Assignment'
+reference_graph = 'SydneyGraph.aeg'
+repetitions = 3
+
+graph = Graph()
+graph.load_from_disk(os.path.join(path_files, reference_graph))
+graph.set_graph(centroids=393, cost_field='length2', block_centroid_flows=True)
+
+zones = graph.centroids + 1
+np.random.seed(1)
+matrix = np.random.rand(zones, zones) * 100
+matrix[0, :] = 0
+matrix[:, 0] = 0
+
+
+def interleave(aux_res):
+    # Same arrays, with the thread as the last (fastest changing) dimension
+    for name in ['predecessors', 'temporary_skims', 'reached_first', 'connectors', 'temp_link_loads',
+                 'temp_node_loads']:
+        array = getattr(aux_res, name)
+        setattr(aux_res, name, np.zeros(array.shape[::-1], array.dtype).T)
+
+
+cores = mp.cpu_count()
+loads = {}
+for layout in ['per thread', 'interleaved']:
+    results = AssignmentResults()
+    results.set_cores(cores)
+    results.prepare(graph)
+    aux_res = MultiThreadedAoN()
+    aux_res.prepare(graph, results)
+    if layout == 'interleaved':
+        interleave(aux_res)
+
+    times = []
+    for i in range(repetitions):
+        t = time()
+        report = all_or_nothing(matrix, graph, results, aux_res=aux_res)
+        times.append(time() - t)
+        if report:
+            raise ValueError('Assignment with ' + layout + ' buffers failed: ' + str(report))
+    loads[layout] = results.link_loads.copy()
+    print '{0:>12} ({1} cores): best {2:8.3f}s   mean {3:8.3f}s'.format(layout, cores, min(times),
+                                                                         sum(times) / repetitions)
+
+if not np.allclose(loads['per thread'], loads['interleaved']):
+    raise ValueError('Loads differ between the two layouts')
+    sys.exit(1)
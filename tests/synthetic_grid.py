@@ -0,0 +1,72 @@
+# Synthetic network and demand shared by the test scripts, so they run without any data
+from aequilibrae.paths import Graph
+import os
+import numpy as np
+
+
+def grid_network(folder, side=30, zones=40, split=0.2, seed=1):
+    """Writes grid.csv in folder and returns its path. Links go both ways, with time, distance and capacity fields.
+    Centroids (1..zones) are spread over the grid, the other nodes have shuffled IDs with gaps, and a share (split) of
+    the links is split in two by a new node (degree-2 nodes)"""
+    np.random.seed(seed)
+    ids = np.arange(side * side).reshape(side, side)
+    a_nodes = np.hstack((ids[:, :-1].flatten(), ids[:-1, :].flatten()))
+    b_nodes = np.hstack((ids[:, 1:].flatten(), ids[1:, :].flatten()))
+    new_ids = np.zeros(side * side, np.int64)
+    spread = np.random.choice(side * side, zones, replace=False)
+    new_ids[spread] = np.arange(1, zones + 1)
+    others = np.setdiff1d(np.arange(side * side), spread)
+    new_ids[others] = 3 * np.random.permutation(others.shape[0]) + zones + 1
+    a_nodes = new_ids[a_nodes]
+    b_nodes = new_ids[b_nodes]
+    time_ab = np.random.rand(a_nodes.shape[0]) * 10 + 1
+    time_ba = np.random.rand(a_nodes.shape[0]) * 10 + 1
+    capacity = np.random.rand(a_nodes.shape[0]) * 1000 + 500
+
+    halves = np.random.rand(a_nodes.shape[0]) < split
+    middle = 3 * side * side + zones + np.arange(np.sum(halves))
+    a_nodes = np.hstack((a_nodes[~halves], a_nodes[halves], middle))
+    b_nodes = np.hstack((b_nodes[~halves], middle, b_nodes[halves]))
+    time_ab = np.hstack((time_ab[~halves], time_ab[halves] / 2, time_ab[halves] / 2))
+    time_ba = np.hstack((time_ba[~halves], time_ba[halves] / 2, time_ba[halves] / 2))
+    capacity = np.hstack((capacity[~halves], capacity[halves], capacity[halves]))
+
+    net_file = os.path.join(folder, 'grid.csv')
+    links = a_nodes.shape[0]
+    net = np.zeros(links, dtype=[('link_id', np.int64), ('a_node', np.int64), ('b_node', np.int64),
+                                 ('direction', np.int64), ('time_ab', np.float64), ('time_ba', np.float64),
+                                 ('distance_ab', np.float64), ('distance_ba', np.float64),
+                                 ('capacity_ab', np.float64), ('capacity_ba', np.float64)])
+    net['link_id'] = np.arange(1, links + 1)
+    net['a_node'] = a_nodes
+    net['b_node'] = b_nodes
+    net['time_ab'] = time_ab
+    net['time_ba'] = time_ba
+    net['distance_ab'] = np.random.rand(links) * 5
+    net['distance_ba'] = net['distance_ab']
+    net['capacity_ab'] = capacity
+    net['capacity_ba'] = capacity
+    np.savetxt(net_file, net, fmt='%d,%d,%d,%d,%.10f,%.10f,%.10f,%.10f,%.10f,%.10f',
+               header='link_id,a_node,b_node,direction,time_ab,time_ba,distance_ab,distance_ba,capacity_ab,'
+                      'capacity_ba', comments='')
+    return net_file
+
+
+def grid_demand(zones=40, total=100, density=0.5, seed=1):
+    """Demand matrix where every origin has demand, but only to about a share (density) of the destinations"""
+    np.random.seed(seed)
+    matrix = np.random.rand(zones + 1, zones + 1) * total
+    matrix[np.random.rand(zones + 1, zones + 1) > density] = 0
+    matrix[np.arange(1, zones + 1), np.random.randint(1, zones + 1, zones)] = total / 2
+    matrix[0, :] = 0
+    matrix[:, 0] = 0
+    return matrix
+
+
+def load_grid(net_file, zones=40, renumber=None):
+    """Graph of the grid with time as the cost and distance as the skim"""
+    graph = Graph()
+    graph.load_network_from_csv(net_file)
+    graph.prepare_graph(renumber=renumber, centroids=zones if renumber else None)
+    graph.set_graph(centroids=zones, cost_field='time', skim_fields=['distance'], block_centroid_flows=True)
+    return graph
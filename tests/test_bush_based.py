@@ -0,0 +1,71 @@
+# Checks the bush-based assignment (Algorithm B) on a synthetic grid, so it runs without any data. Raises an error if
+# it does not converge, if a bush has a cycle or does not carry the demand of its origin, or if the loads are not the
+# ones of a tightly converged bi-conjugate Frank-Wolfe
+from aequilibrae.paths import AssignmentResults, BushBasedAssignment, EquilibriumAssignment
+from synthetic_grid import grid_network, grid_demand, load_grid
+import shutil
+import tempfile
+import numpy as np
+
+zones = 40
+target = 0.00001
+folder = tempfile.mkdtemp()
+net_file = grid_network(folder, zones=zones)
+matrix = grid_demand(zones)
+
+
+def acyclic(a_nodes, b_nodes):
+    # Removes links leaving nodes with nothing coming in until no link is left (or none can be removed)
+    while a_nodes.shape[0]:
+        sources = ~np.in1d(a_nodes, b_nodes)
+        if not np.any(sources):
+            return False
+        a_nodes, b_nodes = a_nodes[~sources], b_nodes[~sources]
+    return True
+
+
+graph = load_grid(net_file, zones)
+results = AssignmentResults()
+results.set_cores(1)
+results.prepare(graph)
+parameters = {'rgap': target, 'max iterations': 100, 'inner iterations': 3, 'alpha': 0.15, 'beta': 4.0}
+assig = BushBasedAssignment(matrix, graph, results, parameters=parameters)
+assig.execute()
+if assig.rgap >= target:
+    raise ValueError('Algorithm B did not converge in ' + str(assig.iteration) + ' iterations')
+print '{0:>20}: OK ({1} iterations)'.format('convergence', assig.iteration)
+
+# Each bush is acyclic, has no negative flows and takes the demand of its origin to the destinations
+a_nodes = graph.graph['a_node']
+b_nodes = graph.graph['b_node']
+total = np.zeros(graph.num_links)
+for k, origin in enumerate(assig.origins):
+    links, flows = assig.bushes[k], assig.bush_flows[k]
+    if not acyclic(a_nodes[links], b_nodes[links]):
+        raise ValueError('The bush of origin ' + str(origin) + ' has a cycle')
+    if np.any(flows < 0):
+        raise ValueError('The bush of origin ' + str(origin) + ' has negative flows')
+    balance = np.zeros(graph.num_nodes + 1)
+    np.add.at(balance, b_nodes[links], flows)
+    np.subtract.at(balance, a_nodes[links], flows)
+    expected = np.zeros(graph.num_nodes + 1)
+    expected[:zones + 1] = matrix[origin, :]
+    expected[origin] -= np.sum(matrix[origin, :])
+    if not np.allclose(balance, expected):
+        raise ValueError('The bush of origin ' + str(origin) + ' does not carry its demand')
+    np.add.at(total, links, flows)
+if not np.allclose(total, results.link_loads[graph.graph['id']]):
+    raise ValueError('Bush flows do not add up to the link loads')
+print '{0:>20}: OK'.format('bushes')
+
+# Same equilibrium as bi-conjugate Frank-Wolfe
+graph = load_grid(net_file, zones)
+reference = AssignmentResults()
+reference.prepare(graph)
+parameters = {'rgap': target, 'max iterations': 1000, 'alpha': 0.15, 'beta': 4.0}
+EquilibriumAssignment(matrix, graph, reference, 'bfw', parameters=parameters).execute()
+if np.linalg.norm(results.link_loads - reference.link_loads) > 0.01 * np.linalg.norm(reference.link_loads):
+    raise ValueError('Algorithm B loads are far from the ones of bi-conjugate Frank-Wolfe')
+print '{0:>20}: OK'.format('same as bfw')
+
+shutil.rmtree(folder)
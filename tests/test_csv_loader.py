@@ -0,0 +1,81 @@
+# Checks the CSV loader on the synthetic grid and on small hand-written files, so it runs without any data. Raises an
+# error if columns do not get the declared or inferred types, if fractional values are lost, if reading in small
+# chunks (and in parallel) gives another table, or if a fractional value in an integer column is accepted
+from aequilibrae.paths import Graph
+from aequilibrae.paths.csv_loader import load_csv, csv_titles
+from synthetic_grid import grid_network
+import os
+import shutil
+import tempfile
+import numpy as np
+
+folder = tempfile.mkdtemp()
+net_file = grid_network(folder)
+expected = np.genfromtxt(net_file, delimiter=',', names=True)
+
+
+def write(name, text):
+    file_name = os.path.join(folder, name)
+    with open(file_name, 'wb') as f:
+        f.write(text)
+    return file_name
+
+
+def fails(file_name, dtypes, message, **kwargs):
+    try:
+        load_csv(file_name, dtypes, **kwargs)
+    except ValueError as error:
+        if message not in str(error):
+            raise ValueError('Wrong error for ' + os.path.basename(file_name) + ': ' + str(error))
+        return
+    raise ValueError(os.path.basename(file_name) + ' was read without errors')
+
+
+# Declared and inferred types, and fractional values kept
+titles = csv_titles(net_file)
+if titles != list(expected.dtype.names):
+    raise ValueError('Titles differ: ' + str(titles))
+table = load_csv(net_file, {'LINK_ID': np.int64, 'a_node': np.int32, 'b_node': np.int32})
+for name, kind in [('link_id', np.int64), ('a_node', np.int32), ('direction', np.int32), ('time_ab', np.float64)]:
+    if table.dtype[name] != np.dtype(kind):
+        raise ValueError('Column ' + name + ' is ' + str(table.dtype[name]) + ' instead of ' + str(np.dtype(kind)))
+for name in titles:
+    if not np.allclose(table[name], expected[name], rtol=0, atol=1e-9):
+        raise ValueError('Column ' + name + ' differs from the file')
+print '{0:>25}: OK'.format('typed columns')
+
+# Small chunks, in one process and in two
+for cores in [1, 2]:
+    chunked = load_csv(net_file, {'link_id': np.int64}, cores=cores, chunk_size=1000)
+    if not np.array_equal(chunked, load_csv(net_file, {'link_id': np.int64})):
+        raise ValueError('Reading in chunks with ' + str(cores) + ' cores gives another table')
+print '{0:>25}: OK'.format('chunked reading')
+
+# Text, quotes, blank lines and no line break at the end of the file
+file_name = write('mixed.csv', 'ID,Name,Value,Big\n1,"Main St, North",0.25,3000000000\n\n2,Elm,1e-3,3000000001\n'
+                               '3,"",7,3000000002')
+table = load_csv(file_name, {'big': np.int64}, chunk_size=16)
+if table.dtype['id'] != np.int32 or table.dtype['value'] != np.float64 or table.dtype['name'].kind != 'S':
+    raise ValueError('Wrong inferred types: ' + str(table.dtype))
+if list(table['name']) != ['Main St, North', 'Elm', ''] or not np.allclose(table['value'], [0.25, 0.001, 7]):
+    raise ValueError('Wrong values: ' + str(table))
+if list(table['big']) != [3000000000, 3000000001, 3000000002]:
+    raise ValueError('int64 values were not read exactly: ' + str(table['big']))
+print '{0:>25}: OK'.format('text and quotes')
+
+# Fractional values in integer columns, with numbers only and with text
+fails(net_file, {'time_ab': np.int32}, 'Field time_ab has a value that is not int32')
+fails(net_file, {'time_ab': np.int32}, 'Field time_ab has a value that is not int32', cores=2, chunk_size=1000)
+fails(write('fraction.csv', 'a,b\n1,2\n3,4.5\n'), {'b': np.int32}, 'Field b has a value that is not int32: 4.5')
+fails(write('text.csv', 'a,b\n1,x\n3.5,y\n'), {'a': np.int32}, 'Field a has a value that is not int32: 3.5')
+fails(write('short.csv', 'a,b\n1,2\n3\n'), None, 'Row with 1 fields instead of 2')
+print '{0:>25}: OK'.format('wrong values fail')
+
+# Networks keep their fractional values
+graph = Graph()
+graph.load_network_from_csv(net_file, cores=2)
+if not np.allclose(graph.network['time_ab'], expected['time_ab'], rtol=0, atol=1e-9):
+    raise ValueError('Network lost the fractional values of time_ab')
+print '{0:>25}: OK'.format('network')
+
+shutil.rmtree(folder)
@@ -0,0 +1,122 @@
+# Checks the reader of .dbf files (attribute tables of shapefiles) on files written here, so it runs without any
+# data. Raises an error if numeric, empty, invalid or text values are not read as expected, if deleted records are
+# kept, or if a network built from the attribute table of a synthetic grid differs from the one of its CSV file
+from aequilibrae.paths import Graph, AssignmentResults, all_or_nothing
+from aequilibrae.paths.dbf_reader import dbf_file, dbf_fields, read_dbf_columns
+from synthetic_grid import grid_demand
+import os
+import shutil
+import struct
+import tempfile
+import numpy as np
+
+folder = tempfile.mkdtemp()
+
+
+def write_dbf(file_name, fields, records, deleted=()):
+    # dBase III: header, one descriptor per field (name, type, length, decimals), records of fixed-width text
+    record_size = 1 + sum(field[2] for field in fields)
+    header_size = 32 + 32 * len(fields) + 1
+    with open(file_name, 'wb') as f:
+        f.write(struct.pack('<BBBBIHH20x', 3, 126, 10, 18, len(records), header_size, record_size))
+        for name, kind, length, decimals in fields:
+            f.write(struct.pack('<11sc4xBB14x', name, kind, length, decimals))
+        f.write('\r')
+        for i, record in enumerate(records):
+            f.write('*' if i in deleted else ' ')
+            for (name, kind, length, decimals), value in zip(fields, record):
+                f.write(str(value).rjust(length) if kind in 'NF' else str(value).ljust(length))
+        f.write('\x1a')
+
+
+def fails(message, function, *args):
+    try:
+        function(*args)
+    except ValueError as error:
+        if message not in str(error):
+            raise ValueError('Wrong error: ' + str(error))
+        return
+    raise ValueError('No error for: ' + message)
+
+
+# Numbers (including ones that take the whole width), empty and invalid numbers, text and deleted records
+file_name = os.path.join(folder, 'table.dbf')
+fields = [('ID', 'N', 5, 0), ('SPEED', 'F', 6, 2), ('NAME', 'C', 12, 0), ('ID', 'N', 3, 0)]
+write_dbf(file_name, fields, [[1, '12.50', 'Main St', 9], [2, '', 'Deleted', 9], [3, '999.99', ' Elm  ', 9],
+                              [4, '', '', 9], [5, '******', 'Oak', 9], [12345, '-1.25', 'Long name st', 9]],
+          deleted=[1])
+if dbf_fields(file_name) != fields:
+    raise ValueError('Wrong fields: ' + str(dbf_fields(file_name)))
+columns = read_dbf_columns(file_name, ['ID', 'SPEED', 'NAME'])
+if columns['ID'].dtype != np.float64 or list(columns['ID']) != [1, 3, 4, 5, 12345]:
+    raise ValueError('Wrong numbers (or the first field with a repeated name was not used): ' + str(columns['ID']))
+speed = columns['SPEED']
+if not np.allclose(speed[[0, 1, 4]], [12.5, 999.99, -1.25]) or not np.all(np.isnan(speed[[2, 3]])):
+    raise ValueError('Wrong numbers with empty and invalid values: ' + str(speed))
+if list(columns['NAME']) != ['Main St', 'Elm', '', 'Oak', 'Long name st']:
+    raise ValueError('Wrong text: ' + str(columns['NAME']))
+fails('Field LENGTH is not in', read_dbf_columns, file_name, ['LENGTH'])
+
+write_dbf(file_name, fields, [])
+if read_dbf_columns(file_name, ['ID', 'NAME'])['ID'].shape[0] != 0:
+    raise ValueError('A table without records has values')
+fails('Could not find the attribute table', dbf_file, os.path.join(folder, 'missing.shp'))
+print '{0:>20}: OK'.format('attribute tables')
+
+# Network from the attribute table of a grid, against the same network from a CSV file
+side = 20
+np.random.seed(1)
+ids = np.arange(1, side * side + 1).reshape(side, side)
+a_nodes = np.hstack((ids[:, :-1].flatten(), ids[:-1, :].flatten()))
+b_nodes = np.hstack((ids[:, 1:].flatten(), ids[1:, :].flatten()))
+links = a_nodes.shape[0]
+time = np.round(np.random.rand(links) * 10 + 1, 3)
+distance = np.round(np.random.rand(links) * 5, 3)
+fields = [('LINK_ID', 'N', 10, 0), ('A_NODE', 'N', 10, 0), ('B_NODE', 'N', 10, 0), ('DIR', 'N', 2, 0),
+          ('TIME', 'F', 12, 3), ('DISTANCE', 'F', 12, 3)]
+records = [[i + 1, a_nodes[i], b_nodes[i], 0, '%.3f' % time[i], '%.3f' % distance[i]] for i in range(links)]
+write_dbf(os.path.join(folder, 'grid.dbf'), fields, records)
+with open(os.path.join(folder, 'grid.csv'), 'wb') as f:
+    f.write('link_id,a_node,b_node,direction,time_ab,time_ba,distance_ab,distance_ba\n')
+    for i in range(links):
+        f.write('%d,%d,%d,0,%.3f,%.3f,%.3f,%.3f\n' % (i + 1, a_nodes[i], b_nodes[i], time[i], time[i], distance[i],
+                                                      distance[i]))
+
+matrix = grid_demand(20)
+loads = []
+for source in ['grid.shp', 'grid.csv']:
+    # Only the cost field goes to lower case in networks from attribute tables
+    graph = Graph()
+    if source == 'grid.shp':
+        graph.create_from_geography(os.path.join(folder, source), 'LINK_ID', 'DIR', 'TIME', ['DISTANCE'])
+        skim = 'DISTANCE'
+    else:
+        graph.load_network_from_csv(os.path.join(folder, source))
+        graph.prepare_graph()
+        skim = 'distance'
+    graph.set_graph(centroids=20, cost_field='time', skim_fields=[skim])
+    results = AssignmentResults()
+    results.prepare(graph)
+    all_or_nothing(matrix, graph, results)
+    loads.append((graph, results))
+(geography, geo_results), (csv, csv_results) = loads
+for field in ['link_id', 'a_node', 'b_node', 'direction', 'time', 'distance']:
+    if not np.allclose(geography.graph[field if field != 'distance' else 'DISTANCE'], csv.graph[field]):
+        raise ValueError('Graph field ' + field + ' differs from the one of the CSV file')
+if not np.allclose(geo_results.link_loads, csv_results.link_loads) or not np.allclose(geo_results.skims,
+                                                                                      csv_results.skims):
+    raise ValueError('The network from the attribute table gives other results')
+
+# Empty values and repeated IDs
+records[5][4] = ''
+write_dbf(os.path.join(folder, 'grid.dbf'), fields, records)
+fails('TIME field has wrong type or empty values', Graph().create_from_geography, os.path.join(folder, 'grid.shp'),
+      'LINK_ID', 'DIR', 'TIME', ['DISTANCE'])
+records[5][4] = '1.000'
+records[5][0] = 1
+write_dbf(os.path.join(folder, 'grid.dbf'), fields, records)
+fails('IDs are not unique', Graph().create_from_geography, os.path.join(folder, 'grid.shp'), 'LINK_ID', 'DIR', 'TIME',
+      ['DISTANCE'])
+print '{0:>20}: OK'.format('network')
+
+shutil.rmtree(folder)
@@ -0,0 +1,61 @@
+# Checks the equilibrium assignment algorithms (MSA, Frank-Wolfe, conjugate and bi-conjugate Frank-Wolfe) on a
+# synthetic grid, so it runs without any data. Raises an error if an algorithm does not converge, if the conjugate
+# directions need more iterations than Frank-Wolfe, or if the loads are far from a tightly converged solution
+from aequilibrae.paths import AssignmentResults, EquilibriumAssignment
+from synthetic_grid import grid_network, grid_demand, load_grid
+import shutil
+import tempfile
+import numpy as np
+
+zones = 40
+target = 0.001
+parameters = {'rgap': target, 'max iterations': 500, 'alpha': 0.15, 'beta': 4.0}
+folder = tempfile.mkdtemp()
+net_file = grid_network(folder, zones=zones)
+matrix = grid_demand(zones)
+
+
+def assign(algorithm, demand=matrix, rgap=target):
+    # The graph costs end up congested, so each assignment gets a fresh graph
+    graph = load_grid(net_file, zones)
+    results = AssignmentResults()
+    results.prepare(graph)
+    pars = dict(parameters)
+    pars['rgap'] = rgap
+    assig = EquilibriumAssignment(demand, graph, results, algorithm, parameters=pars)
+    assig.execute()
+    return assig, results
+
+
+def distance(loads):
+    return np.linalg.norm(loads - reference.link_loads) / np.linalg.norm(reference.link_loads)
+
+
+reference = assign('bfw', rgap=0.00001)[1]
+
+iterations = {}
+for algorithm in ['msa', 'frank-wolfe', 'cfw', 'bfw']:
+    assig, results = assign(algorithm)
+    if assig.rgap >= target:
+        raise ValueError(algorithm + ': did not converge in ' + str(assig.iteration) + ' iterations')
+    if assig.gaps[-1] >= assig.gaps[0]:
+        raise ValueError(algorithm + ': the relative gap did not go down')
+    if distance(results.link_loads) > 0.1:
+        raise ValueError(algorithm + ': loads are far from the equilibrium ones')
+    iterations[algorithm] = assig.iteration
+    print '{0:>15}: OK ({1} iterations)'.format(algorithm, assig.iteration)
+
+for algorithm in ['cfw', 'bfw']:
+    if iterations[algorithm] > iterations['frank-wolfe']:
+        raise ValueError(algorithm + ': needed more iterations than Frank-Wolfe')
+
+# Two user classes: class loads add up to the total, which is the same as with a single class
+shares = np.array([0.4, 0.6])
+assig, results = assign('bfw', matrix[:, :, np.newaxis] * shares)
+if not np.allclose(np.sum(results.class_link_loads, axis=1), results.link_loads):
+    raise ValueError('multi-class: class loads do not add up to the total')
+if distance(results.link_loads) > 0.1:
+    raise ValueError('multi-class: loads are far from the equilibrium ones')
+print '{0:>15}: OK'.format('multi-class')
+
+shutil.rmtree(folder)
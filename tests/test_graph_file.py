@@ -0,0 +1,80 @@
+# Checks that graphs saved to disk (binary graph file and pickle) come back the same, on a synthetic grid, so it runs
+# without any data. Raises an error if any attribute differs after the round trip, for a plain graph and for one that
+# was renumbered, compressed and has landmarks and a contraction hierarchy, or if the loaded graph gives other results
+from aequilibrae.paths import Graph, AssignmentResults, all_or_nothing
+from synthetic_grid import grid_network, grid_demand, load_grid
+import os
+import shutil
+import tempfile
+import numpy as np
+
+zones = 40
+folder = tempfile.mkdtemp()
+net_file = grid_network(folder, zones=zones)
+matrix = grid_demand(zones)
+
+attributes = ['description', 'num_links', 'num_nodes', 'network', 'graph', 'fs', 'b_node', 'cost', 'skims', 'ids',
+              'cost_field', 'skim_fields', 'landmarks', 'from_landmarks', 'to_landmarks', 'block_centroid_flows',
+              'heap_type', 'centroids', 'node_ids', 'renumbered_centroids', 'chains', 'chain_links', 'original_links',
+              'status', 'network_ok', 'type_loaded']
+
+
+def same(a, b):
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return isinstance(a, np.ndarray) and isinstance(b, np.ndarray) and a.dtype == b.dtype and np.array_equal(a, b)
+    if isinstance(a, dict):
+        return isinstance(b, dict) and sorted(a.keys()) == sorted(b.keys()) and all(same(a[k], b[k]) for k in a)
+    if isinstance(a, (list, tuple)):
+        return len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def assign(graph):
+    results = AssignmentResults()
+    results.set_cores(2)
+    results.prepare(graph)
+    all_or_nothing(matrix, graph, results)
+    return results
+
+
+def check(case, graph):
+    reference = assign(graph)
+    for pickle in [False, True]:
+        name = case + (' (pickle)' if pickle else '')
+        file_name = os.path.join(folder, 'graph.pkl' if pickle else 'graph.aeg')
+        graph.save_to_disk(file_name, pickle=pickle)
+        loaded = Graph()
+        loaded.load_from_disk(file_name)
+        for attribute in attributes:
+            if not same(getattr(graph, attribute), getattr(loaded, attribute)):
+                raise ValueError(name + ': ' + attribute + ' differs after saving and loading')
+        if (graph.contraction_hierarchy is None) != (loaded.contraction_hierarchy is None):
+            raise ValueError(name + ': contraction hierarchy differs after saving and loading')
+        if graph.contraction_hierarchy is not None:
+            if not same(graph.contraction_hierarchy.to_dict(), loaded.contraction_hierarchy.to_dict()):
+                raise ValueError(name + ': contraction hierarchy differs after saving and loading')
+
+        results = assign(loaded)
+        if not np.allclose(results.link_loads, reference.link_loads) or not np.allclose(results.skims,
+                                                                                          reference.skims):
+            raise ValueError(name + ': the loaded graph gives other results')
+
+        # Changes to a loaded graph do not go back to the file
+        loaded.cost *= 2
+        del loaded
+        loaded = Graph()
+        loaded.load_from_disk(file_name)
+        if not np.array_equal(loaded.cost, graph.cost):
+            raise ValueError(name + ': changes to the loaded graph were written to the file')
+        del loaded
+        print '{0:>36}: OK'.format(name)
+
+
+check('plain graph', load_grid(net_file, zones))
+
+graph = load_grid(net_file, zones, 'bfs').compress()
+graph.set_landmarks(4)
+graph.prepare_contraction_hierarchy()
+check('renumbered and compressed', graph)
+
+shutil.rmtree(folder)
@@ -0,0 +1,69 @@
+# Checks the multi-process all-or-nothing against the threaded one on a synthetic grid, so it runs without any data.
+# Raises an error if loads, skims or pairs without a path differ for dense, sparse and multi-class demand, with early
+# exit, or when the same pool is used again after the link costs change (as in an equilibrium assignment)
+from aequilibrae.paths import AssignmentResults, MultiProcessAoN, all_or_nothing
+from synthetic_grid import grid_network, grid_demand, load_grid
+from scipy.sparse import csr_matrix
+import shutil
+import tempfile
+import numpy as np
+
+zones = 40
+classes = [0.2, 0.3, 0.5]
+folder = tempfile.mkdtemp()
+graph = load_grid(grid_network(folder, zones=zones), zones)
+matrix = grid_demand(zones)
+
+
+def assign(demand, aux_res=None, early_exit=None):
+    results = AssignmentResults()
+    results.set_cores(2)
+    results.prepare(graph)
+    if aux_res is not None:
+        aux_res.prepare(graph, results, processes=2, classes=demand.shape[2] if demand.ndim == 3 else 1)
+    errors = all_or_nothing(demand, graph, results, early_exit=early_exit, aux_res=aux_res)
+    if errors:
+        raise ValueError('All-or-nothing failed: ' + str(errors))
+    return results
+
+
+def check(case, demand, early_exit=None):
+    threads = assign(demand, early_exit=early_exit)
+    aux_res = MultiProcessAoN()
+    processes = assign(demand, aux_res, early_exit)
+    aux_res.close()
+    compare(case, processes, threads)
+
+
+def compare(case, processes, threads):
+    if not np.allclose(processes.link_loads, threads.link_loads):
+        raise ValueError(case + ': loads differ from the ones of threads')
+    if threads.class_link_loads is not None and not np.allclose(processes.class_link_loads, threads.class_link_loads):
+        raise ValueError(case + ': class loads differ from the ones of threads')
+    if not np.allclose(processes.skims, threads.skims):
+        raise ValueError(case + ': skims differ from the ones of threads')
+    if np.any(processes.no_path != threads.no_path):
+        raise ValueError(case + ': pairs without a path differ from the ones of threads')
+    print '{0:>25}: OK'.format(case)
+
+
+check('dense demand', matrix)
+check('sparse demand', csr_matrix(matrix))
+check('multi-class demand', matrix[:, :, np.newaxis] * np.array(classes))
+check("early exit 'centroids'", matrix, 'centroids')
+check("early exit 'demand'", matrix, 'demand')
+
+# The pool is kept between assignments and picks up the new costs
+aux_res = MultiProcessAoN()
+assign(matrix, aux_res)
+free_flow = graph.cost.copy()
+graph.cost *= 1 + np.random.rand(graph.num_links)
+results = AssignmentResults()
+results.set_cores(2)
+results.prepare(graph)
+all_or_nothing(matrix, graph, results, aux_res=aux_res)
+aux_res.close()
+compare('new costs', results, assign(matrix))
+graph.cost[:] = free_flow
+
+shutil.rmtree(folder)
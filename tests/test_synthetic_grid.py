@@ -0,0 +1,143 @@
+# Checks the options of path finding and network loading against a plain all-or-nothing assignment (quaternary heap,
+# full trees) on a synthetic grid, so it runs without any data. Raises an error if loads or skims differ for: heaps,
+# early exit, sparse and multi-class demand, select link analysis, the path file, contraction hierarchy skims, node
+# renumbering and the compression of degree-2 nodes
+from aequilibrae.paths import AssignmentResults, MultiThreadedAoN, PathFile, all_or_nothing
+from aequilibrae.paths import contraction_hierarchy_skims, HEAP_TYPES
+from aequilibrae.paths.results.output_writers import link_flows_table
+from synthetic_grid import grid_network, grid_demand, load_grid
+from scipy.sparse import csr_matrix
+import os
+import shutil
+import tempfile
+import numpy as np
+
+zones = 40
+classes = [0.2, 0.3, 0.5]
+folder = tempfile.mkdtemp()
+net_file = grid_network(folder, zones=zones)
+matrix = grid_demand(zones)
+
+
+def load_graph(renumber=None):
+    return load_grid(net_file, zones, renumber)
+
+
+def assign(demand, graph, early_exit=None):
+    results = AssignmentResults()
+    results.set_cores(2)
+    results.prepare(graph)
+    results.aux_res = MultiThreadedAoN()
+    results.aux_res.prepare(graph, results, demand.shape[2] if demand.ndim == 3 else 1)
+    errors = all_or_nothing(demand, graph, results, early_exit=early_exit, aux_res=results.aux_res)
+    if errors:
+        raise ValueError('All-or-nothing failed: ' + str(errors))
+    return results
+
+
+def settled(results):
+    return np.sum(results.aux_res.settled)
+
+
+def check(case, loads, skims=None, pairs=None):
+    if not np.allclose(loads, reference.link_loads):
+        raise ValueError(case + ': loads differ from the ones of plain all-or-nothing')
+    if skims is None:
+        return
+    if pairs is None:
+        pairs = np.ones((zones + 1, zones + 1), np.bool_)
+        pairs[0, :] = False
+        pairs[:, 0] = False
+    if not np.allclose(skims[pairs], reference.skims[pairs]):
+        raise ValueError(case + ': skims differ from the ones of plain all-or-nothing')
+    print '{0:>30}: OK'.format(case)
+
+
+graph = load_graph()
+graph.heap_type = 'quaternary'
+reference = assign(matrix, graph)
+
+# Heaps
+for heap in HEAP_TYPES.keys():
+    graph.heap_type = heap
+    results = assign(matrix, graph)
+    check(heap + ' heap', results.link_loads, results.skims)
+graph.heap_type = 'quaternary'
+
+# Early exit. Path finding has to stop before the whole network is settled. With 'demand', skims are only computed
+# for the pairs with demand (the others get no_path = 1)
+results = assign(matrix, graph, early_exit='centroids')
+if settled(results) >= settled(reference):
+    raise ValueError("early exit 'centroids': as many nodes settled as with full trees")
+check("early exit 'centroids'", results.link_loads, results.skims)
+centroids_settled = settled(results)
+results = assign(matrix, graph, early_exit='demand')
+if settled(results) >= centroids_settled:
+    raise ValueError("early exit 'demand': as many nodes settled as when all centroids are needed")
+if np.any(results.no_path[matrix > 0] != 0):
+    raise ValueError("early exit 'demand': pairs with demand were not found")
+check("early exit 'demand'", results.link_loads, results.skims, matrix > 0)
+
+# Sparse and multi-class demand
+results = assign(csr_matrix(matrix), graph)
+check('sparse demand', results.link_loads, results.skims)
+results = assign(matrix[:, :, np.newaxis] * np.array(classes), graph)
+check('multi-class demand', results.link_loads, results.skims)
+for c, share in enumerate(classes):
+    if not np.allclose(results.class_link_loads[:, c], reference.link_loads * share):
+        raise ValueError('multi-class demand: loads of class ' + str(c + 1) + ' differ')
+
+# Select link: all the load of the busiest link goes through it, and comes from the OD pairs found
+busiest = int(np.argmax(reference.link_loads[:-1]))
+results = AssignmentResults()
+results.prepare(graph)
+results.setCriticalLinks(True, {'labels': ['busiest'], 'elements': [[busiest]], 'type': ['or']})
+all_or_nothing(matrix, graph, results)
+selected = results.critical_links['link_loads'][:, 0]
+if not np.isclose(selected[busiest], reference.link_loads[busiest]):
+    raise ValueError('select link: load of the selected link differs')
+if not np.isclose(np.sum(results.critical_links['results']['busiest']['flow']), reference.link_loads[busiest]):
+    raise ValueError('select link: the OD pairs found do not add up to the load of the selected link')
+check('select link', results.link_loads, results.skims)
+
+# Path file: the loads rebuilt from the paths saved
+results = AssignmentResults()
+results.prepare(graph)
+results.setSavePathFile(True, os.path.join(folder, 'paths'))
+all_or_nothing(matrix, graph, results)
+results.path_file['results'].flush()
+path_file = PathFile()
+path_file.open(os.path.join(folder, 'paths.aep'))
+loads = np.zeros(results.link_loads.shape[0])
+for o, d in zip(*np.nonzero(matrix)):
+    nodes, path = path_file.path(o, d)
+    loads[path] += matrix[o, d]
+path_file.close()
+results.setSavePathFile(False)
+check('path file', loads, results.skims)
+
+# Contraction hierarchy skims
+graph.prepare_contraction_hierarchy()
+results = AssignmentResults()
+results.prepare(graph)
+contraction_hierarchy_skims(graph, results)
+check('contraction hierarchy', reference.link_loads, results.skims)
+
+# Renumbered nodes (links are in a different order, so loads are compared by link ID and direction)
+reference_table = link_flows_table(reference.lids, reference.direcs, reference.link_loads)
+for method in ['bfs', 'rcm']:
+    renumbered = load_graph(method)
+    results = assign(matrix, renumbered)
+    table = link_flows_table(results.lids, results.direcs, results.link_loads)
+    if not np.allclose(table['tot_flow'], reference_table['tot_flow']):
+        raise ValueError(method + ' renumbering: loads differ from the ones of plain all-or-nothing')
+    check(method + ' renumbering', reference.link_loads, results.skims)
+
+# Degree-2 nodes compressed
+compressed = graph.compress()
+if compressed.num_links >= graph.num_links:
+    raise ValueError('compression: no links were compressed')
+results = assign(matrix, compressed)
+check('compressed graph', compressed.expand_link_loads(results.link_loads), results.skims)
+
+shutil.rmtree(folder)
@@ -0,0 +1,86 @@
+# Checks the volume-delay functions on the links of a synthetic grid, so it runs without any data. Raises an error if
+# costs differ from the closed-form functions, if derivatives differ from finite differences, or if the parameters
+# of the conical function are not the ones it needs
+from aequilibrae.paths import VDF
+from synthetic_grid import grid_network, load_grid
+import shutil
+import tempfile
+import numpy as np
+
+folder = tempfile.mkdtemp()
+graph = load_grid(grid_network(folder))
+fftime = graph.graph['time']
+capacity = graph.graph['capacity']
+np.random.seed(1)
+flows = capacity * np.random.rand(graph.num_links) * 2
+
+
+def bpr(flow, alpha, beta):
+    return fftime * (1 + alpha * (flow / capacity) ** beta)
+
+
+def conical(flow, alpha, beta):
+    x = 1 - flow / capacity
+    b = (2 * alpha - 1) / (2 * alpha - 2)
+    return fftime * (2 + np.sqrt(alpha ** 2 * x ** 2 + b ** 2) - alpha * x - b)
+
+
+def akcelik(flow, alpha, beta):
+    x = flow / capacity
+    return fftime + 0.25 * beta * ((x - 1) + np.sqrt((x - 1) ** 2 + 8 * alpha * x / (capacity * beta)))
+
+
+def vdf(function, alpha=None, beta=None):
+    v = VDF(function, alpha, beta, 'capacity')
+    v.set_cores(2)
+    v.prepare(graph)
+    return v
+
+
+def check(case, v, formula, alpha, beta):
+    cost = np.zeros(graph.num_links)
+    v.apply(cost, flows)
+    if not np.allclose(cost, formula(flows, alpha, beta)):
+        raise ValueError(case + ': costs differ from the closed-form function')
+
+    # Central differences
+    h = 0.001
+    derivative = np.zeros(graph.num_links)
+    v.apply_derivative(derivative, flows)
+    numerical = (formula(flows + h, alpha, beta) - formula(flows - h, alpha, beta)) / (2 * h)
+    if not np.allclose(derivative, numerical, rtol=1e-4, atol=1e-8):
+        raise ValueError(case + ': derivatives differ from finite differences')
+    print '{0:>25}: OK'.format(case)
+
+
+check('bpr', vdf('bpr', 0.15, 4.0), bpr, 0.15, 4.0)
+check('bpr (parameter fields)', vdf('bpr', 'distance', 4.0), bpr, graph.graph['distance'], 4.0)
+check('conical', vdf('conical', 4.0), conical, 4.0, 0)
+check('akcelik', vdf('akcelik', 0.15, 4.0), akcelik, 0.15, 4.0)
+
+# Defaults are the ones of each function, and conical gives the free-flow time with no flow and twice that at capacity
+for function in ['bpr', 'akcelik']:
+    v = vdf(function)
+    if v.alpha != 0.15 or v.beta != 4.0:
+        raise ValueError(function + ': wrong default parameters')
+v = vdf('conical')
+if v.alpha <= 1:
+    raise ValueError('conical: default alpha needs to be bigger than one')
+check('conical (defaults)', v, conical, v.alpha, v.beta)
+cost = np.zeros(graph.num_links)
+v.apply(cost, np.zeros(graph.num_links))
+if not np.allclose(cost, fftime):
+    raise ValueError('conical: cost with no flow is not the free-flow time')
+v.apply(cost, capacity.copy())
+if not np.allclose(cost, 2 * fftime):
+    raise ValueError('conical: cost at capacity is not twice the free-flow time')
+
+for alpha in [0.15, 1.0]:
+    try:
+        vdf('conical', alpha)
+    except ValueError:
+        continue
+    raise ValueError('conical: alpha = ' + str(alpha) + ' was accepted')
+print '{0:>25}: OK'.format('conical alpha <= 1 fails')
+
+shutil.rmtree(folder)
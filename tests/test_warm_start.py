@@ -0,0 +1,65 @@
+# Checks the warm start of the equilibrium and bush-based assignments on a synthetic grid, so it runs without any
+# data. The state of a loosely converged assignment is saved to disk and loaded to start a tighter one. Raises an
+# error if the state is not used (also on a renumbered graph), if it saves no iterations, if it lands on other loads
+# or if it is used with another demand matrix
+from aequilibrae.paths import AssignmentResults, BushBasedAssignment, EquilibriumAssignment
+from aequilibrae.paths.results.output_writers import link_flows_table
+from synthetic_grid import grid_network, grid_demand, load_grid
+import os
+import shutil
+import tempfile
+import numpy as np
+
+zones = 40
+folder = tempfile.mkdtemp()
+net_file = grid_network(folder, zones=zones)
+matrix = grid_demand(zones)
+state_file = os.path.join(folder, 'warm_start.pkl')
+
+
+def assign(algorithm, rgap, demand=matrix, warm_start=False, renumber=None):
+    graph = load_grid(net_file, zones, renumber)
+    results = AssignmentResults()
+    results.set_cores(1)
+    results.prepare(graph)
+    parameters = {'rgap': rgap, 'max iterations': 1000, 'alpha': 0.15, 'beta': 4.0}
+    if warm_start:
+        results.load_warm_start(state_file)
+    if algorithm == 'algorithm-b':
+        parameters['inner iterations'] = 3
+        assig = BushBasedAssignment(demand, graph, results, parameters=parameters, warm_start=warm_start)
+    else:
+        assig = EquilibriumAssignment(demand, graph, results, algorithm, parameters=parameters, warm_start=warm_start)
+    assig.execute()
+    return assig, results
+
+
+def loads(results):
+    # Renumbering changes the order of the links, so loads are compared by link ID and direction
+    return link_flows_table(results.lids, results.direcs, results.link_loads)['tot_flow']
+
+
+def check(algorithm, used, discarded):
+    assign(algorithm, 0.01)[1].save_warm_start(state_file)
+    cold, cold_results = assign(algorithm, 0.0001)
+    reference = loads(cold_results)
+    for renumber in [None, 'bfs']:
+        case = algorithm + (' (' + renumber + ' renumbering)' if renumber else '')
+        warm, results = assign(algorithm, 0.0001, warm_start=True, renumber=renumber)
+        if used not in warm.report:
+            raise ValueError(case + ': the warm start was not used')
+        if warm.iteration >= cold.iteration:
+            raise ValueError(case + ': the warm start did not save iterations')
+        if np.linalg.norm(loads(results) - reference) > 0.01 * np.linalg.norm(reference):
+            raise ValueError(case + ': loads are far from the ones without warm start')
+        print '{0:>30}: OK ({1} iterations instead of {2})'.format(case, warm.iteration, cold.iteration)
+
+    warm = assign(algorithm, 0.0001, demand=matrix * 1.1, warm_start=True)[0]
+    if discarded not in warm.report:
+        raise ValueError(algorithm + ': the warm start was used with another demand matrix')
+
+
+check('bfw', 'Warm start from a previous assignment', 'Warm start discarded: demand is different')
+check('algorithm-b', 'Warm start: ' + str(zones) + ' bushes reused', 'Warm start: 0 bushes reused')
+
+shutil.rmtree(folder)